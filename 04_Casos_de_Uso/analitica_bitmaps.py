@@ -0,0 +1,216 @@
+"""
+🔢 Cohortes y retención sobre bitmaps diarios de actividad
+
+Análisis sobre las claves de `UsuariosActivos` y `RegistroAsistencia`
+(04_casos_uso_reales.ipynb): un bitmap por día, `activos:<AAAA-MM-DD>`
+(o `asistencia:<AAAA-MM-DD>`), con el bit <user_id> a 1.
+
+    <prefijo>:bitop:<OP>:<hash>   resultado de cada BITOP (expira a los `ttl` s)
+    <prefijo>:analitica:<nombre>:<hash>   conteos ya calculados (JSON, expira)
+
+- Cada consulta escribe en una clave propia, derivada de la operación y
+  de los días: dos llamadas simultáneas con días distintos no se pisan
+  (el `activos:rango` compartido del notebook sí) y dos iguales
+  reutilizan el mismo resultado.
+- Comprobar la clave, BITOP y BITCOUNT van en un script Lua: dos
+  consultas iguales a la vez no leen una clave a medio calcular o ya
+  borrada.
+- AND/OR y la matriz de retención se calculan en un solo pipeline.
+- Con NumPy, `retencion_local` descarga cada bitmap una vez y cruza los
+  días en local, sin crear claves en Redis.
+"""
+
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+
+import redis
+
+try:
+    import numpy as np
+except ImportError:  # Opcional: solo para retencion_local()
+    np = None
+
+
+# KEYS[1] = destino, KEYS[2..] = bitmaps de cada día
+# ARGV[1] = AND/OR, ARGV[2] = ttl del destino (0 = borrarlo al acabar)
+# Atómico: dos llamadas con el mismo destino no pueden intercalarse.
+LUA_CONTAR = """
+local ttl = tonumber(ARGV[2])
+if ttl > 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('BITCOUNT', KEYS[1])
+end
+redis.call('BITOP', ARGV[1], KEYS[1], unpack(KEYS, 2))
+local n = redis.call('BITCOUNT', KEYS[1])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+else
+    redis.call('DEL', KEYS[1])
+end
+return n
+"""
+
+
+def _fechas_rango(desde, dias: int) -> list:
+    if isinstance(desde, str):
+        desde = date.fromisoformat(desde)
+    return [(desde + timedelta(days=d)).isoformat() for d in range(dias)]
+
+
+class AnaliticaActividad:
+    """Conteos AND/OR y retención por cohortes sobre bitmaps <prefijo>:<fecha>."""
+
+    def __init__(self, redis_client, prefijo="activos", ttl=300, redis_binario=None):
+        self.r = redis_client
+        self.prefijo = prefijo
+        self.ttl = ttl
+        self._r_bin = redis_binario
+        self._lua_contar = self.r.register_script(LUA_CONTAR)
+
+    def _clave(self, fecha) -> str:
+        return f"{self.prefijo}:{fecha}"
+
+    def _hash(self, *partes) -> str:
+        return hashlib.sha1("|".join(map(str, partes)).encode()).hexdigest()[:16]
+
+    def _destino(self, op: str, fechas: list) -> str:
+        return f"{self.prefijo}:bitop:{op}:{self._hash(*fechas)}"
+
+    # =========================================================================
+    # ESCRITURA
+    # =========================================================================
+
+    def marcar_activo(self, user_id: int, fecha: str = None):
+        fecha = fecha or datetime.now().strftime("%Y-%m-%d")
+        self.r.setbit(self._clave(fecha), user_id, 1)
+
+    def marcar_lote(self, user_ids, fecha: str = None, bloque: int = 1000):
+        """Marca muchos usuarios con BITFIELD SET (un comando por bloque, en pipeline)."""
+        fecha = fecha or datetime.now().strftime("%Y-%m-%d")
+        pipe = self.r.pipeline(transaction=False)
+        campo = self.r.bitfield(self._clave(fecha))
+        for i, user_id in enumerate(user_ids, 1):
+            campo.set("u1", user_id, 1)
+            if i % bloque == 0:
+                pipe.execute_command(*campo.command)
+                campo = self.r.bitfield(self._clave(fecha))
+        if campo.operations:
+            pipe.execute_command(*campo.command)
+        pipe.execute()
+
+    # =========================================================================
+    # CONSULTAS EN REDIS
+    # =========================================================================
+
+    def _contar(self, consultas: list, conservar: bool = True) -> list:
+        """
+        consultas = [(op, [fechas])]. Un solo pipeline con un script por
+        consulta: reutiliza la clave destino si existe o hace BITOP y
+        BITCOUNT. Con `conservar` la clave queda `ttl` segundos para
+        reutilizarla; si no, se borra dentro del mismo script.
+        """
+        pipe = self.r.pipeline(transaction=False)
+        for op, fechas in consultas:
+            if len(fechas) == 1:
+                pipe.bitcount(self._clave(fechas[0]))
+                continue
+            self._lua_contar(
+                keys=[self._destino(op, fechas)] + [self._clave(f) for f in fechas],
+                args=[op, self.ttl if conservar else 0],
+                client=pipe
+            )
+        return pipe.execute()
+
+    def _cacheado(self, nombre: str, calcular, *partes):
+        """Resultado guardado `ttl` segundos en <prefijo>:analitica:<nombre>:<hash>."""
+        clave = f"{self.prefijo}:analitica:{nombre}:{self._hash(*partes)}"
+        guardado = self.r.get(clave)
+        if guardado is not None:
+            return json.loads(guardado)
+        resultado = calcular()
+        self.r.setex(clave, self.ttl, json.dumps(resultado))
+        return resultado
+
+    def todos(self, fechas: list) -> int:
+        """Usuarios activos en TODOS los días (BITOP AND)."""
+        return self._contar([("AND", list(fechas))])[0]
+
+    def alguno(self, fechas: list) -> int:
+        """Usuarios activos en ALGUNO de los días (BITOP OR)."""
+        return self._contar([("OR", list(fechas))])[0]
+
+    def activos_en_rango(self, fechas: list) -> int:
+        """Como en el notebook, pero sin la clave compartida `activos:rango`."""
+        return self.todos(fechas)
+
+    def retencion(self, desde, cohortes: int = 7, periodos: int = 7) -> dict:
+        """
+        Matriz de retención diaria: para la cohorte del día c, qué fracción
+        sigue activa c+1 … c+periodos días después. Cohorte = activos ese
+        día. Un solo pipeline para toda la matriz (y resultado cacheado).
+        """
+        dias = _fechas_rango(desde, cohortes + periodos)
+
+        def calcular():
+            consultas = [("AND", [dias[c]]) for c in range(cohortes)]
+            consultas += [
+                ("AND", [dias[c], dias[c + p]])
+                for c in range(cohortes) for p in range(1, periodos + 1)
+            ]
+            conteos = self._contar(consultas, conservar=False)  # Ya se cachea la matriz
+            return self._matriz(dias, cohortes, periodos, conteos[:cohortes], conteos[cohortes:])
+
+        return self._cacheado("retencion", calcular, dias[0], cohortes, periodos)
+
+    @staticmethod
+    def _matriz(dias, cohortes, periodos, tamanos, cruces) -> dict:
+        matriz = []
+        for c in range(cohortes):
+            fila = cruces[c * periodos:(c + 1) * periodos]
+            matriz.append([round(n / tamanos[c] * 100, 2) if tamanos[c] else 0 for n in fila])
+        return {"cohortes": dias[:cohortes], "tamanos": tamanos, "retencion_pct": matriz}
+
+    # =========================================================================
+    # CÁLCULO LOCAL (NumPy)
+    # =========================================================================
+
+    def _binario(self):
+        if self._r_bin is None:
+            # Mismo servidor que self.r, pero sin decodificar (los bitmaps son bytes)
+            pool = self.r.connection_pool
+            opciones = dict(pool.connection_kwargs, decode_responses=False)
+            self._r_bin = redis.Redis(connection_pool=redis.ConnectionPool(
+                connection_class=pool.connection_class, **opciones))
+        return self._r_bin
+
+    def bitmaps(self, fechas: list) -> dict:
+        """Descarga los bitmaps (un pipeline de GET) como arrays uint8 del mismo tamaño."""
+        if np is None:
+            raise RuntimeError("retencion_local necesita numpy (pip install numpy)")
+        pipe = self._binario().pipeline(transaction=False)
+        for fecha in fechas:
+            pipe.get(self._clave(fecha))
+        crudos = [datos or b"" for datos in pipe.execute()]
+
+        largo = max((len(c) for c in crudos), default=0)
+        resultado = {}
+        for fecha, datos in zip(fechas, crudos):
+            array = np.zeros(largo, dtype=np.uint8)
+            array[:len(datos)] = np.frombuffer(datos, dtype=np.uint8)
+            resultado[fecha] = array
+        return resultado
+
+    def retencion_local(self, desde, cohortes: int = 7, periodos: int = 7) -> dict:
+        """Igual que `retencion` pero cruzando los bitmaps en local con NumPy."""
+        dias = _fechas_rango(desde, cohortes + periodos)
+        mapas = self.bitmaps(dias)
+        contar = np.bitwise_count if hasattr(np, "bitwise_count") else (
+            lambda a: np.unpackbits(a)  # NumPy < 2.0
+        )
+
+        tamanos = [int(contar(mapas[dias[c]]).sum()) for c in range(cohortes)]
+        cruces = [
+            int(contar(mapas[dias[c]] & mapas[dias[c + p]]).sum())
+            for c in range(cohortes) for p in range(1, periodos + 1)
+        ]
+        return self._matriz(dias, cohortes, periodos, tamanos, cruces)
@@ -0,0 +1,126 @@
+"""
+⏱️ Benchmark de la analítica de bitmaps: un año de días con millones de usuarios
+
+1. Carga `--dias` bitmaps diarios de `--usuarios` bits (un SET por día,
+   con una fracción `--actividad` de usuarios activos).
+2. Usuarios activos en todos los días de 7, 30 y 365 días: el
+   `activos_en_rango` del notebook (clave compartida `activos:rango`)
+   frente a `todos()` en frío y con el resultado ya calculado.
+3. Matriz de retención `--cohortes` x `--cohortes`: en Redis (un
+   pipeline, luego cacheada) y en local con NumPy.
+
+Uso:
+    python bench_analitica.py
+    python bench_analitica.py --usuarios 1000000 --dias 90
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import redis
+
+from analitica_bitmaps import AnaliticaActividad, np
+
+PREFIJO = "bench_activos"
+
+
+def cronometrar(funcion) -> float:
+    """Milisegundos de una llamada."""
+    inicio = time.perf_counter()
+    funcion()
+    return round((time.perf_counter() - inicio) * 1000, 2)
+
+
+def bitmap_aleatorio(usuarios: int, actividad: float) -> bytes:
+    """Bitmap con ~`actividad` de los bits a 1 (bit 0 = bit alto del primer byte, como SETBIT)."""
+    if np is None:
+        return os.urandom((usuarios + 7) // 8)  # Sin NumPy: la mitad de los bits
+    return np.packbits(np.random.random(usuarios) < actividad).tobytes()
+
+
+def original(r, fechas: list) -> int:
+    """`UsuariosActivos.activos_en_rango` del notebook."""
+    claves = [f"{PREFIJO}:{f}" for f in fechas]
+    r.bitop("AND", f"{PREFIJO}:rango", *claves)
+    return r.bitcount(f"{PREFIJO}:rango")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la analítica de bitmaps")
+    parser.add_argument("--usuarios", type=int, default=10000000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--actividad", type=float, default=0.3, help="Fracción de usuarios activos cada día")
+    parser.add_argument("--cohortes", type=int, default=30, help="Cohortes (y periodos) de la matriz de retención")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    host = os.environ.get("REDIS_HOST", "localhost")
+    port = int(os.environ.get("REDIS_PORT", 6379))
+    r = redis.Redis(host=host, port=port, decode_responses=True)
+    r_bin = redis.Redis(host=host, port=port)
+    r.ping()
+    if np is not None:
+        np.random.seed(42)
+
+    for clave in r.scan_iter(match=f"{PREFIJO}:*", count=1000):
+        r.delete(clave)
+    analitica = AnaliticaActividad(r, prefijo=PREFIJO, ttl=600, redis_binario=r_bin)
+    desde = date.today() - timedelta(days=args.dias - 1)
+    fechas = [(desde + timedelta(days=d)).isoformat() for d in range(args.dias)]
+    resultados = {"usuarios": args.usuarios, "dias": args.dias}
+
+    # 1. Carga
+    inicio = time.perf_counter()
+    pipe = r_bin.pipeline(transaction=False)
+    for i, fecha in enumerate(fechas, 1):
+        pipe.set(f"{PREFIJO}:{fecha}", bitmap_aleatorio(args.usuarios, args.actividad))
+        if i % 10 == 0:
+            pipe.execute()
+    pipe.execute()
+    resultados["carga_s"] = round(time.perf_counter() - inicio, 2)
+    resultados["memoria_dia_mb"] = round((r.memory_usage(f"{PREFIJO}:{fechas[0]}") or 0) / 1e6, 2)
+
+    # 2. AND sobre rangos
+    for n in (7, 30, 365):
+        if n > args.dias:
+            continue
+        rango = fechas[-n:]
+        resultados[f"original_{n}d_ms"] = cronometrar(lambda: original(r, rango))
+        resultados[f"todos_{n}d_frio_ms"] = cronometrar(lambda: analitica.todos(rango))
+        resultados[f"todos_{n}d_cache_ms"] = cronometrar(lambda: analitica.todos(rango))
+        resultados[f"alguno_{n}d_frio_ms"] = cronometrar(lambda: analitica.alguno(rango))
+
+    # 3. Retención
+    cohortes = min(args.cohortes, args.dias // 2)
+    inicio_cohortes = fechas[-2 * cohortes]
+    resultados["retencion_celdas"] = cohortes * cohortes
+    resultados["retencion_redis_ms"] = cronometrar(
+        lambda: analitica.retencion(inicio_cohortes, cohortes, cohortes))
+    resultados["retencion_cache_ms"] = cronometrar(
+        lambda: analitica.retencion(inicio_cohortes, cohortes, cohortes))
+    if np is not None:
+        resultados["retencion_numpy_ms"] = cronometrar(
+            lambda: analitica.retencion_local(inicio_cohortes, cohortes, cohortes))
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"🔢 {args.usuarios} usuarios x {args.dias} días ({resultados['memoria_dia_mb']} MB por día)")
+    print(f"   Carga:                 {resultados['carga_s']} s")
+    print(f"   {'días':>6}{'original':>11}{'todos frío':>12}{'todos caché':>13}{'alguno frío':>13}  (ms)")
+    for n in (7, 30, 365):
+        if f"original_{n}d_ms" in resultados:
+            print(f"   {n:>6}{resultados[f'original_{n}d_ms']:>11}{resultados[f'todos_{n}d_frio_ms']:>12}"
+                  f"{resultados[f'todos_{n}d_cache_ms']:>13}{resultados[f'alguno_{n}d_frio_ms']:>13}")
+    print(f"   Retención {cohortes}x{cohortes} en Redis:  {resultados['retencion_redis_ms']} ms")
+    print(f"   Retención cacheada:        {resultados['retencion_cache_ms']} ms")
+    if "retencion_numpy_ms" in resultados:
+        print(f"   Retención con NumPy:       {resultados['retencion_numpy_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+⏱️ Benchmark de la cola de tareas: tareas/segundo según el número de trabajadores
+
+Para cada número de procesos encola N tareas con `encolar_lote`, arranca
+`ejecutar_pool` y mide cuánto tarda en vaciarse la cola. Como referencia
+mide también la `ColaTareas` original (RPUSH + LLEN y LPOP en bucle, un
+solo consumidor).
+
+Uso:
+    python bench_cola.py
+    python bench_cola.py --tareas 50000 --procesos 1,2,4,8 --lote 50 --trabajo-ms 1
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import redis
+
+from cola_tareas import ColaTareas, ejecutar_pool
+
+
+def tarea_bench(tarea):
+    if tarea.get("ms"):
+        time.sleep(tarea["ms"] / 1000)
+
+
+def legado(r, n: int, ms: float) -> float:
+    """Lo que hacía el notebook: RPUSH + LLEN por tarea y LPOP hasta vaciar."""
+    clave = "cola:bench_legado"
+    r.delete(clave)
+    for i in range(n):
+        r.rpush(clave, json.dumps({"i": i, "ms": ms}))
+        r.llen(clave)
+
+    inicio = time.perf_counter()
+    while r.llen(clave) > 0:
+        tarea_bench(json.loads(r.lpop(clave)))
+    return time.perf_counter() - inicio
+
+
+def con_pool(conexion, n: int, procesos: int, lote: int, ms: float) -> dict:
+    r = redis.Redis(**conexion)
+    cola = ColaTareas(r, "bench")
+    r.delete(cola.cola, f"{cola.cola}:plazos", f"{cola.cola}:intentos", f"{cola.cola}:muertas",
+             f"{cola.cola}:metricas")
+
+    inicio = time.perf_counter()
+    cola.encolar_lote({"i": i, "ms": ms} for i in range(n))
+    t_encolar = time.perf_counter() - inicio
+
+    parar = multiprocessing.Event()
+    inicio = time.perf_counter()
+    hilo = threading.Thread(
+        target=ejecutar_pool, args=("bench", tarea_bench),
+        kwargs={"procesos": procesos, "lote": lote, "conexion": conexion, "parar": parar}
+    )
+    hilo.start()
+    while True:
+        estado = cola.metricas()
+        if not estado["pendientes"] and not estado["en_proceso"]:
+            break
+        time.sleep(0.01)
+    segundos = time.perf_counter() - inicio
+    parar.set()
+    hilo.join()
+
+    latencias = cola.metricas()["latencias"]
+    return {
+        "procesos": procesos,
+        "encolar_por_segundo": round(n / t_encolar),
+        "tareas_por_segundo": round(n / segundos),
+        "espera_p50_s": latencias.get("espera", {}).get("p50_s"),
+        "espera_p99_s": latencias.get("espera", {}).get("p99_s"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la cola de tareas")
+    parser.add_argument("--tareas", type=int, default=20000)
+    parser.add_argument("--procesos", default="1,2,4,8", help="Números de trabajadores separados por comas")
+    parser.add_argument("--lote", type=int, default=20, help="Tareas por toma")
+    parser.add_argument("--trabajo-ms", type=float, default=0, help="Duración simulada de cada tarea")
+    parser.add_argument("--sin-legado", action="store_true", help="No medir la cola original")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    conexion = {"host": os.environ.get("REDIS_HOST", "localhost"),
+                "port": int(os.environ.get("REDIS_PORT", 6379)), "decode_responses": True}
+    r = redis.Redis(**conexion)
+    r.ping()
+
+    resultados = {"tareas": args.tareas, "lote": args.lote, "trabajo_ms": args.trabajo_ms}
+    if not args.sin_legado:
+        segundos = legado(r, args.tareas, args.trabajo_ms)
+        resultados["legado_tareas_por_segundo"] = round(args.tareas / segundos)
+    resultados["pool"] = [
+        con_pool(conexion, args.tareas, int(p), args.lote, args.trabajo_ms)
+        for p in args.procesos.split(",") if p.strip()
+    ]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"📋 {args.tareas} tareas, lote {args.lote}, {args.trabajo_ms} ms por tarea")
+    if "legado_tareas_por_segundo" in resultados:
+        print(f"   Original (LPOP en bucle, 1 consumidor): {resultados['legado_tareas_por_segundo']} tareas/s")
+    print(f"   {'procesos':>8}{'encolar/s':>12}{'tareas/s':>12}{'espera p50':>12}{'espera p99':>12}")
+    for f in resultados["pool"]:
+        print(f"   {f['procesos']:>8}{f['encolar_por_segundo']:>12}{f['tareas_por_segundo']:>12}"
+              f"{str(f['espera_p50_s']):>12}{str(f['espera_p99_s']):>12}")
+
+
+if __name__ == "__main__":
+    main()
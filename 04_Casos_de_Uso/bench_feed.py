@@ -0,0 +1,100 @@
+"""
+⏱️ Benchmark del feed: coste de publicar según el número de seguidores
+
+Para cada tamaño de audiencia crea un autor con N seguidores y mide:
+
+    original  un ZADD por seguidor (FeedNoticias del notebook)
+    push      fan-out en bloques con pipeline (feed.py, umbral alto)
+    pull      sin fan-out; se mezcla al leer (feed.py, umbral 0)
+
+y la latencia de leer el feed de un seguidor en push y en pull.
+
+Uso:
+    python bench_feed.py
+    python bench_feed.py --seguidores 100,1000,10000,100000 --sin-original
+"""
+
+import argparse
+import json
+import os
+import time
+
+import redis
+
+from feed import FeedNoticias
+
+
+def preparar(r, autor: str, n: int):
+    """Crea `n` seguidores de `autor` (y el SET inverso siguiendo:)."""
+    r.delete(f"seguidores:{autor}", f"posts:{autor}")
+    pipe = r.pipeline(transaction=False)
+    for inicio in range(0, n, 1000):
+        bloque = [f"lector{i}" for i in range(inicio, min(n, inicio + 1000))]
+        pipe.sadd(f"seguidores:{autor}", *bloque)
+        for lector in bloque:
+            pipe.sadd(f"siguiendo:{lector}", autor)
+        pipe.execute()
+
+
+def original(r, usuario: str, post_id: str):
+    """Lo que hacía el notebook: SMEMBERS y un ZADD por seguidor."""
+    timestamp = time.time()
+    r.hset(f"post:{post_id}", mapping={"autor": usuario, "contenido": "x"})
+    for seguidor in r.smembers(f"seguidores:{usuario}"):
+        r.zadd(f"feed:{seguidor}", {post_id: timestamp})
+    r.zadd(f"feed:{usuario}", {post_id: timestamp})
+
+
+def cronometrar(funcion, repeticiones: int = 1) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del fan-out del feed")
+    parser.add_argument("--seguidores", default="100,1000,10000,100000")
+    parser.add_argument("--bloque", type=int, default=1000, help="Seguidores por pipeline")
+    parser.add_argument("--lecturas", type=int, default=200, help="Lecturas de feed a promediar")
+    parser.add_argument("--sin-original", action="store_true", help="No medir un ZADD por seguidor")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    r = redis.Redis(host=os.environ.get("REDIS_HOST", "localhost"),
+                    port=int(os.environ.get("REDIS_PORT", 6379)), decode_responses=True)
+    r.ping()
+
+    filas = []
+    for n in [int(x) for x in args.seguidores.split(",") if x.strip()]:
+        autor = f"bench_autor_{n}"
+        preparar(r, autor, n)
+        fila = {"seguidores": n}
+
+        if not args.sin_original:
+            fila["original_ms"] = round(cronometrar(lambda: original(r, autor, f"bench:{n}:o")), 2)
+
+        push = FeedNoticias(r, umbral=n + 1, bloque=args.bloque)
+        fila["push_ms"] = round(cronometrar(lambda: push.publicar(autor, f"bench:{n}:push", "x")), 2)
+        fila["leer_push_ms"] = round(cronometrar(lambda: push.obtener_feed("lector0", 20), args.lecturas), 3)
+
+        pull = FeedNoticias(r, umbral=0, bloque=args.bloque)
+        fila["pull_ms"] = round(cronometrar(lambda: pull.publicar(autor, f"bench:{n}:pull", "x")), 2)
+        fila["leer_pull_ms"] = round(cronometrar(lambda: pull.obtener_feed("lector0", 20), args.lecturas), 3)
+        r.srem(FeedNoticias.CELEBRIDADES, autor)
+
+        filas.append(fila)
+
+    if args.json:
+        print(json.dumps(filas, indent=2))
+        return
+
+    print(f"📰 Publicar un post (ms) y leer un feed de 20 (ms), bloques de {args.bloque}")
+    print(f"   {'seguidores':>10}{'original':>10}{'push':>10}{'pull':>10}{'leer push':>11}{'leer pull':>11}")
+    for f in filas:
+        print(f"   {f['seguidores']:>10}{str(f.get('original_ms', '-')):>10}{f['push_ms']:>10}"
+              f"{f['pull_ms']:>10}{f['leer_push_ms']:>11}{f['leer_pull_ms']:>11}")
+
+
+if __name__ == "__main__":
+    main()
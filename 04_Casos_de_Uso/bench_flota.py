@@ -0,0 +1,130 @@
+"""
+⏱️ Benchmark de la flota: pings por segundo y latencia de búsqueda
+
+Con `--vehiculos` vehículos repartidos por Madrid mide:
+
+1. Ingesta de pings:
+       original   un GEOADD por ping (FlotaVehiculos del notebook)
+       ingerir    lotes con los duplicados por vehículo colapsados
+       stream     XADD al stream + consumir_stream (XREADGROUP/XACK)
+2. Latencia de `vehiculos_cercanos` (p50/p99) desde `--puntos` puntos
+   que se repiten: sin límite, COUNT, COUNT ANY y COUNT con caché por celda.
+
+Uso:
+    python bench_flota.py
+    python bench_flota.py --vehiculos 100000 --rondas 5 --consultas 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import redis
+
+from flota import FlotaVehiculos
+
+# Madrid, más o menos
+LNG = (-3.80, -3.60)
+LAT = (40.35, 40.50)
+
+
+def punto():
+    return random.uniform(*LNG), random.uniform(*LAT)
+
+
+def pings(vehiculos: int, duplicados: int):
+    """Una ronda: cada vehículo manda `duplicados` pings (el último es el bueno)."""
+    for i in range(vehiculos):
+        lng, lat = punto()
+        for d in range(duplicados):
+            yield f"vehiculo{i}", lng + d * 1e-5, lat, time.time()
+
+
+def latencias(funcion, repeticiones: int) -> dict:
+    """p50 y p99 en milisegundos."""
+    muestras = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        muestras.append((time.perf_counter() - inicio) * 1000)
+    cuantiles = statistics.quantiles(muestras, n=100)
+    return {"p50_ms": round(cuantiles[49], 3), "p99_ms": round(cuantiles[98], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta y búsqueda de la flota")
+    parser.add_argument("--vehiculos", type=int, default=100000)
+    parser.add_argument("--rondas", type=int, default=3, help="Rondas de pings de toda la flota")
+    parser.add_argument("--duplicados", type=int, default=2, help="Pings por vehículo en cada ronda")
+    parser.add_argument("--muestra", type=int, default=20000, help="Pings de la referencia un-GEOADD-por-ping")
+    parser.add_argument("--radio", type=float, default=1.0, help="Radio de búsqueda en km")
+    parser.add_argument("--puntos", type=int, default=50, help="Puntos distintos desde los que se busca")
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    r = redis.Redis(host=os.environ.get("REDIS_HOST", "localhost"),
+                    port=int(os.environ.get("REDIS_PORT", 6379)), decode_responses=True)
+    r.ping()
+    random.seed(42)
+
+    flota = FlotaVehiculos(r, key="bench:flota", max_pendientes=args.vehiculos)
+    r.delete(flota.key, flota.key_visto, flota.key_stream)
+    resultados = {"vehiculos": args.vehiculos}
+
+    # 1. Ingesta
+    muestra = list(pings(args.muestra, 1))
+    inicio = time.perf_counter()
+    for vehiculo_id, lng, lat, _ in muestra:
+        r.geoadd(flota.key, (lng, lat, vehiculo_id))
+    resultados["original_pings_por_segundo"] = round(args.muestra / (time.perf_counter() - inicio))
+
+    total = 0
+    inicio = time.perf_counter()
+    for _ in range(args.rondas):
+        ronda = list(pings(args.vehiculos, args.duplicados))
+        total += len(ronda)
+        flota.ingerir(ronda)
+    resultados["ingerir_pings_por_segundo"] = round(total / (time.perf_counter() - inicio))
+
+    ronda = list(pings(args.vehiculos, args.duplicados))
+    inicio = time.perf_counter()
+    flota.publicar(ronda)
+    resultados["stream_publicar_por_segundo"] = round(len(ronda) / (time.perf_counter() - inicio))
+    inicio = time.perf_counter()
+    flota.consumir_stream(grupo="bench", salir_si_vacio=True, bloquear_ms=100)
+    resultados["stream_consumir_por_segundo"] = round(len(ronda) / (time.perf_counter() - inicio))
+
+    # 2. Búsquedas desde puntos que se repiten (clientes en las mismas zonas)
+    puntos = [punto() for _ in range(args.puntos)]
+    casos = {
+        "sin_limite": dict(cache=False),
+        "count_10": dict(count=10, cache=False),
+        "count_10_any": dict(count=10, any=True, cache=False),
+        "count_10_cache": dict(count=10),
+    }
+    for nombre, opciones in casos.items():
+        resultados[nombre] = latencias(
+            lambda: flota.vehiculos_cercanos(*random.choice(puntos), args.radio, **opciones), args.consultas
+        )
+    resultados["vehiculos_en_radio"] = len(flota.vehiculos_cercanos(*puntos[0], args.radio, cache=False))
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"🚕 {args.vehiculos} vehículos, {args.duplicados} pings por vehículo y ronda")
+    print(f"   GEOADD por ping:      {resultados['original_pings_por_segundo']} pings/s")
+    print(f"   ingerir (lotes):      {resultados['ingerir_pings_por_segundo']} pings/s")
+    print(f"   Stream (publicar):    {resultados['stream_publicar_por_segundo']} pings/s")
+    print(f"   Stream (consumir):    {resultados['stream_consumir_por_segundo']} pings/s")
+    print(f"   Búsqueda a {args.radio} km (~{resultados['vehiculos_en_radio']} vehículos):")
+    for nombre in casos:
+        print(f"   {nombre:>16}: p50 {resultados[nombre]['p50_ms']} ms, p99 {resultados[nombre]['p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+⏱️ Benchmark del leaderboard con millones de jugadores
+
+1. Carga `--jugadores` jugadores con `actualizar_lote` (eventos/segundo)
+   y, como referencia, una muestra con un ZINCRBY por evento.
+2. Ficha de un jugador: tres round trips (posición, puntuación, top)
+   frente a `ficha()` (Lua, una llamada).
+3. Top-10 sin caché frente al snapshot en memoria de `top()`.
+4. Tablero semanal: ZUNIONSTORE de los días de la semana.
+
+Uso:
+    python bench_leaderboard.py
+    python bench_leaderboard.py --jugadores 5000000 --eventos 2000000
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+import redis
+
+from leaderboard import Leaderboard
+
+
+def cronometrar(funcion, repeticiones: int) -> float:
+    """Milisegundos por llamada."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return round((time.perf_counter() - inicio) / repeticiones * 1000, 4)
+
+
+def eventos(n: int, jugadores: int):
+    for _ in range(n):
+        yield f"jugador{random.randrange(jugadores)}", random.randint(1, 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del leaderboard")
+    parser.add_argument("--jugadores", type=int, default=2000000)
+    parser.add_argument("--eventos", type=int, default=1000000, help="Eventos tras la carga inicial")
+    parser.add_argument("--muestra", type=int, default=20000, help="Eventos de la referencia un-ZINCRBY-por-evento")
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    r = redis.Redis(host=os.environ.get("REDIS_HOST", "localhost"),
+                    port=int(os.environ.get("REDIS_PORT", 6379)), decode_responses=True)
+    r.ping()
+    random.seed(42)
+
+    lb = Leaderboard(r, "bench")
+    r.delete(lb.key, lb.tablero("dia"))
+    for clave in r.scan_iter(match=f"{lb.key}:semana:*"):
+        r.delete(clave)
+    resultados = {"jugadores": args.jugadores}
+
+    # 1. Carga
+    inicio = time.perf_counter()
+    for desde in range(0, args.jugadores, 100000):
+        hasta = min(args.jugadores, desde + 100000)
+        lb.actualizar_lote((f"jugador{i}", random.randint(0, 100000)) for i in range(desde, hasta))
+    resultados["carga_jugadores_por_segundo"] = round(args.jugadores / (time.perf_counter() - inicio))
+
+    inicio = time.perf_counter()
+    lb.actualizar_lote(eventos(args.eventos, args.jugadores))
+    resultados["lote_eventos_por_segundo"] = round(args.eventos / (time.perf_counter() - inicio))
+
+    muestra = list(eventos(args.muestra, args.jugadores))
+    inicio = time.perf_counter()
+    for jugador, puntos in muestra:
+        r.zincrby(lb.key, puntos, jugador)
+    resultados["uno_a_uno_eventos_por_segundo"] = round(args.muestra / (time.perf_counter() - inicio))
+
+    # 2. Ficha del jugador
+    def tres_llamadas():
+        jugador = f"jugador{random.randrange(args.jugadores)}"
+        lb.posicion(jugador)
+        lb.puntuacion(jugador)
+        lb.r.zrevrange(lb.key, 0, 9, withscores=True)
+
+    resultados["ficha_tres_llamadas_ms"] = cronometrar(tres_llamadas, args.consultas)
+    resultados["ficha_lua_ms"] = cronometrar(
+        lambda: lb.ficha(f"jugador{random.randrange(args.jugadores)}", vecinos=5), args.consultas
+    )
+
+    # 3. Top-10
+    resultados["top_sin_cache_ms"] = cronometrar(
+        lambda: r.zrevrange(lb.key, 0, 9, withscores=True), args.consultas
+    )
+    resultados["top_con_cache_ms"] = cronometrar(lambda: lb.top(10), args.consultas)
+
+    # 4. Semana (la primera llamada hace el ZUNIONSTORE)
+    inicio = time.perf_counter()
+    lb.tablero("semana")
+    resultados["union_semana_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    resultados["memoria_tablero_mb"] = round((r.memory_usage(lb.key) or 0) / 1e6, 1)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"🏆 {args.jugadores} jugadores ({resultados['memoria_tablero_mb']} MB)")
+    print(f"   Carga inicial:        {resultados['carga_jugadores_por_segundo']} jugadores/s")
+    print(f"   actualizar_lote:      {resultados['lote_eventos_por_segundo']} eventos/s")
+    print(f"   ZINCRBY por evento:   {resultados['uno_a_uno_eventos_por_segundo']} eventos/s")
+    print(f"   Ficha (3 llamadas):   {resultados['ficha_tres_llamadas_ms']} ms")
+    print(f"   Ficha (Lua):          {resultados['ficha_lua_ms']} ms")
+    print(f"   Top-10 sin caché:     {resultados['top_sin_cache_ms']} ms")
+    print(f"   Top-10 con caché:     {resultados['top_con_cache_ms']} ms")
+    print(f"   Unión semanal:        {resultados['union_semana_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
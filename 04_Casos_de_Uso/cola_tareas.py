@@ -0,0 +1,397 @@
+"""
+📋 Cola de tareas fiable sobre listas de Redis
+
+Versión reutilizable de `ColaTareas` (04_casos_uso_reales.ipynb):
+
+    cola:<nombre>                          LIST  tareas pendientes (RPUSH / LMOVE)
+    cola:<nombre>:procesando:<trabajador>  LIST  tareas tomadas por cada trabajador
+    cola:<nombre>:plazos                   ZSET  "<trabajador>|<tarea>" -> vencimiento
+    cola:<nombre>:trabajadores             SET   trabajadores con lista de proceso
+    cola:<nombre>:intentos                 HASH  tarea -> intentos vencidos (si los hay)
+    cola:<nombre>:muertas                  LIST  tareas que agotaron sus intentos
+    cola:<nombre>:metricas                 HASH  histogramas de espera y proceso
+
+- Los trabajadores no hacen polling: esperan con BLMOVE, que además mueve
+  la tarea a su lista de proceso en la misma operación (si el proceso
+  muere, la tarea sigue en Redis).
+- Se encola y se toma por lotes (un RPUSH / un script Lua por lote).
+- Cada tarea tomada tiene un plazo (`visibilidad`). Si no se confirma a
+  tiempo, `recuperar()` la devuelve al principio de la cola, en el orden
+  en que se tomaron; tras `max_intentos` pasa a la lista de muertas. La
+  tarea se reencola tal cual (los intentos van en su propio HASH).
+- `ejecutar_pool()` arranca N procesos trabajadores y el recuperador.
+
+Uso:
+    python cola_tareas.py estado emails
+    python cola_tareas.py recuperar emails
+"""
+
+import bisect
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import uuid
+
+import redis
+
+
+# Toma hasta ARGV[3] tareas más (LMOVE) y registra el plazo de todas.
+# ARGV[4], si viene, es la tarea que ya movió BLMOVE.
+# Devuelve {tareas, intentos de cada una (HMGET de KEYS[5])}.
+LUA_TOMAR = """
+local tomadas = {}
+if ARGV[4] then
+    table.insert(tomadas, ARGV[4])
+end
+for i = 1, tonumber(ARGV[3]) do
+    local tarea = redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT')
+    if not tarea then
+        break
+    end
+    table.insert(tomadas, tarea)
+end
+for _, tarea in ipairs(tomadas) do
+    redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1] .. '|' .. tarea)
+end
+if #tomadas == 0 then
+    return {{}, {}}
+end
+redis.call('SADD', KEYS[4], ARGV[1])
+return {tomadas, redis.call('HMGET', KEYS[5], unpack(tomadas))}
+"""
+
+# Devuelve a la cola (o a muertas) las tareas con el plazo vencido.
+# Las tareas no se decodifican: vuelven a la cola byte a byte y los
+# intentos se cuentan en KEYS[4]. Se reencolan al principio en el orden
+# en que se tomaron (plazo y posición en la lista de proceso).
+LUA_RECUPERAR = """
+local vencidas = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+local recuperadas = {}
+for i = 1, #vencidas, 2 do
+    local miembro = vencidas[i]
+    redis.call('ZREM', KEYS[1], miembro)
+    local sep = string.find(miembro, '|', 1, true)
+    local trabajador = string.sub(miembro, 1, sep - 1)
+    local tarea = string.sub(miembro, sep + 1)
+    local pos = redis.call('LPOS', ARGV[4] .. trabajador, tarea)
+    if pos then
+        table.insert(recuperadas, {tonumber(vencidas[i + 1]), trabajador, pos, tarea})
+    end
+end
+table.sort(recuperadas, function(a, b)
+    if a[1] ~= b[1] then return a[1] < b[1] end
+    if a[2] ~= b[2] then return a[2] < b[2] end
+    return a[3] < b[3]
+end)
+
+local reencolar, muertas = {}, 0
+for _, r in ipairs(recuperadas) do
+    local tarea = r[4]
+    redis.call('LREM', ARGV[4] .. r[2], 1, tarea)
+    if redis.call('HINCRBY', KEYS[4], tarea, 1) >= tonumber(ARGV[3]) then
+        redis.call('HDEL', KEYS[4], tarea)
+        redis.call('RPUSH', KEYS[3], tarea)
+        muertas = muertas + 1
+    else
+        table.insert(reencolar, tarea)
+    end
+end
+-- LPUSH de la última a la primera: la primera queda en la cabeza
+for i = #reencolar, 1, -1 do
+    redis.call('LPUSH', KEYS[2], reencolar[i])
+end
+return {#reencolar, muertas}
+"""
+
+
+def nombre_trabajador() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ColaTareas:
+    """Cola FIFO con confirmación, plazos de visibilidad y reintentos."""
+
+    LIMITES = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+
+    def __init__(self, redis_client, nombre_cola="tareas", visibilidad=30, max_intentos=5):
+        self.r = redis_client
+        self.cola = f"cola:{nombre_cola}"
+        self.visibilidad = visibilidad
+        self.max_intentos = max_intentos
+        self._plazos = f"{self.cola}:plazos"
+        self._trabajadores = f"{self.cola}:trabajadores"
+        self._intentos = f"{self.cola}:intentos"
+        self._muertas = f"{self.cola}:muertas"
+        self._metricas = f"{self.cola}:metricas"
+        self._lua_tomar = self.r.register_script(LUA_TOMAR)
+        self._lua_recuperar = self.r.register_script(LUA_RECUPERAR)
+
+    def _procesando(self, trabajador):
+        return f"{self.cola}:procesando:{trabajador}"
+
+    @staticmethod
+    def _sobre(tarea: dict) -> str:
+        return json.dumps({
+            "id": uuid.uuid4().hex,
+            "tarea": tarea,
+            "encolada": time.time()
+        }, ensure_ascii=False)
+
+    # =========================================================================
+    # PRODUCTOR
+    # =========================================================================
+
+    def encolar(self, tarea: dict) -> int:
+        """Añade una tarea; devuelve la longitud de la cola (la del RPUSH)."""
+        return self.r.rpush(self.cola, self._sobre(tarea))
+
+    def encolar_lote(self, tareas, lote: int = 1000) -> int:
+        """Encola muchas tareas con un RPUSH de `lote` en `lote`, en un pipeline."""
+        pipe = self.r.pipeline(transaction=False)
+        bloque = []
+        for tarea in tareas:
+            bloque.append(self._sobre(tarea))
+            if len(bloque) >= lote:
+                pipe.rpush(self.cola, *bloque)
+                bloque = []
+        if bloque:
+            pipe.rpush(self.cola, *bloque)
+        longitudes = pipe.execute()
+        return longitudes[-1] if longitudes else self.pendientes()
+
+    # =========================================================================
+    # TRABAJADOR
+    # =========================================================================
+
+    def tomar(self, trabajador: str, n: int = 1, timeout: float = 1.0) -> list:
+        """
+        Hasta `n` tareas para `trabajador`. Si la cola está vacía espera
+        hasta `timeout` segundos con BLMOVE (0 = sin esperar).
+        """
+        claves = [self.cola, self._procesando(trabajador), self._plazos, self._trabajadores,
+                  self._intentos]
+        plazo = time.time() + self.visibilidad
+
+        tomadas, intentos = self._lua_tomar(keys=claves, args=[trabajador, plazo, n])
+        if not tomadas and timeout:
+            self.r.sadd(self._trabajadores, trabajador)  # Antes del BLMOVE: recuperar() debe ver su lista
+            primera = self.r.blmove(self.cola, claves[1], timeout, "LEFT", "RIGHT")
+            if primera is None:
+                return []
+            plazo = time.time() + self.visibilidad
+            tomadas, intentos = self._lua_tomar(keys=claves, args=[trabajador, plazo, n - 1, primera])
+
+        ahora = time.time()
+        resultado = []
+        for payload, n_intentos in zip(tomadas, intentos):
+            sobre = json.loads(payload)
+            sobre["intentos"] = int(n_intentos or 0)
+            sobre["_payload"] = payload
+            sobre["_tomada"] = ahora
+            resultado.append(sobre)
+        return resultado
+
+    def confirmar(self, trabajador: str, tareas: list):
+        """Da por terminadas las tareas (y anota sus tiempos) en un pipeline."""
+        if not tareas:
+            return
+        ahora = time.time()
+        pipe = self.r.pipeline(transaction=False)
+        for sobre in tareas:
+            pipe.lrem(self._procesando(trabajador), 1, sobre["_payload"])
+            pipe.zrem(self._plazos, f"{trabajador}|{sobre['_payload']}")
+            if sobre["intentos"]:
+                pipe.hdel(self._intentos, sobre["_payload"])
+
+        contadores = {}
+        for sobre in tareas:
+            for serie, segundos in (("espera", sobre["_tomada"] - sobre["encolada"]),
+                                    ("proceso", ahora - sobre["_tomada"])):
+                bucket = bisect.bisect_left(self.LIMITES, segundos)
+                contadores[f"{serie}|{bucket}"] = contadores.get(f"{serie}|{bucket}", 0) + 1
+                contadores[f"{serie}|sum"] = contadores.get(f"{serie}|sum", 0) + segundos
+        for campo, valor in contadores.items():
+            if campo.endswith("|sum"):
+                pipe.hincrbyfloat(self._metricas, campo, valor)
+            else:
+                pipe.hincrby(self._metricas, campo, valor)
+        pipe.execute()
+
+    def procesar(self, manejador, trabajador: str = None, lote: int = 10, parar=None):
+        """
+        Bucle de un trabajador: toma lotes, llama a `manejador(tarea)` y
+        confirma las que terminan bien. Las que fallan se quedan sin
+        confirmar y vuelven a la cola al vencer su plazo.
+        """
+        trabajador = trabajador or nombre_trabajador()
+        procesadas = 0
+        try:
+            while parar is None or not parar.is_set():
+                hechas = []
+                for sobre in self.tomar(trabajador, lote):
+                    try:
+                        manejador(sobre["tarea"])
+                        hechas.append(sobre)
+                    except Exception as e:
+                        print(f"❌ Tarea {sobre['id']} falló (intento {sobre['intentos'] + 1}): {e}")
+                self.confirmar(trabajador, hechas)
+                procesadas += len(hechas)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Lo tomado y no confirmado lo recupera recuperar() al vencer
+            if not self.r.llen(self._procesando(trabajador)):
+                self.r.srem(self._trabajadores, trabajador)
+        return procesadas
+
+    # =========================================================================
+    # RECUPERACIÓN Y MÉTRICAS
+    # =========================================================================
+
+    def recuperar(self, limite: int = 1000) -> dict:
+        """
+        Reencola las tareas con el plazo vencido. Antes, da plazo a las que
+        estén en una lista de proceso sin él (el trabajador murió entre el
+        BLMOVE y el registro del plazo).
+        """
+        trabajadores = list(self.r.smembers(self._trabajadores))
+        pipe = self.r.pipeline(transaction=False)
+        for trabajador in trabajadores:
+            pipe.lrange(self._procesando(trabajador), 0, -1)
+        listas = pipe.execute()
+
+        plazo = time.time() + self.visibilidad
+        for trabajador, tareas in zip(trabajadores, listas):
+            if tareas:
+                pipe.zadd(self._plazos, {f"{trabajador}|{t}": plazo for t in tareas}, nx=True)
+        pipe.execute()
+
+        reencoladas, muertas = self._lua_recuperar(
+            keys=[self._plazos, self.cola, self._muertas, self._intentos],
+            args=[time.time(), limite, self.max_intentos, f"{self.cola}:procesando:"]
+        )
+        return {"reencoladas": reencoladas, "muertas": muertas}
+
+    def pendientes(self) -> int:
+        return self.r.llen(self.cola)
+
+    def metricas(self) -> dict:
+        """Profundidad de cada lista y percentiles aproximados de espera y proceso."""
+        trabajadores = list(self.r.smembers(self._trabajadores))
+        pipe = self.r.pipeline(transaction=False)
+        pipe.llen(self.cola)
+        pipe.zcard(self._plazos)
+        pipe.llen(self._muertas)
+        pipe.hgetall(self._metricas)
+        for trabajador in trabajadores:
+            pipe.llen(self._procesando(trabajador))
+        pendientes, en_proceso, muertas, histogramas, *por_trabajador = pipe.execute()
+
+        series = {}
+        for campo, valor in histogramas.items():
+            serie, bucket = campo.split("|")
+            series.setdefault(serie, {})[bucket] = float(valor)
+
+        latencias = {}
+        for serie, buckets in series.items():
+            conteos = [buckets.get(str(i), 0) for i in range(len(self.LIMITES) + 1)]
+            n = sum(conteos)
+            latencias[serie] = {
+                "n": int(n),
+                "media_s": round(buckets.get("sum", 0) / n, 4) if n else 0,
+                "p50_s": self._percentil(conteos, n, 0.50),
+                "p99_s": self._percentil(conteos, n, 0.99),
+            }
+
+        return {
+            "pendientes": pendientes,
+            "en_proceso": en_proceso,
+            "muertas": muertas,
+            "por_trabajador": dict(zip(trabajadores, por_trabajador)),
+            "latencias": latencias
+        }
+
+    def _percentil(self, conteos, n, p):
+        """Límite superior del bucket donde cae el percentil (None = por encima del último)."""
+        if not n:
+            return None
+        acumulado = 0
+        for i, c in enumerate(conteos):
+            acumulado += c
+            if acumulado >= n * p:
+                return self.LIMITES[i] if i < len(self.LIMITES) else None
+        return None
+
+    def reset_metricas(self):
+        self.r.delete(self._metricas)
+
+
+# =============================================================================
+# POOL DE PROCESOS
+# =============================================================================
+
+def _proceso_trabajador(conexion, nombre_cola, opciones, manejador, lote, parar):
+    r = redis.Redis(**conexion)
+    cola = ColaTareas(r, nombre_cola, **opciones)
+    cola.procesar(manejador, lote=lote, parar=parar)
+
+
+def ejecutar_pool(nombre_cola, manejador, procesos=4, lote=10, visibilidad=30,
+                  max_intentos=5, conexion=None, parar=None):
+    """
+    Arranca `procesos` trabajadores (multiprocessing) sobre la cola y
+    ejecuta el recuperador en este proceso hasta que se active `parar`
+    (un multiprocessing.Event) o llegue Ctrl+C. `manejador` debe poder
+    importarse desde los hijos (una función de módulo, no una lambda).
+    """
+    conexion = conexion or {"host": os.environ.get("REDIS_HOST", "localhost"),
+                            "port": int(os.environ.get("REDIS_PORT", 6379)),
+                            "decode_responses": True}
+    opciones = {"visibilidad": visibilidad, "max_intentos": max_intentos}
+    parar = parar or multiprocessing.Event()
+
+    hijos = [
+        multiprocessing.Process(
+            target=_proceso_trabajador,
+            args=(conexion, nombre_cola, opciones, manejador, lote, parar),
+            name=f"trabajador-{i}"
+        )
+        for i in range(procesos)
+    ]
+    for hijo in hijos:
+        hijo.start()
+
+    cola = ColaTareas(redis.Redis(**conexion), nombre_cola, **opciones)
+    try:
+        while not parar.is_set():
+            cola.recuperar()
+            parar.wait(max(1.0, visibilidad / 4))
+    except KeyboardInterrupt:
+        parar.set()
+    finally:
+        for hijo in hijos:
+            hijo.join()
+        cola.recuperar()
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("estado", "recuperar"):
+        print("Uso: python cola_tareas.py estado|recuperar <nombre_cola>")
+        return
+
+    r = redis.Redis(host=os.environ.get("REDIS_HOST", "localhost"),
+                    port=int(os.environ.get("REDIS_PORT", 6379)), decode_responses=True)
+    cola = ColaTareas(r, sys.argv[2])
+
+    if sys.argv[1] == "recuperar":
+        resultado = cola.recuperar()
+        print(f"♻️ {resultado['reencoladas']} reencoladas, {resultado['muertas']} a muertas")
+    else:
+        print(json.dumps(cola.metricas(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+📊 Contador de visitas con índice en sorted sets
+
+Versión reutilizable de `ContadorVisitas` (04_casos_uso_reales.ipynb).
+En lugar de un STRING por página (y KEYS + un GET por página para el
+ranking), todas las páginas viven en sorted sets:
+
+    visitas:total              ZSET  página -> visitas totales
+    visitas:hora:<AAAAMMDDHH>  ZSET  visitas de esa hora (expiran)
+    visitas:dia:<AAAAMMDD>     ZSET  visitas de ese día (expiran)
+    visitas:tendencias:...     ZSET  uniones cacheadas unos segundos
+
+El top-N es un solo ZREVRANGE. `registrar_lote` acumula en memoria y
+vuelca con un pipeline (como CacheStats en 06_Cache_MongoDB/models.py).
+Cada visita suma en su hora y en su día en el mismo pipeline, así que
+los días no dependen de un rollup que llegue antes de que caduquen las
+horas (`retencion_horas`).
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import redis
+
+
+# Importa los STRING antiguos: suma cada uno a KEYS[1] y lo borra, así
+# repetir la importación no cuenta nada dos veces.
+# KEYS[2..] = visitas:<página>, ARGV = páginas (en el mismo orden)
+LUA_IMPORTAR = """
+local importadas = 0
+for i = 2, #KEYS do
+    local visitas = redis.call('GET', KEYS[i])
+    if visitas then
+        redis.call('ZINCRBY', KEYS[1], visitas, ARGV[i - 1])
+        redis.call('DEL', KEYS[i])
+        importadas = importadas + 1
+    end
+end
+return importadas
+"""
+
+
+class ContadorVisitas:
+    """Contadores por página: totales, por hora y por día."""
+
+    PREFIJO = "visitas"
+
+    def __init__(self, redis_client, flush_cada=1000, intervalo=1.0,
+                 retencion_horas=72, retencion_dias=90, ttl_tendencias=30):
+        self.r = redis_client
+        self.flush_cada = flush_cada
+        self.intervalo = intervalo
+        self.retencion_horas = retencion_horas
+        self.retencion_dias = retencion_dias
+        self.ttl_tendencias = ttl_tendencias
+        self._total = f"{self.PREFIJO}:total"
+        self._pendientes = Counter()  # (hora, página) -> n
+        self._eventos = 0
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = os.getpid()
+        self._lua_importar = self.r.register_script(LUA_IMPORTAR)
+
+    # Claves
+    def _k_hora(self, momento: datetime) -> str:
+        return f"{self.PREFIJO}:hora:{momento:%Y%m%d%H}"
+
+    def _k_dia(self, fecha) -> str:
+        return f"{self.PREFIJO}:dia:{fecha:%Y%m%d}"
+
+    def _k_dia_de_hora(self, k_hora: str) -> str:
+        return f"{self.PREFIJO}:dia:{k_hora.rsplit(':', 1)[1][:8]}"
+
+    # =========================================================================
+    # ESCRITURA
+    # =========================================================================
+
+    def registrar_visita(self, pagina: str) -> int:
+        """Una visita, sin búfer: un pipeline (total + hora + día). Devuelve el total."""
+        ahora = datetime.now()
+        hora, dia = self._k_hora(ahora), self._k_dia(ahora)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zincrby(self._total, 1, pagina)
+        pipe.zincrby(hora, 1, pagina)
+        pipe.expire(hora, self.retencion_horas * 3600)
+        pipe.zincrby(dia, 1, pagina)
+        pipe.expire(dia, self.retencion_dias * 86400)
+        return int(pipe.execute()[0])
+
+    def registrar_lote(self, paginas):
+        """
+        Acumula visitas en memoria; se vuelcan cada `flush_cada` visitas o
+        cada `intervalo` segundos. Mil visitas a la misma página son un
+        solo ZINCRBY de 1000.
+        """
+        if self._pid != os.getpid():
+            # Proceso hijo tras un fork: el búfer y el hilo son del padre
+            self._pid = os.getpid()
+            self._pendientes = Counter()
+            self._eventos = 0
+            self._hilo = None
+
+        hora = self._k_hora(datetime.now())
+        conteo = Counter(paginas)
+        with self._lock:
+            for pagina, n in conteo.items():
+                self._pendientes[(hora, pagina)] += n
+            self._eventos += sum(conteo.values())
+            lleno = self._eventos >= self.flush_cada
+
+        if lleno:
+            self.flush()
+        elif self._hilo is None:
+            self._arrancar_hilo()
+
+    def flush(self):
+        """Vuelca el búfer a Redis en un solo pipeline."""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, Counter()
+            self._eventos = 0
+
+        if not pendientes:
+            return
+
+        totales = Counter()
+        por_dia = Counter()
+        pipe = self.r.pipeline(transaction=False)
+        for (hora, pagina), n in pendientes.items():
+            totales[pagina] += n
+            por_dia[(self._k_dia_de_hora(hora), pagina)] += n
+            pipe.zincrby(hora, n, pagina)
+        for (dia, pagina), n in por_dia.items():
+            pipe.zincrby(dia, n, pagina)
+        for hora in {hora for hora, _ in pendientes}:
+            pipe.expire(hora, self.retencion_horas * 3600)
+        for dia in {dia for dia, _ in por_dia}:
+            pipe.expire(dia, self.retencion_dias * 86400)
+        for pagina, n in totales.items():
+            pipe.zincrby(self._total, n, pagina)
+
+        try:
+            pipe.execute()
+        except redis.RedisError:
+            # Devolver los contadores para el siguiente intento
+            with self._lock:
+                self._pendientes.update(pendientes)
+            raise
+
+    def _arrancar_hilo(self):
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._bucle_flush, daemon=True)
+            self._hilo.start()
+        atexit.register(self._flush_al_salir)
+
+    def _flush_al_salir(self):
+        try:
+            self.flush()
+        except redis.RedisError:
+            pass
+
+    def _bucle_flush(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.flush()
+            except redis.RedisError:
+                pass  # Se reintenta en el siguiente ciclo
+
+    # =========================================================================
+    # CONSULTAS
+    # =========================================================================
+
+    def obtener_visitas(self, pagina: str) -> int:
+        return int(self.r.zscore(self._total, pagina) or 0)
+
+    def obtener_muchas(self, paginas: list) -> dict:
+        """Visitas de varias páginas con un ZMSCORE."""
+        if not paginas:
+            return {}
+        return {p: int(v or 0) for p, v in zip(paginas, self.r.zmscore(self._total, paginas))}
+
+    def top_paginas(self, n: int = 5) -> list:
+        """Las n páginas más visitadas: un ZREVRANGE sobre el índice."""
+        return [(p, int(v)) for p, v in self.r.zrevrange(self._total, 0, n - 1, withscores=True)]
+
+    def consolidar_dia(self, fecha) -> str:
+        """
+        Rehace visitas:dia:<AAAAMMDD> sumando las 24 horas de `fecha`
+        (idempotente). Solo para días sin contador diario (datos de antes
+        de que existiera), y mientras sus horas no hayan caducado.
+        """
+        inicio = datetime(fecha.year, fecha.month, fecha.day)
+        horas = [self._k_hora(inicio + timedelta(hours=h)) for h in range(24)]
+        destino = self._k_dia(fecha)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zunionstore(destino, horas)
+        pipe.expire(destino, self.retencion_dias * 86400)
+        pipe.execute()
+        return destino
+
+    def tendencias(self, horas: int = 24, n: int = 10) -> list:
+        """Top-N de las últimas `horas` horas (incluida la actual)."""
+        ahora = datetime.now()
+        claves = [self._k_hora(ahora - timedelta(hours=h)) for h in range(horas)]
+        return self._top_union(f"{self.PREFIJO}:tendencias:h{horas}:{ahora:%Y%m%d%H}", claves, n)
+
+    def top_dias(self, dias: int = 7, n: int = 10) -> list:
+        """
+        Top-N de los últimos `dias` días (incluido hoy), de sus contadores
+        diarios. Un día sin contador se rehace con `consolidar_dia` si aún
+        pueden quedar sus horas (`retencion_horas`); si no, cuenta vacío y
+        no se intenta. Hasta `retencion_dias` días atrás.
+        """
+        ahora = datetime.now()
+        destino = f"{self.PREFIJO}:tendencias:d{dias}:{ahora:%Y%m%d%H}"
+        fechas = [ahora.date() - timedelta(days=d) for d in range(dias)]
+
+        # Un solo round trip: la unión cacheada y, por si no está, qué días faltan
+        pipe = self.r.pipeline(transaction=False)
+        pipe.exists(destino)
+        pipe.zrevrange(destino, 0, n - 1, withscores=True)
+        for fecha in fechas:
+            pipe.exists(self._k_dia(fecha))
+        existe, top, *con_contador = pipe.execute()
+        if existe:
+            return [(p, int(v)) for p, v in top]
+
+        limite = (ahora - timedelta(hours=self.retencion_horas)).date()
+        for fecha, hay in zip(fechas, con_contador):
+            if not hay and fecha >= limite:
+                self.consolidar_dia(fecha)
+
+        return self._unir(destino, [self._k_dia(f) for f in fechas], n)
+
+    def _top_union(self, destino: str, claves: list, n: int) -> list:
+        """ZUNIONSTORE cacheado `ttl_tendencias` segundos y ZREVRANGE."""
+        pipe = self.r.pipeline(transaction=False)
+        pipe.exists(destino)
+        pipe.zrevrange(destino, 0, n - 1, withscores=True)
+        existe, top = pipe.execute()
+
+        if not existe:
+            return self._unir(destino, claves, n)
+        return [(p, int(v)) for p, v in top]
+
+    def _unir(self, destino: str, claves: list, n: int) -> list:
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zunionstore(destino, claves)
+        pipe.expire(destino, self.ttl_tendencias)
+        pipe.zrevrange(destino, 0, n - 1, withscores=True)
+        return [(p, int(v)) for p, v in pipe.execute()[-1]]
+
+    # =========================================================================
+    # MIGRACIÓN
+    # =========================================================================
+
+    def importar_contadores_antiguos(self, lote: int = 500) -> int:
+        """
+        Suma los antiguos STRING visitas:<página> al índice (SCAN, no KEYS)
+        y los borra: las visitas que ya tenga el índice se conservan.
+        """
+        importadas = 0
+        claves = []
+        for clave in self.r.scan_iter(match=f"{self.PREFIJO}:/*", count=lote):
+            claves.append(clave)
+            if len(claves) >= lote:
+                importadas += self._importar(claves)
+                claves = []
+        return importadas + self._importar(claves)
+
+    def _importar(self, claves):
+        if not claves:
+            return 0
+        return self._lua_importar(
+            keys=[self._total] + claves,
+            args=[clave.split(":", 1)[1] for clave in claves]
+        )
@@ -0,0 +1,189 @@
+"""
+🏷️ Búsqueda facetada por etiquetas
+
+Versión reutilizable de `SistemaEtiquetas` (04_casos_uso_reales.ipynb),
+con las mismas claves que el notebook:
+
+    tags:<producto>              SET  etiquetas del producto (índice directo)
+    productos_con_tag:<etiqueta> SET  productos con esa etiqueta (índice inverso)
+    etiquetas:cache:<hash>       SET  SINTERSTORE de una combinación (expira)
+
+- Etiquetar y desetiquetar escriben los dos índices en un solo
+  MULTI/EXEC: nadie ve un producto en `productos_con_tag:` sin la
+  etiqueta en `tags:` (ni al revés).
+- `contar` usa SINTERCARD (Redis 7+), que no devuelve los productos.
+- Las combinaciones que se listan o se facetan se guardan con
+  SINTERSTORE durante `ttl_cache` segundos: las combinaciones populares
+  se calculan una vez y el resto de consultas las reutilizan.
+- `pagina` recorre el resultado con SSCAN en vez de traerlo entero.
+"""
+
+import hashlib
+from collections import Counter
+
+
+# KEYS[1] = tags:<producto>; ARGV[1] = producto
+LUA_BORRAR = """
+local etiquetas = redis.call('SMEMBERS', KEYS[1])
+for _, etiqueta in ipairs(etiquetas) do
+    redis.call('SREM', 'productos_con_tag:' .. etiqueta, ARGV[1])
+end
+redis.call('DEL', KEYS[1])
+return #etiquetas
+"""
+
+
+class SistemaEtiquetas:
+    """Índice directo e inverso de etiquetas con conteos, facetas y paginación."""
+
+    def __init__(self, redis_client, ttl_cache=30):
+        self.r = redis_client
+        self.ttl_cache = ttl_cache
+        self._lua_borrar = self.r.register_script(LUA_BORRAR)
+
+    @staticmethod
+    def _k_producto(producto_id) -> str:
+        return f"tags:{producto_id}"
+
+    @staticmethod
+    def _k_etiqueta(etiqueta) -> str:
+        return f"productos_con_tag:{etiqueta}"
+
+    # =========================================================================
+    # ESCRITURA
+    # =========================================================================
+
+    def etiquetar(self, producto_id: str, *etiquetas):
+        """Añade etiquetas al producto (índice directo e inverso a la vez)."""
+        if not etiquetas:
+            return
+        pipe = self.r.pipeline()  # MULTI/EXEC
+        self._etiquetar(pipe, producto_id, etiquetas)
+        pipe.execute()
+
+    def _etiquetar(self, pipe, producto_id, etiquetas):
+        pipe.sadd(self._k_producto(producto_id), *etiquetas)
+        for etiqueta in etiquetas:
+            pipe.sadd(self._k_etiqueta(etiqueta), producto_id)
+
+    def etiquetar_lote(self, productos, bloque: int = 500) -> int:
+        """
+        Etiqueta muchos productos: `productos` son pares (producto, [etiquetas]).
+        Un MULTI/EXEC cada `bloque` productos. Devuelve los productos tocados.
+        """
+        pipe = self.r.pipeline()
+        total = 0
+        for producto_id, etiquetas in productos:
+            if not etiquetas:
+                continue
+            self._etiquetar(pipe, producto_id, list(etiquetas))
+            total += 1
+            if total % bloque == 0:
+                pipe.execute()
+        pipe.execute()
+        return total
+
+    def desetiquetar(self, producto_id: str, *etiquetas):
+        """Quita etiquetas del producto en los dos índices."""
+        if not etiquetas:
+            return
+        pipe = self.r.pipeline()
+        pipe.srem(self._k_producto(producto_id), *etiquetas)
+        for etiqueta in etiquetas:
+            pipe.srem(self._k_etiqueta(etiqueta), producto_id)
+        pipe.execute()
+
+    def borrar_producto(self, producto_id: str) -> int:
+        """Quita el producto de todas sus etiquetas (Lua, atómico). Devuelve cuántas tenía."""
+        return self._lua_borrar(keys=[self._k_producto(producto_id)], args=[producto_id])
+
+    # =========================================================================
+    # CONSULTAS
+    # =========================================================================
+
+    def etiquetas_de(self, producto_id: str):
+        return self.r.smembers(self._k_producto(producto_id))
+
+    def productos_por_tag(self, etiqueta: str):
+        return self.r.smembers(self._k_etiqueta(etiqueta))
+
+    def _seleccion(self, etiquetas) -> str:
+        """
+        Clave con los productos que tienen todas las etiquetas. Una sola
+        etiqueta es su índice inverso; varias, un SINTERSTORE cacheado.
+        """
+        etiquetas = sorted(set(etiquetas))
+        if not etiquetas:
+            raise ValueError("Hace falta al menos una etiqueta")
+        if len(etiquetas) == 1:
+            return self._k_etiqueta(etiquetas[0])
+
+        resumen = hashlib.sha1("\x00".join(etiquetas).encode()).hexdigest()[:16]
+        clave = f"etiquetas:cache:{resumen}"
+        if not self.r.exists(clave):
+            pipe = self.r.pipeline(transaction=False)
+            pipe.sinterstore(clave, [self._k_etiqueta(e) for e in etiquetas])
+            pipe.expire(clave, self.ttl_cache)
+            pipe.execute()
+        return clave
+
+    def contar(self, *etiquetas, limite: int = 0) -> int:
+        """
+        Productos con todas las etiquetas, sin traerlos (SINTERCARD).
+        Con `limite` Redis deja de contar al llegar a él.
+        """
+        etiquetas = sorted(set(etiquetas))
+        if not etiquetas:
+            raise ValueError("Hace falta al menos una etiqueta")
+        if len(etiquetas) == 1:
+            return self.r.scard(self._k_etiqueta(etiquetas[0]))
+        return self.r.sintercard(len(etiquetas), [self._k_etiqueta(e) for e in etiquetas], limit=limite)
+
+    def productos_con_todos_los_tags(self, *etiquetas):
+        return self.r.smembers(self._seleccion(etiquetas))
+
+    def pagina(self, *etiquetas, cursor: int = 0, n: int = 50):
+        """
+        Una página del resultado con SSCAN: (siguiente_cursor, productos).
+        El cursor 0 indica que no hay más. SSCAN puede devolver alguno más
+        o menos de `n` y, si la combinación cambia mientras se pagina,
+        repetir productos.
+        """
+        clave = self._seleccion(etiquetas)
+        if clave.startswith("etiquetas:cache:"):
+            self.r.expire(clave, self.ttl_cache)  # Que no caduque a mitad de la paginación
+        return self.r.sscan(clave, cursor=cursor, count=n)
+
+    def facetas(self, *etiquetas, n: int = 10, muestra: int = 1000) -> list:
+        """
+        Las `n` etiquetas que más aparecen junto a la selección, con cuántos
+        productos de la selección las llevan: [(etiqueta, productos)].
+        Las candidatas salen de hasta `muestra` productos (SSCAN); el
+        conteo de cada una es exacto (SINTERCARD contra la selección).
+        """
+        clave = self._seleccion(etiquetas)
+        productos = set()  # SSCAN puede repetir elementos
+        for producto_id in self.r.sscan_iter(clave, count=min(muestra, 1000)):
+            productos.add(producto_id)
+            if len(productos) >= muestra:
+                break
+        if not productos:
+            return []
+
+        pipe = self.r.pipeline(transaction=False)
+        for producto_id in productos:
+            pipe.smembers(self._k_producto(producto_id))
+        candidatas = Counter()
+        for etiquetas_producto in pipe.execute():
+            candidatas.update(etiquetas_producto)
+        for etiqueta in etiquetas:
+            candidatas.pop(etiqueta, None)
+
+        if len(productos) < muestra:  # Se vio la selección entera: el conteo ya es exacto
+            return candidatas.most_common(n)
+
+        nombres = list(candidatas)
+        for etiqueta in nombres:
+            pipe.sintercard(2, [clave, self._k_etiqueta(etiqueta)])
+        conteos = zip(nombres, pipe.execute())
+        return sorted(conteos, key=lambda x: x[1], reverse=True)[:n]
@@ -0,0 +1,131 @@
+"""
+📰 Feed de noticias con fan-out híbrido (push / pull)
+
+Versión reutilizable de `FeedNoticias` (04_casos_uso_reales.ipynb), con
+las mismas claves que el notebook y `RedSocial`:
+
+    post:<id>             HASH  autor, contenido, ts
+    seguidores:<usuario>  SET   quién sigue a <usuario>
+    siguiendo:<usuario>   SET   a quién sigue <usuario>
+    feed:<usuario>        ZSET  post_id -> ts (posts empujados, recortado)
+    posts:<autor>         ZSET  post_id -> ts (posts propios, recortado)
+    feed:celebridades     SET   autores con más de `umbral` seguidores
+
+- Push: los posts de autores "normales" se copian al feed de cada
+  seguidor, por bloques de `bloque` seguidores (SSCAN + un pipeline por
+  bloque), y cada feed se recorta con ZREMRANGEBYRANK.
+- Pull: los autores con `umbral` seguidores o más no se copian; el feed
+  de quien los sigue los mezcla al leer desde `posts:<autor>`. Si un
+  autor vuelve a push, sus posts recientes (los de `posts:<autor>`) se
+  copian a los feeds con el primer post nuevo, para que no desaparezcan
+  los que publicó en modo pull.
+- Leer un feed son tres round trips, sin importar cuántos posts tenga:
+  ids del feed + celebridades seguidas, posts de esas celebridades, y
+  todos los `post:<id>` en un pipeline.
+"""
+
+import heapq
+import time
+
+
+class FeedNoticias:
+    """Publicación y lectura de feeds con push para la mayoría y pull para celebridades."""
+
+    CELEBRIDADES = "feed:celebridades"
+
+    def __init__(self, redis_client, umbral=10000, bloque=1000, max_feed=1000):
+        self.r = redis_client
+        self.umbral = umbral
+        self.bloque = bloque
+        self.max_feed = max_feed
+
+    # =========================================================================
+    # PUBLICAR
+    # =========================================================================
+
+    def publicar(self, usuario: str, post_id: str, contenido: str) -> dict:
+        """Guarda el post y lo reparte (o no) según los seguidores del autor."""
+        ts = time.time()
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hset(f"post:{post_id}", mapping={"autor": usuario, "contenido": contenido, "ts": ts})
+        pipe.zadd(f"posts:{usuario}", {post_id: ts})
+        pipe.zremrangebyrank(f"posts:{usuario}", 0, -(self.max_feed + 1))
+        self._empujar(pipe, usuario, {post_id: ts})  # El autor también lo ve en su feed
+        pipe.scard(f"seguidores:{usuario}")
+        num_seguidores = pipe.execute()[-1]
+
+        if num_seguidores >= self.umbral:
+            self.r.sadd(self.CELEBRIDADES, usuario)
+            return {"modo": "pull", "seguidores": num_seguidores, "bloques": 0}
+
+        posts = {post_id: ts}
+        if self.r.srem(self.CELEBRIDADES, usuario):
+            # Vuelve de pull: sus seguidores dejan de leer posts:<autor>
+            posts = dict(self.r.zrange(f"posts:{usuario}", 0, -1, withscores=True))
+
+        bloques = 0
+        pipe = self.r.pipeline(transaction=False)
+        pendientes = 0
+        for seguidor in self.r.sscan_iter(f"seguidores:{usuario}", count=self.bloque):
+            self._empujar(pipe, seguidor, posts)
+            pendientes += 1
+            if pendientes >= self.bloque:
+                pipe.execute()
+                bloques += 1
+                pendientes = 0
+        if pendientes:
+            pipe.execute()
+            bloques += 1
+
+        return {"modo": "push", "seguidores": num_seguidores, "bloques": bloques, "posts": len(posts)}
+
+    def _empujar(self, pipe, usuario, posts: dict):
+        pipe.zadd(f"feed:{usuario}", posts)
+        pipe.zremrangebyrank(f"feed:{usuario}", 0, -(self.max_feed + 1))
+
+    # =========================================================================
+    # LEER
+    # =========================================================================
+
+    def obtener_feed(self, usuario: str, n: int = 10, antes: float = None) -> list:
+        """
+        Los n posts más recientes del feed (anteriores a `antes`, para
+        paginar con el `ts` del último post de la página anterior).
+        """
+        maximo = f"({antes}" if antes is not None else "+inf"
+
+        # 1. Posts empujados + celebridades a las que sigue
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zrevrangebyscore(f"feed:{usuario}", maximo, "-inf", start=0, num=n, withscores=True)
+        pipe.sinter(f"siguiendo:{usuario}", self.CELEBRIDADES)
+        empujados, celebridades = pipe.execute()
+
+        # 2. Posts recientes de cada celebridad (pull)
+        listas = [empujados]
+        if celebridades:
+            pipe = self.r.pipeline(transaction=False)
+            for autor in celebridades:
+                pipe.zrevrangebyscore(f"posts:{autor}", maximo, "-inf", start=0, num=n, withscores=True)
+            listas += pipe.execute()
+
+        # Mezcla por fecha sin repetidos (un autor pudo pasar de push a pull)
+        vistos = set()
+        elegidos = []
+        for post_id, ts in heapq.merge(*listas, key=lambda x: x[1], reverse=True):
+            if post_id not in vistos:
+                vistos.add(post_id)
+                elegidos.append(post_id)
+                if len(elegidos) == n:
+                    break
+
+        # 3. Contenido de todos los posts en un pipeline
+        pipe = self.r.pipeline(transaction=False)
+        for post_id in elegidos:
+            pipe.hgetall(f"post:{post_id}")
+
+        posts = []
+        for post_id, post in zip(elegidos, pipe.execute()):
+            if post:  # Puede haberse borrado
+                post['id'] = post_id
+                posts.append(post)
+        return posts
@@ -0,0 +1,281 @@
+"""
+🚕 Flota de vehículos: ingesta masiva de posiciones y búsqueda de cercanos
+
+Versión reutilizable de `FlotaVehiculos` (04_casos_uso_reales.ipynb), con
+la misma clave que el notebook:
+
+    geo:flota               GEO (ZSET)  posición actual de cada vehículo
+    geo:flota:visto         ZSET        vehículo -> timestamp del último ping
+    geo:flota:posiciones    STREAM      pings pendientes de ingerir (v, lng, lat, ts)
+
+- `registrar` acumula los pings en memoria y se queda con el último de
+  cada vehículo; cada `ventana` segundos (o `max_pendientes` vehículos)
+  `flush` los escribe con GEOADD de muchos miembros en pipeline. Un hilo
+  vuelca también por tiempo, aunque dejen de llegar pings.
+- `consumir_stream` lee pings de un stream con un grupo de consumidores
+  y los confirma (XACK) después de escribirlos. Al arrancar relee lo que
+  dejó sin confirmar y, con XAUTOCLAIM, recoge lo que un consumidor
+  caído dejó pendiente. Desde una cola o cualquier otra fuente, basta
+  con pasar los lotes a `ingerir`.
+- `expirar_inactivos` quita los vehículos sin ping reciente (Lua, atómico).
+- `vehiculos_cercanos` admite COUNT/ANY y guarda unos segundos, en
+  memoria, el resultado de cada celda de la rejilla.
+"""
+
+import math
+import os
+import threading
+import time
+
+import redis
+
+
+# KEYS[1] = geo:flota, KEYS[2] = geo:flota:visto
+# ARGV[1] = timestamp límite, ARGV[2] = máximo de vehículos a quitar
+LUA_EXPIRAR = """
+local viejos = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #viejos > 0 then
+    redis.call('ZREM', KEYS[1], unpack(viejos))
+    redis.call('ZREM', KEYS[2], unpack(viejos))
+end
+return #viejos
+"""
+
+RADIO_TIERRA_KM = 6372.7976  # El mismo que usa Redis
+
+
+def distancia_km(lng1, lat1, lng2, lat2) -> float:
+    """Distancia haversine, igual que la de GEODIST."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (lng1, lat1, lng2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+class FlotaVehiculos:
+    """Posiciones de una flota con ingesta por lotes y búsquedas cacheadas por celda."""
+
+    def __init__(self, redis_client, key="geo:flota", ventana=1.0, max_pendientes=10000,
+                 bloque=1000, celda=0.01, ttl_cache=2.0):
+        self.r = redis_client
+        self.key = key
+        self.key_visto = f"{key}:visto"
+        self.key_stream = f"{key}:posiciones"
+        self.ventana = ventana
+        self.max_pendientes = max_pendientes
+        self.bloque = bloque
+        self.celda = celda          # Lado de la celda de la caché, en grados
+        self.ttl_cache = ttl_cache
+        self._lua_expirar = self.r.register_script(LUA_EXPIRAR)
+        self._pendientes = {}       # vehiculo -> (lng, lat, ts)
+        self._ultimo_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._hilo = None           # Flush por tiempo (se arranca con el primer ping)
+        self._cache = {}            # (celda_x, celda_y, radio, limite) -> (caduca, vehículos)
+
+    # =========================================================================
+    # ESCRITURA
+    # =========================================================================
+
+    def actualizar_posicion(self, vehiculo_id: str, lng: float, lat: float):
+        """Un ping, escrito al momento (como en el notebook)."""
+        pipe = self.r.pipeline(transaction=False)
+        pipe.geoadd(self.key, (lng, lat, vehiculo_id))
+        pipe.zadd(self.key_visto, {vehiculo_id: time.time()}, gt=True)
+        pipe.execute()
+
+    def registrar(self, vehiculo_id: str, lng: float, lat: float, ts: float = None):
+        """
+        Acumula un ping; de cada vehículo solo se escribe el más reciente.
+        Vuelca al pasar `ventana` segundos o `max_pendientes` vehículos;
+        si no llegan más pings, el hilo de flush vuelca lo que quede.
+        """
+        ts = ts if ts is not None else time.time()
+        with self._lock:
+            anterior = self._pendientes.get(vehiculo_id)
+            if anterior is None or anterior[2] <= ts:
+                self._pendientes[vehiculo_id] = (lng, lat, ts)
+            lleno = len(self._pendientes) >= self.max_pendientes
+        if self._hilo is None and self.ventana > 0:
+            self._arrancar_hilo()
+        if lleno or time.monotonic() - self._ultimo_flush >= self.ventana:
+            self.flush()
+
+    def ingerir(self, posiciones) -> int:
+        """Registra un lote de (vehiculo, lng, lat[, ts]) y lo vuelca. Devuelve los vehículos escritos."""
+        for posicion in posiciones:
+            self.registrar(*posicion)
+        return self.flush()
+
+    def flush(self) -> int:
+        """Escribe los pings pendientes: GEOADD y ZADD de `bloque` vehículos por comando."""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+            self._ultimo_flush = time.monotonic()
+        if not pendientes:
+            return 0
+
+        vehiculos = list(pendientes.items())
+        pipe = self.r.pipeline(transaction=False)
+        for i in range(0, len(vehiculos), self.bloque):
+            trozo = vehiculos[i:i + self.bloque]
+            miembros = []
+            for vehiculo_id, (lng, lat, _) in trozo:
+                miembros += (lng, lat, vehiculo_id)
+            pipe.geoadd(self.key, miembros)
+            pipe.zadd(self.key_visto, {v: ts for v, (_, _, ts) in trozo}, gt=True)
+        pipe.execute()
+        return len(pendientes)
+
+    def _arrancar_hilo(self):
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._bucle_flush, daemon=True)
+            self._hilo.start()
+
+    def _bucle_flush(self):
+        while True:
+            time.sleep(self.ventana)
+            if time.monotonic() - self._ultimo_flush < self.ventana:
+                continue  # Ya ha volcado registrar()
+            try:
+                self.flush()
+            except redis.RedisError:
+                pass  # Se reintenta en el siguiente ciclo
+
+    def expirar_inactivos(self, max_edad: float = 300, bloque: int = 1000) -> int:
+        """Quita los vehículos sin ping en `max_edad` segundos. Devuelve cuántos."""
+        limite = time.time() - max_edad
+        total = 0
+        while True:
+            quitados = self._lua_expirar(keys=[self.key, self.key_visto], args=[limite, bloque])
+            total += quitados
+            if quitados < bloque:
+                return total
+
+    # =========================================================================
+    # STREAM DE POSICIONES
+    # =========================================================================
+
+    def publicar(self, posiciones, maxlen: int = 1000000) -> int:
+        """Productor: añade pings (vehiculo, lng, lat[, ts]) al stream en pipeline."""
+        pipe = self.r.pipeline(transaction=False)
+        n = 0
+        for vehiculo_id, lng, lat, *resto in posiciones:
+            ts = resto[0] if resto else time.time()
+            pipe.xadd(self.key_stream, {"v": vehiculo_id, "lng": lng, "lat": lat, "ts": ts},
+                      maxlen=maxlen, approximate=True)
+            n += 1
+            if n % self.bloque == 0:
+                pipe.execute()
+        pipe.execute()
+        return n
+
+    def consumir_stream(self, grupo: str = "flota", consumidor: str = None, lote: int = 5000,
+                        bloquear_ms: int = 1000, parar: threading.Event = None,
+                        salir_si_vacio: bool = False, reclamar_tras_ms: int = 60000) -> int:
+        """
+        Lee pings del stream con XREADGROUP, los escribe y confirma cada
+        lote con XACK. Para con `parar` o, con `salir_si_vacio`, cuando no
+        queda nada. Devuelve los pings leídos.
+
+        Primero relee su propia lista de pendientes (desde "0"): lo que leyó
+        y no llegó a confirmar antes de caerse. Además, cada
+        `reclamar_tras_ms` se queda (XAUTOCLAIM) con las entradas que otro
+        consumidor lleva ese tiempo sin confirmar; el nombre por defecto
+        lleva el pid, así que un proceso reiniciado no hereda el de antes.
+        """
+        consumidor = consumidor or f"ingesta-{os.getpid()}"
+        try:
+            self.r.xgroup_create(self.key_stream, grupo, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        propias = "0"               # Historial propio; None = ya solo lo nuevo (">")
+        cursor = "0-0"              # Cursor de XAUTOCLAIM
+        ultimo_reclamo = 0.0
+        leidos = 0
+        while not (parar and parar.is_set()):
+            entradas = []
+            if propias is not None:
+                respuesta = self.r.xreadgroup(grupo, consumidor, {self.key_stream: propias}, count=lote)
+                entradas = respuesta[0][1] if respuesta else []
+                propias = entradas[-1][0] if entradas else None
+            if propias is None and time.monotonic() - ultimo_reclamo >= reclamar_tras_ms / 2000:
+                ultimo_reclamo = time.monotonic()
+                cursor, entradas, *_ = self.r.xautoclaim(
+                    self.key_stream, grupo, consumidor, reclamar_tras_ms, start_id=cursor, count=lote
+                )
+
+            if propias is None and not entradas:
+                respuesta = self.r.xreadgroup(grupo, consumidor, {self.key_stream: ">"},
+                                              count=lote, block=bloquear_ms)
+                entradas = respuesta[0][1] if respuesta else []
+
+            if not entradas:
+                if salir_si_vacio:
+                    break
+                continue
+
+            for _, campos in entradas:
+                if campos:  # Vacía si MAXLEN ya la recortó: solo se confirma
+                    self.registrar(campos["v"], float(campos["lng"]), float(campos["lat"]), float(campos["ts"]))
+            self.flush()
+            self.r.xack(self.key_stream, grupo, *[id_entrada for id_entrada, _ in entradas])
+            leidos += len(entradas)
+        self.flush()
+        return leidos
+
+    # =========================================================================
+    # CONSULTAS
+    # =========================================================================
+
+    def vehiculos_cercanos(self, lng: float, lat: float, radio_km: float,
+                           count: int = None, any: bool = False, cache: bool = True) -> list:
+        """
+        [(vehiculo, distancia_km)] a `radio_km` o menos, del más cercano al
+        más lejano; como mucho `count` (con `any`, los primeros que
+        encuentre Redis, no los más cercanos).
+
+        Con `cache`, la búsqueda se hace desde el centro de la celda con el
+        radio ampliado y se reutiliza `ttl_cache` segundos para cualquier
+        punto de esa celda; las distancias se recalculan desde (lng, lat).
+        Sin `any`, la celda guarda todos los vehículos del radio ampliado y
+        `count` se aplica en local (resultado exacto); con `any`, se piden
+        count*4 cualesquiera.
+        """
+        if not cache or self.ttl_cache <= 0:
+            respuesta = self.r.geosearch(self.key, longitude=lng, latitude=lat, radius=radio_km,
+                                         unit="km", withdist=True, sort="ASC", count=count, any=any)
+            return [(vehiculo, distancia) for vehiculo, distancia in respuesta]
+
+        celda_x, celda_y = math.floor(lng / self.celda), math.floor(lat / self.celda)
+        limite = count * 4 if count and any else None
+        clave = (celda_x, celda_y, radio_km, limite)
+        ahora = time.monotonic()
+        with self._lock:
+            guardado = self._cache.get(clave)
+        if guardado and guardado[0] > ahora:
+            candidatos = guardado[1]
+        else:
+            centro_lng = (celda_x + 0.5) * self.celda
+            centro_lat = (celda_y + 0.5) * self.celda
+            # Radio que cubre cualquier punto de la celda más radio_km
+            margen = distancia_km(centro_lng, centro_lat, celda_x * self.celda, celda_y * self.celda)
+            respuesta = self.r.geosearch(self.key, longitude=centro_lng, latitude=centro_lat,
+                                         radius=radio_km + margen, unit="km", withcoord=True,
+                                         count=limite, any=bool(limite))
+            candidatos = [(vehiculo, coord[0], coord[1]) for vehiculo, coord in respuesta]
+            with self._lock:
+                if len(self._cache) > 1000:  # Celdas que ya nadie consulta
+                    self._cache = {k: v for k, v in self._cache.items() if v[0] > ahora}
+                self._cache[clave] = (ahora + self.ttl_cache, candidatos)
+
+        cercanos = [
+            (vehiculo, distancia)
+            for vehiculo, v_lng, v_lat in candidatos
+            if (distancia := distancia_km(lng, lat, v_lng, v_lat)) <= radio_km
+        ]
+        cercanos.sort(key=lambda x: x[1])
+        return cercanos[:count] if count else cercanos
@@ -0,0 +1,166 @@
+"""
+🏆 Leaderboard con actualizaciones por lotes y tableros por día/semana
+
+Versión reutilizable de `Leaderboard` (04_casos_uso_reales.ipynb):
+
+    leaderboard:<nombre>                      ZSET  puntuación total
+    leaderboard:<nombre>:dia:<AAAAMMDD>       ZSET  puntos ganados ese día (expira)
+    leaderboard:<nombre>:semana:<AAAA>-W<ss>  ZSET  ZUNIONSTORE de los días de la semana
+
+- `actualizar_lote` agrupa los eventos por jugador y los manda en pipeline.
+- `ficha` devuelve posición, puntuación y los jugadores de alrededor en
+  una sola llamada (script Lua) en vez de tres round trips.
+- `top` guarda unos segundos en memoria el último top-N de cada tablero.
+"""
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+
+# KEYS[1] = tablero; ARGV[1] = jugador, ARGV[2] = vecinos por cada lado
+LUA_FICHA = """
+local rank = redis.call('ZREVRANK', KEYS[1], ARGV[1])
+if not rank then
+    return nil
+end
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+local inicio = math.max(0, rank - tonumber(ARGV[2]))
+local entorno = redis.call('ZREVRANGE', KEYS[1], inicio, rank + tonumber(ARGV[2]), 'WITHSCORES')
+return {rank, score, inicio, entorno}
+"""
+
+
+class Leaderboard:
+    """Tablero global y por ventanas de tiempo sobre sorted sets."""
+
+    def __init__(self, redis_client, nombre="global", ttl_top=2.0,
+                 retencion_dias=35, ttl_semana_actual=60):
+        self.r = redis_client
+        self.key = f"leaderboard:{nombre}"
+        self.ttl_top = ttl_top
+        self.retencion_dias = retencion_dias
+        self.ttl_semana_actual = ttl_semana_actual
+        self._lua_ficha = self.r.register_script(LUA_FICHA)
+        self._top = {}  # (ventana, fecha, n) -> (caduca, resultado)
+        self._lock = threading.Lock()
+
+    # Claves de cada tablero
+    def _k_dia(self, fecha=None) -> str:
+        fecha = fecha or datetime.now().date()
+        return f"{self.key}:dia:{fecha:%Y%m%d}"
+
+    def tablero(self, ventana: str = "global", fecha=None) -> str:
+        """Clave del tablero "global", "dia" o "semana" (la semana se recalcula si hace falta)."""
+        if ventana == "global":
+            return self.key
+        if ventana == "dia":
+            return self._k_dia(fecha)
+        if ventana == "semana":
+            return self._semana(fecha or datetime.now().date())
+        raise ValueError(f"Ventana desconocida: {ventana} (usar global, dia o semana)")
+
+    def _semana(self, fecha) -> str:
+        """ZUNIONSTORE de los días de la semana ISO de `fecha` (cacheado)."""
+        anio, semana, dia_semana = fecha.isocalendar()
+        destino = f"{self.key}:semana:{anio}-W{semana:02d}"
+        if self.r.exists(destino):
+            return destino
+
+        lunes = fecha - timedelta(days=dia_semana - 1)
+        hoy = datetime.now().date()
+        dias = [lunes + timedelta(days=d) for d in range(7) if lunes + timedelta(days=d) <= hoy]
+        # La semana en curso todavía cambia: se recalcula cada poco
+        ttl = self.ttl_semana_actual if hoy - lunes < timedelta(days=7) else self.retencion_dias * 86400
+
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zunionstore(destino, [self._k_dia(d) for d in dias] or [self._k_dia(fecha)])
+        pipe.expire(destino, ttl)
+        pipe.execute()
+        return destino
+
+    # =========================================================================
+    # ESCRITURA
+    # =========================================================================
+
+    def actualizar_puntuacion(self, jugador: str, puntos: int) -> float:
+        """Un evento: total y día en un pipeline. Devuelve la puntuación total."""
+        dia = self._k_dia()
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zincrby(self.key, puntos, jugador)
+        pipe.zincrby(dia, puntos, jugador)
+        pipe.expire(dia, self.retencion_dias * 86400)
+        return pipe.execute()[0]
+
+    def actualizar_lote(self, eventos, bloque: int = 5000) -> int:
+        """
+        Aplica muchos (jugador, puntos): se suman por jugador y se mandan
+        con un pipeline cada `bloque` jugadores. Devuelve los jugadores tocados.
+        """
+        sumas = Counter()
+        for jugador, puntos in eventos:
+            sumas[jugador] += puntos
+
+        dia = self._k_dia()
+        pipe = self.r.pipeline(transaction=False)
+        for i, (jugador, puntos) in enumerate(sumas.items(), 1):
+            pipe.zincrby(self.key, puntos, jugador)
+            pipe.zincrby(dia, puntos, jugador)
+            if i % bloque == 0:
+                pipe.execute()
+        pipe.expire(dia, self.retencion_dias * 86400)
+        pipe.execute()
+        return len(sumas)
+
+    # =========================================================================
+    # CONSULTAS
+    # =========================================================================
+
+    def top(self, n: int = 10, ventana: str = "global", fecha=None) -> list:
+        """
+        Top-N; el resultado se reutiliza `ttl_top` segundos en este proceso
+        (un acierto no va a Redis, ni siquiera para comprobar la semana).
+        """
+        if n <= 0:
+            raise ValueError(f"n debe ser mayor que 0 (n={n})")
+        fecha = None if ventana == "global" else fecha or datetime.now().date()
+        ahora = time.monotonic()
+        with self._lock:
+            guardado = self._top.get((ventana, fecha, n))
+        if guardado and guardado[0] > ahora:
+            return guardado[1]
+
+        resultado = self.r.zrevrange(self.tablero(ventana, fecha), 0, n - 1, withscores=True)
+        with self._lock:
+            if len(self._top) > 100:  # Tableros de días ya pasados
+                self._top = {k: v for k, v in self._top.items() if v[0] > ahora}
+            self._top[(ventana, fecha, n)] = (ahora + self.ttl_top, resultado)
+        return resultado
+
+    def ficha(self, jugador: str, vecinos: int = 2, ventana: str = "global", fecha=None):
+        """
+        Posición (1 = primero), puntuación y los `vecinos` jugadores por
+        encima y por debajo, con una sola llamada a Redis. None si no juega.
+        """
+        respuesta = self._lua_ficha(keys=[self.tablero(ventana, fecha)], args=[jugador, vecinos])
+        if respuesta is None:
+            return None
+
+        rank, score, inicio, entorno = respuesta
+        return {
+            "jugador": jugador,
+            "posicion": rank + 1,
+            "puntuacion": float(score),
+            "entorno": [
+                {"posicion": inicio + i + 1, "jugador": entorno[2 * i], "puntuacion": float(entorno[2 * i + 1])}
+                for i in range(len(entorno) // 2)
+            ]
+        }
+
+    def posicion(self, jugador: str):
+        rank = self.r.zrevrank(self.key, jugador)
+        return rank + 1 if rank is not None else None
+
+    def puntuacion(self, jugador: str):
+        return self.r.zscore(self.key, jugador)
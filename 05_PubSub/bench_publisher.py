@@ -0,0 +1,138 @@
+"""
+⏱️ Benchmark del publicador: mensaje a mensaje vs `publicar_lote`
+
+Publica N mensajes contra un Redis local, primero con un PUBLISH por
+mensaje (un round trip cada uno) y después con `publicar_lote` para cada
+tamaño de lote. Informa mensajes/segundo y latencia por lote (p50/p99).
+
+Opcionalmente arranca suscriptores que cuentan lo que reciben, para
+comprobar que no se pierde nada por el camino.
+
+Uso:
+    python bench_publisher.py
+    python bench_publisher.py --mensajes 100000 --lotes 1,10,100,1000 --suscriptores 2
+    python bench_publisher.py --sharded --json      # SPUBLISH (Redis 7+)
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from publisher import crear_conexion, publicar_lote
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def generar_mensajes(n: int, canales: int):
+    for i in range(n):
+        yield f"bench:canal:{i % canales}", {"tipo": "bench", "seq": i, "contenido": "x" * 64}
+
+
+class Contador:
+    """Suscriptor en un hilo que cuenta los mensajes recibidos."""
+
+    def __init__(self, r, canales: int, sharded: bool):
+        self.recibidos = 0
+        self.pubsub = r.pubsub(ignore_subscribe_messages=True)
+        manejadores = {f"bench:canal:{i}": self._contar for i in range(canales)}
+        if sharded:
+            self.pubsub.ssubscribe(**manejadores)
+        else:
+            self.pubsub.subscribe(**manejadores)
+        self.hilo = self.pubsub.run_in_thread(sleep_time=0.01, daemon=True, sharded_pubsub=sharded)
+
+    def _contar(self, mensaje):
+        self.recibidos += 1
+
+    def parar(self):
+        self.hilo.stop()
+        self.pubsub.close()
+
+
+def uno_a_uno(r, n: int, canales: int, sharded: bool) -> dict:
+    """Lo que hace `publicar_notificacion`: timestamp + json + PUBLISH por mensaje."""
+    latencias = []
+    inicio = time.perf_counter()
+    for canal, mensaje in generar_mensajes(n, canales):
+        t0 = time.perf_counter()
+        datos = json.dumps({**mensaje, "timestamp": datetime.now().isoformat()}, ensure_ascii=False)
+        if sharded:
+            r.spublish(canal, datos)
+        else:
+            r.publish(canal, datos)
+        latencias.append(time.perf_counter() - t0)
+    return {"segundos": time.perf_counter() - inicio, "latencias_lote": latencias}
+
+
+def medir(nombre, funcion, n: int) -> dict:
+    resultado = funcion()
+    segundos = resultado["segundos"]
+    latencias = resultado["latencias_lote"]
+    return {
+        "modo": nombre,
+        "mensajes": n,
+        "lotes": len(latencias),
+        "msgs_por_segundo": round(n / segundos) if segundos else 0,
+        "lote_p50_ms": round(percentil(latencias, 0.50) * 1000, 3),
+        "lote_p99_ms": round(percentil(latencias, 0.99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de publicación Pub/Sub")
+    parser.add_argument("--mensajes", type=int, default=50000)
+    parser.add_argument("--lotes", default="1,10,100,500,1000", help="Tamaños de lote separados por comas")
+    parser.add_argument("--canales", type=int, default=8)
+    parser.add_argument("--suscriptores", type=int, default=0, help="Suscriptores que cuentan mensajes")
+    parser.add_argument("--sharded", action="store_true", help="Usar SPUBLISH en vez de PUBLISH")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    r = crear_conexion()
+    r.ping()
+
+    contadores = [Contador(r, args.canales, args.sharded) for _ in range(args.suscriptores)]
+    time.sleep(0.2)  # Dar tiempo a que las suscripciones estén activas
+
+    filas = [medir("uno a uno", lambda: uno_a_uno(r, args.mensajes, args.canales, args.sharded), args.mensajes)]
+
+    for tamano in [int(t) for t in args.lotes.split(",") if t.strip()]:
+        def por_lotes():
+            inicio = time.perf_counter()
+            resultado = publicar_lote(
+                r, generar_mensajes(args.mensajes, args.canales), tamano, args.sharded
+            )
+            resultado["segundos"] = time.perf_counter() - inicio
+            return resultado
+        filas.append(medir(f"lote {tamano}", por_lotes, args.mensajes))
+
+    recibidos = None
+    if contadores:
+        time.sleep(0.5)  # Vaciar lo que quede en vuelo
+        recibidos = [c.recibidos for c in contadores]
+        for c in contadores:
+            c.parar()
+
+    if args.json:
+        print(json.dumps({"resultados": filas, "recibidos_por_suscriptor": recibidos}, indent=2))
+        return
+
+    print(f"📤 {args.mensajes} mensajes en {args.canales} canales "
+          f"({'SPUBLISH' if args.sharded else 'PUBLISH'})")
+    print(f"   {'modo':<12}{'msgs/s':>10}{'lotes':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for f in filas:
+        print(f"   {f['modo']:<12}{f['msgs_por_segundo']:>10}{f['lotes']:>8}"
+              f"{f['lote_p50_ms']:>10}{f['lote_p99_ms']:>10}")
+    if recibidos is not None:
+        esperados = args.mensajes * len(filas)
+        print(f"\n📥 Recibidos por suscriptor: {recibidos} (esperados {esperados})")
+
+
+if __name__ == "__main__":
+    main()
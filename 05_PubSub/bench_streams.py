@@ -0,0 +1,128 @@
+"""
+⏱️ Benchmark del transporte Streams: rendimiento y reentregas
+
+1. Publica N mensajes con XADD en pipeline (`publicar_lote_stream`).
+2. Los consume un grupo de K suscriptores (`Suscriptor` con
+   transporte="streams") leyendo en lotes de COUNT y con XACK en lote.
+3. Una fracción de los mensajes falla la primera vez: quedan sin
+   confirmar y otro consumidor los recupera con XAUTOCLAIM.
+
+Informa mensajes/segundo al publicar y al consumir, cuántos mensajes se
+reclamaron y cuánto tardó en quedar todo confirmado.
+
+Uso:
+    python bench_streams.py
+    python bench_streams.py --mensajes 200000 --consumidores 4 --lote 500 --fallos 0.01
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from publisher import crear_conexion
+from subscriber import Suscriptor
+from transporte_streams import ConsumidorStreams, clave_stream, publicar_lote_stream
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del transporte Redis Streams")
+    parser.add_argument("--mensajes", type=int, default=50000)
+    parser.add_argument("--canales", type=int, default=4)
+    parser.add_argument("--consumidores", type=int, default=2, help="Suscriptores en el grupo")
+    parser.add_argument("--trabajadores", type=int, default=4, help="Hilos por suscriptor")
+    parser.add_argument("--lote", type=int, default=200, help="COUNT de XREADGROUP")
+    parser.add_argument("--fallos", type=float, default=0.01, help="Fracción que falla la primera vez")
+    parser.add_argument("--reclamar-ms", type=int, default=1000, help="Inactividad para XAUTOCLAIM")
+    parser.add_argument("--maxlen", type=int, default=1000000)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    r = crear_conexion()
+    canales = [f"bench:streams:{i}" for i in range(args.canales)]
+    r.delete(*[clave_stream(c) for c in canales])
+
+    # 1. Publicar
+    mensajes = ((canales[i % len(canales)], {"seq": i}) for i in range(args.mensajes))
+    inicio = time.perf_counter()
+    publicado = publicar_lote_stream(r, mensajes, tamano_lote=500, maxlen=args.maxlen)
+    t_publicar = time.perf_counter() - inicio
+
+    # 2. Consumir con reentregas
+    cada = int(1 / args.fallos) if args.fallos else 0
+    procesados = set()
+    fallidos = set()
+    duplicados = 0
+    lock = threading.Lock()
+
+    def manejar(canal, mensaje):
+        nonlocal duplicados
+        seq = mensaje["seq"]
+        with lock:
+            if cada and seq % cada == 0 and seq not in fallidos:
+                fallidos.add(seq)
+                raise RuntimeError("fallo simulado")
+            duplicados += seq in procesados
+            procesados.add(seq)
+
+    suscriptores = []
+    for i in range(args.consumidores):
+        s = Suscriptor(
+            trabajadores=args.trabajadores, capacidad=args.lote * 4, politica="bloquear",
+            transporte="streams", grupo="bench", consumidor=f"bench-{i}",
+            lote=args.lote, reclamar_tras_ms=args.reclamar_ms, avisar_errores=False
+        )
+        for canal in canales:
+            s.registrar(canal, manejar)
+        suscriptores.append(s)
+
+    inicio = time.perf_counter()
+    for s in suscriptores:
+        s.iniciar()
+
+    t_primera_pasada = None
+    while True:
+        time.sleep(0.05)
+        with lock:
+            hechos = len(procesados)
+        if t_primera_pasada is None and hechos + len(fallidos) >= args.mensajes:
+            t_primera_pasada = time.perf_counter() - inicio
+        if hechos >= args.mensajes:
+            break
+    t_total = time.perf_counter() - inicio
+
+    for s in suscriptores:
+        s.parar()
+    grupo = ConsumidorStreams(r, "bench", "bench-0")
+    grupo.suscribir(*canales)
+    pendientes = grupo.pendientes()
+    metricas = [s.metricas() for s in suscriptores]
+
+    resultado = {
+        "mensajes": publicado["mensajes"],
+        "publicar_msgs_por_segundo": round(args.mensajes / t_publicar),
+        "consumir_msgs_por_segundo": round(args.mensajes / (t_primera_pasada or t_total)),
+        "fallos_simulados": len(fallidos),
+        "reclamados": sum(m["reclamados"] for m in metricas),
+        "duplicados": duplicados,
+        "segundos_hasta_todo_confirmado": round(t_total, 2),
+        "pendientes_al_final": pendientes,
+        "lag_p99_ms": max((m["lag_ms"]["p99"] or 0) for m in metricas),
+    }
+
+    if args.json:
+        print(json.dumps(resultado, indent=2))
+        return
+
+    print(f"🌊 {args.mensajes} mensajes, {args.canales} streams, "
+          f"{args.consumidores} consumidores × {args.trabajadores} hilos, COUNT {args.lote}")
+    print(f"   📤 Publicar (XADD en pipeline): {resultado['publicar_msgs_por_segundo']} msgs/s")
+    print(f"   📥 Consumir (XREADGROUP + XACK): {resultado['consumir_msgs_por_segundo']} msgs/s")
+    print(f"   🔁 Fallos simulados: {resultado['fallos_simulados']}, "
+          f"reclamados con XAUTOCLAIM: {resultado['reclamados']}, duplicados: {duplicados}")
+    print(f"   ⏱️ Todo confirmado en {resultado['segundos_hasta_todo_confirmado']}s, "
+          f"pendientes al final: {pendientes}, lag p99: {resultado['lag_p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,28 +8,103 @@ Ejecutar en una terminal mientras subscriber.py corre en otra.
 
 Uso:
     python publisher.py
+
+Para volúmenes altos usar `publicar_lote` (PUBLISH en pipeline por lotes);
+ver bench_publisher.py.
+
+Con PUBSUB_TRANSPORTE=streams se publica con XADD en Redis Streams (los
+mensajes se guardan hasta que los consume el grupo, ver transporte_streams.py):
+    PUBSUB_TRANSPORTE=streams python publisher.py
 """
 
 import redis
 import json
+import os
 import time
 from datetime import datetime
 
+from transporte_streams import clave_stream, publicar_lote_stream
+
+
+TRANSPORTE = os.environ.get("PUBSUB_TRANSPORTE", "pubsub")
+MAXLEN_STREAM = int(os.environ.get("PUBSUB_STREAM_MAXLEN", 100000))
+
+_pool = None
+
 
 def crear_conexion():
-    """Crear conexión a Redis."""
-    return redis.Redis(host='localhost', port=6379, decode_responses=True)
+    """Crear conexión a Redis (todas comparten un mismo pool de conexiones)."""
+    global _pool
+    if _pool is None:
+        _pool = redis.ConnectionPool(
+            host=os.environ.get("REDIS_HOST", "localhost"),
+            port=int(os.environ.get("REDIS_PORT", 6379)),
+            max_connections=int(os.environ.get("REDIS_MAX_CONNECTIONS", 50)),
+            decode_responses=True
+        )
+    return redis.Redis(connection_pool=_pool)
 
 
 def publicar_notificacion(r, canal: str, mensaje: dict):
     """Publica una notificación en un canal."""
     mensaje['timestamp'] = datetime.now().isoformat()
     datos = json.dumps(mensaje, ensure_ascii=False)
+    if TRANSPORTE == "streams":
+        id_entrada = r.xadd(clave_stream(canal), {"datos": datos}, maxlen=MAXLEN_STREAM, approximate=True)
+        print(f"📤 Guardado en '{clave_stream(canal)}' → {id_entrada}")
+        return 1
     num_suscriptores = r.publish(canal, datos)
     print(f"📤 Publicado en '{canal}' → {num_suscriptores} suscriptor(es)")
     return num_suscriptores
 
 
+def publicar_lote(r, mensajes, tamano_lote: int = 500, sharded: bool = False,
+                  transporte: str = None) -> dict:
+    """
+    Publica muchos mensajes con un pipeline de PUBLISH por cada lote.
+    
+    `mensajes` es un iterable de (canal, dict). Todos los mensajes de un
+    lote comparten el mismo timestamp (se calcula una vez por lote).
+    Con `sharded=True` se usa SPUBLISH (Redis 7+, Pub/Sub por shard en
+    Redis Cluster: el mensaje solo viaja al nodo dueño del canal).
+    
+    Devuelve el total de mensajes y entregas, y la latencia de cada lote.
+    Con el transporte streams se delega en `publicar_lote_stream`.
+    """
+    if (transporte or TRANSPORTE) == "streams":
+        return publicar_lote_stream(r, mensajes, tamano_lote, MAXLEN_STREAM)
+    
+    enviados = 0
+    entregas = 0
+    latencias = []
+    lote = []
+    
+    def enviar():
+        nonlocal enviados, entregas
+        inicio = time.perf_counter()
+        timestamp = datetime.now().isoformat()
+        pipe = r.pipeline(transaction=False)
+        for canal, mensaje in lote:
+            datos = json.dumps({**mensaje, "timestamp": timestamp}, ensure_ascii=False)
+            if sharded:
+                pipe.spublish(canal, datos)
+            else:
+                pipe.publish(canal, datos)
+        entregas += sum(pipe.execute())
+        latencias.append(time.perf_counter() - inicio)
+        enviados += len(lote)
+        lote.clear()
+    
+    for canal, mensaje in mensajes:
+        lote.append((canal, mensaje))
+        if len(lote) >= tamano_lote:
+            enviar()
+    if lote:
+        enviar()
+    
+    return {"mensajes": enviados, "entregas": entregas, "latencias_lote": latencias}
+
+
 def demo_chat():
     """Demo de chat: envía mensajes a una sala."""
     r = crear_conexion()
@@ -71,11 +146,12 @@ def demo_notificaciones():
         ("notificaciones:all", {"tipo": "broadcast", "contenido": "¡Nueva actualización disponible!"}),
     ]
     
+    # Todas en un solo round trip
+    resultado = publicar_lote(r, notificaciones)
     for canal, mensaje in notificaciones:
-        publicar_notificacion(r, canal, mensaje)
-        time.sleep(1)
+        print(f"📤 {canal}: {mensaje['contenido']}")
     
-    print("✅ Demo completada")
+    print(f"✅ {resultado['mensajes']} notificaciones, {resultado['entregas']} entregas")
 
 
 def demo_eventos_sistema():
@@ -6,19 +6,53 @@
 Este script se suscribe a canales de Redis y muestra los mensajes recibidos.
 Ejecutar en una terminal mientras publisher.py corre en otra.
 
+Los mensajes se leen en un hilo aparte y se procesan en un pool de
+trabajadores (ver `Suscriptor`), así un manejador lento no hace que Redis
+acumule salida para este cliente hasta desconectarlo.
+
+Con PUBSUB_TRANSPORTE=streams los canales se leen de Redis Streams con
+un grupo de consumidores (ver transporte_streams.py). Por defecto cada
+suscriptor tiene su propio grupo y recibe todos los mensajes, como en
+Pub/Sub. Con PUBSUB_GRUPO=<nombre> el grupo sobrevive a los reinicios
+(no se pierde lo publicado mientras el suscriptor estaba parado) y los
+suscriptores con el mismo nombre se reparten los mensajes.
+
 Uso:
     python subscriber.py
+    PUBSUB_TRANSPORTE=streams python subscriber.py
 """
 
 import redis
 import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
 from datetime import datetime
 
+from transporte_streams import ConsumidorStreams
+
+
+TRANSPORTE = os.environ.get("PUBSUB_TRANSPORTE", "pubsub")
+
 
-def formatear_mensaje(canal: str, datos: str) -> str:
-    """Formatea un mensaje para mostrarlo."""
+def crear_conexion():
+    """Crear conexión a Redis."""
+    return redis.Redis(
+        host=os.environ.get("REDIS_HOST", "localhost"),
+        port=int(os.environ.get("REDIS_PORT", 6379)),
+        decode_responses=True
+    )
+
+
+def formatear_mensaje(canal: str, datos) -> str:
+    """Formatea un mensaje (texto JSON o ya decodificado) para mostrarlo."""
     try:
-        mensaje = json.loads(datos)
+        mensaje = datos if isinstance(datos, dict) else json.loads(datos)
         timestamp = mensaje.get('timestamp', datetime.now().isoformat())
         
         # Formatear según el tipo de canal
@@ -38,57 +72,357 @@ def formatear_mensaje(canal: str, datos: str) -> str:
             return f"⚡ Evento: {json.dumps(mensaje, ensure_ascii=False)}"
         
         else:
-            return f"📨 {datos}"
+            return f"📨 {json.dumps(mensaje, ensure_ascii=False)}"
     
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, AttributeError):
         return f"📨 {datos}"
 
 
-def suscriptor_simple(canales: list):
-    """Suscriptor a canales específicos."""
-    r = redis.Redis(host='localhost', port=6379, decode_responses=True)
-    pubsub = r.pubsub()
+# =============================================================================
+# RUNTIME DE SUSCRIPCIÓN
+# =============================================================================
+
+class _Desborde:
+    """Cola FIFO en un fichero temporal. Solo la usa el hilo lector."""
     
-    print(f"📥 Suscrito a: {', '.join(canales)}")
-    print("   Esperando mensajes... (Ctrl+C para salir)\n")
+    def __init__(self):
+        self._fichero = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        self._lectura = 0
+        self.pendientes = 0
     
-    pubsub.subscribe(*canales)
+    def escribir(self, item):
+        self._fichero.seek(0, os.SEEK_END)
+        self._fichero.write(json.dumps(item, ensure_ascii=False) + "\n")
+        self.pendientes += 1
     
+    def leer(self):
+        self._fichero.seek(self._lectura)
+        item = json.loads(self._fichero.readline())
+        self._lectura = self._fichero.tell()
+        self.pendientes -= 1
+        if not self.pendientes:
+            self._fichero.seek(0)
+            self._fichero.truncate()
+            self._lectura = 0
+        return item
+    
+    def cerrar(self):
+        self._fichero.close()
+
+
+def _decodificar(datos):
     try:
-        for mensaje in pubsub.listen():
-            if mensaje['type'] == 'message':
-                canal = mensaje['channel']
-                datos = mensaje['data']
-                texto = formatear_mensaje(canal, datos)
-                print(f"[{canal}] {texto}")
-    except KeyboardInterrupt:
-        print("\n👋 Desconectado")
-    finally:
-        pubsub.unsubscribe()
+        return json.loads(datos)
+    except (TypeError, ValueError):
+        return datos
 
 
-def suscriptor_patron(patrones: list):
-    """Suscriptor a patrones de canales."""
-    r = redis.Redis(host='localhost', port=6379, decode_responses=True)
-    pubsub = r.pubsub()
+def _timestamp(mensaje):
+    """Instante de publicación (epoch) según el campo `timestamp`, o None."""
+    if not isinstance(mensaje, dict):
+        return None
+    try:
+        return datetime.fromisoformat(mensaje["timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class Suscriptor:
+    """
+    Un hilo lector y un pool de trabajadores entre los que se reparten
+    los mensajes, con una cola acotada en medio.
     
-    print(f"📥 Suscrito a patrones: {', '.join(patrones)}")
-    print("   Esperando mensajes... (Ctrl+C para salir)\n")
+    El hilo lector solo lee del socket, decodifica el JSON y encola; los
+    manejadores (uno por canal o patrón) corren en los trabajadores.
+    Si la cola se llena se aplica `politica`:
+    
+        descartar_antiguo  se descarta el mensaje más viejo de la cola
+        bloquear           el lector espera (Redis acumula en su buffer)
+        desbordar          se escribe en un fichero temporal y se
+                           reencola en orden cuando vuelve a haber sitio
+    
+    `metricas()` devuelve el lag de extremo a extremo (desde el campo
+    `timestamp` del mensaje hasta que termina su manejador), la
+    profundidad de la cola y los descartes.
+    
+    Con `transporte="streams"` se lee en lotes con XREADGROUP y cada
+    mensaje se confirma cuando su
+    manejador termina sin error; los XACK se envían en lote desde el hilo
+    lector. Lo que no se confirma (error, o descartado por la política)
+    se vuelve a entregar con XAUTOCLAIM. Streams no admite patrones.
     
-    pubsub.psubscribe(*patrones)
+    Sin `grupo` (ni PUBSUB_GRUPO), el suscriptor crea un grupo propio que
+    empieza en "$" (solo lo nuevo) y se borra en `parar()`: todos los
+    suscriptores reciben cada mensaje. Con un `grupo` con nombre, el grupo
+    empieza desde el principio del stream, se conserva y los suscriptores
+    que lo comparten se reparten los mensajes. El consumidor por defecto
+    es "<host>-<pid>".
+    
+    Ejemplo:
+        s = Suscriptor(trabajadores=8, capacidad=5000, politica="desbordar")
+        s.registrar("chat:sala_general", lambda canal, mensaje: ...)
+        s.registrar_patron("eventos:*", manejar_evento)
+        s.iniciar()
+    """
+    
+    POLITICAS = ("descartar_antiguo", "bloquear", "desbordar")
+    
+    def __init__(self, r=None, trabajadores: int = 4, capacidad: int = 1000,
+                 politica: str = "descartar_antiguo", ventana_lag: int = 10000,
+                 transporte: str = None, grupo: str = None, consumidor: str = None,
+                 lote: int = 100, reclamar_tras_ms: int = 30000, avisar_errores: bool = True):
+        if politica not in self.POLITICAS:
+            raise ValueError(f"Política desconocida: {politica} (usar {', '.join(self.POLITICAS)})")
+        self.r = r or crear_conexion()
+        self.trabajadores = trabajadores
+        self.politica = politica
+        self.avisar_errores = avisar_errores
+        self.transporte = transporte or TRANSPORTE
+        if self.transporte == "streams":
+            self._pubsub = None
+            grupo = grupo or os.environ.get("PUBSUB_GRUPO")
+            self._grupo_propio = not grupo
+            consumidor = consumidor or f"{socket.gethostname()}-{os.getpid()}"
+            self._streams = ConsumidorStreams(
+                self.r, grupo or f"suscriptor:{consumidor}:{uuid.uuid4().hex[:8]}", consumidor,
+                lote, reclamar_tras_ms, desde="$" if self._grupo_propio else "0"
+            )
+        elif self.transporte == "pubsub":
+            self._pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+            self._streams = None
+        else:
+            raise ValueError(f"Transporte desconocido: {self.transporte} (usar pubsub o streams)")
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._desborde = _Desborde() if politica == "desbordar" else None
+        self._canales = {}
+        self._patrones = {}
+        self._parar = threading.Event()
+        self._hilos = []
+        self._lock = threading.Lock()
+        self._lags = deque(maxlen=ventana_lag)
+        self._contadores = dict.fromkeys(
+            ["recibidos", "procesados", "errores", "descartados", "desbordados", "bloqueos"], 0
+        )
+        self._max_en_cola = 0
+    
+    # Registro de manejadores: manejador(canal, mensaje)
+    def registrar(self, canal: str, manejador):
+        self._canales[canal] = manejador
+        if self._hilos:
+            self._suscribir([canal])
+    
+    def registrar_patron(self, patron: str, manejador):
+        if self._streams:
+            raise ValueError("El transporte streams no admite patrones")
+        self._patrones[patron] = manejador
+        if self._hilos:
+            self._pubsub.psubscribe(patron)
+    
+    def _suscribir(self, canales):
+        if self._streams:
+            self._streams.suscribir(*canales)
+        else:
+            self._pubsub.subscribe(*canales)
+    
+    def iniciar(self):
+        """Se suscribe a lo registrado y arranca el lector y los trabajadores."""
+        if self._canales:
+            self._suscribir(list(self._canales))
+        if self._patrones:
+            self._pubsub.psubscribe(*self._patrones)
+        
+        lector = self._leer_streams if self._streams else self._leer
+        self._hilos = [threading.Thread(target=lector, name="pubsub-lector", daemon=True)]
+        self._hilos += [
+            threading.Thread(target=self._trabajar, name=f"pubsub-trabajador-{i}", daemon=True)
+            for i in range(self.trabajadores)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+    
+    def parar(self, timeout: float = 5.0):
+        """Deja de leer, procesa lo pendiente (cola y desborde) y cierra."""
+        self._parar.set()
+        lector, *trabajadores = self._hilos
+        lector.join(timeout)
+        
+        while self._desborde and self._desborde.pendientes:
+            self._cola.put(self._desborde.leer())
+        for _ in trabajadores:
+            self._cola.put(None)
+        for hilo in trabajadores:
+            hilo.join(timeout)
+        
+        if self._streams:
+            self._streams.confirmar()
+            if self._grupo_propio:
+                self._streams.eliminar_grupo()
+        else:
+            self._pubsub.close()
+        if self._desborde:
+            self._desborde.cerrar()
+    
+    # Hilo lector
+    def _leer(self):
+        while not self._parar.is_set():
+            espera = 0.5
+            if self._desborde and self._desborde.pendientes:
+                self._reencolar()
+                espera = 0.01  # Volver pronto a reencolar lo que quede
+            try:
+                mensaje = self._pubsub.get_message(timeout=espera)
+            except redis.ConnectionError:
+                time.sleep(1)  # redis-py reconecta y se vuelve a suscribir
+                continue
+            if mensaje is None or mensaje['type'] not in ('message', 'pmessage'):
+                continue
+            
+            datos = _decodificar(mensaje['data'])
+            self._contadores["recibidos"] += 1
+            self._encolar([mensaje['channel'], mensaje.get('pattern'), datos, _timestamp(datos), None])
+    
+    def _leer_streams(self):
+        while not self._parar.is_set():
+            espera = 500
+            if self._desborde and self._desborde.pendientes:
+                self._reencolar()
+                espera = 10
+            try:
+                self._streams.confirmar()
+                entradas = self._streams.leer(bloqueo_ms=espera)
+            except redis.ConnectionError:
+                time.sleep(1)
+                continue
+            
+            for canal, id_entrada, datos in entradas:
+                self._contadores["recibidos"] += 1
+                self._encolar([canal, None, datos, _timestamp(datos), id_entrada])
+    
+    def _encolar(self, item):
+        # Con mensajes en el desborde, los nuevos van detrás para no desordenar
+        if self._desborde and self._desborde.pendientes:
+            self._desborde.escribir(item)
+            self._contadores["desbordados"] += 1
+            return
+        
+        try:
+            self._cola.put_nowait(item)
+        except queue.Full:
+            if self.politica == "bloquear":
+                self._contadores["bloqueos"] += 1
+                self._cola.put(item)
+            elif self.politica == "descartar_antiguo":
+                try:
+                    self._cola.get_nowait()
+                    self._contadores["descartados"] += 1
+                except queue.Empty:
+                    pass
+                self._cola.put_nowait(item)  # Solo el lector encola: ya hay sitio
+            else:
+                self._desborde.escribir(item)
+                self._contadores["desbordados"] += 1
+        
+        self._max_en_cola = max(self._max_en_cola, self._cola.qsize())
+    
+    def _reencolar(self):
+        while self._desborde.pendientes and not self._cola.full():
+            self._cola.put_nowait(self._desborde.leer())
+    
+    # Trabajadores
+    def _trabajar(self):
+        while True:
+            item = self._cola.get()
+            if item is None:
+                return
+            
+            canal, patron, mensaje, publicado, id_entrada = item
+            manejador = self._patrones.get(patron) if patron else self._canales.get(canal)
+            error = False
+            try:
+                if manejador:
+                    manejador(canal, mensaje)
+            except Exception as e:
+                error = True
+                if self.avisar_errores:
+                    print(f"❌ Error en el manejador de '{canal}': {e}")
+            else:
+                if id_entrada:
+                    self._streams.marcar(canal, id_entrada)
+            
+            with self._lock:
+                self._contadores["procesados"] += 1
+                self._contadores["errores"] += error
+                if publicado is not None:
+                    self._lags.append(time.time() - publicado)
+    
+    def metricas(self) -> dict:
+        """Contadores, profundidad de la cola y percentiles del lag (ms)."""
+        with self._lock:
+            contadores = dict(self._contadores)
+            lags = sorted(self._lags)
+        
+        def percentil(p):
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))] * 1000, 2) if lags else None
+        
+        return {
+            **contadores,
+            "en_cola": self._cola.qsize(),
+            "max_en_cola": self._max_en_cola,
+            "capacidad": self._cola.maxsize,
+            "en_desborde": self._desborde.pendientes if self._desborde else 0,
+            "politica": self.politica,
+            "transporte": self.transporte,
+            "reclamados": self._streams.reclamados if self._streams else 0,
+            "lag_ms": {"p50": percentil(0.50), "p95": percentil(0.95),
+                       "p99": percentil(0.99), "max": percentil(1.0)}
+        }
+
+
+def _ejecutar(suscriptor):
+    """Arranca el suscriptor hasta Ctrl+C y muestra sus métricas al salir."""
+    suscriptor.iniciar()
+    print("   Esperando mensajes... (Ctrl+C para salir)\n")
     
     try:
-        for mensaje in pubsub.listen():
-            if mensaje['type'] == 'pmessage':
-                patron = mensaje['pattern']
-                canal = mensaje['channel']
-                datos = mensaje['data']
-                texto = formatear_mensaje(canal, datos)
-                print(f"[{patron} → {canal}] {texto}")
+        while True:
+            time.sleep(1)
     except KeyboardInterrupt:
+        suscriptor.parar()
         print("\n👋 Desconectado")
-    finally:
-        pubsub.punsubscribe()
+        print(f"📊 {json.dumps(suscriptor.metricas(), ensure_ascii=False)}")
+
+
+def suscriptor_simple(canales: list):
+    """Suscriptor a canales específicos."""
+    suscriptor = Suscriptor()
+    
+    def mostrar(canal, mensaje):
+        print(f"[{canal}] {formatear_mensaje(canal, mensaje)}")
+    
+    for canal in canales:
+        suscriptor.registrar(canal, mostrar)
+    
+    print(f"📥 Suscrito a: {', '.join(canales)}")
+    _ejecutar(suscriptor)
+
+
+def suscriptor_patron(patrones: list):
+    """Suscriptor a patrones de canales."""
+    suscriptor = Suscriptor()
+    if suscriptor.transporte == "streams":
+        print("❌ El transporte streams no admite patrones: usar canales concretos")
+        return
+    
+    for patron in patrones:
+        suscriptor.registrar_patron(
+            patron,
+            lambda canal, mensaje, patron=patron: print(
+                f"[{patron} → {canal}] {formatear_mensaje(canal, mensaje)}"
+            )
+        )
+    
+    print(f"📥 Suscrito a patrones: {', '.join(patrones)}")
+    _ejecutar(suscriptor)
 
 
 def demo_chat():
@@ -0,0 +1,205 @@
+"""
+🌊 Transporte de notificaciones sobre Redis Streams
+
+Alternativa duradera a Pub/Sub para publisher.py y subscriber.py
+(PUBSUB_TRANSPORTE=streams). Cada canal es un stream `stream:<canal>`:
+
+    - Publicar: XADD con MAXLEN aproximado (~), en pipeline por lotes.
+    - Consumir: grupos de consumidores (XREADGROUP) leyendo en lotes
+      (COUNT) y confirmando también en lotes (un XACK por stream).
+    - Un consumidor que se reinicia con el mismo nombre vuelve a leer
+      primero sus entradas sin confirmar (ID 0).
+    - Las entradas que se quedan colgadas (consumidor caído, manejador
+      con error) las recupera otro consumidor con XAUTOCLAIM pasado
+      `reclamar_tras_ms`.
+
+Dentro de un grupo cada entrada la recibe un solo consumidor (reparto de
+carga); para que varios suscriptores reciban todo (como en Pub/Sub),
+cada uno usa su propio grupo. Un grupo creado desde "0" lee el stream
+desde el principio: un suscriptor con nombre que llega tarde no pierde
+nada. La entrega es "al menos una vez": un mensaje cuyo manejador falla
+se vuelve a entregar.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+
+import redis
+
+
+PREFIJO = "stream"
+
+
+def clave_stream(canal: str) -> str:
+    return f"{PREFIJO}:{canal}"
+
+
+def publicar_lote_stream(r, mensajes, tamano_lote: int = 500, maxlen: int = 100000) -> dict:
+    """
+    Igual que `publicar_lote` pero con XADD: cada mensaje queda guardado
+    en el stream de su canal (recortado a unos `maxlen` con MAXLEN ~).
+    """
+    enviados = 0
+    latencias = []
+    lote = []
+
+    def enviar():
+        nonlocal enviados
+        inicio = time.perf_counter()
+        timestamp = datetime.now().isoformat()
+        pipe = r.pipeline(transaction=False)
+        for canal, mensaje in lote:
+            datos = json.dumps({**mensaje, "timestamp": timestamp}, ensure_ascii=False)
+            pipe.xadd(clave_stream(canal), {"datos": datos}, maxlen=maxlen, approximate=True)
+        pipe.execute()
+        latencias.append(time.perf_counter() - inicio)
+        enviados += len(lote)
+        lote.clear()
+
+    for canal, mensaje in mensajes:
+        lote.append((canal, mensaje))
+        if len(lote) >= tamano_lote:
+            enviar()
+    if lote:
+        enviar()
+
+    # En un stream cada mensaje se "entrega" al guardarse
+    return {"mensajes": enviados, "entregas": enviados, "latencias_lote": latencias}
+
+
+def _decodificar(campos):
+    try:
+        return json.loads(campos["datos"])
+    except (KeyError, TypeError, ValueError):
+        return campos
+
+
+class ConsumidorStreams:
+    """
+    Lectura con grupo de consumidores sobre los streams de varios canales.
+
+    `leer()` devuelve lotes de (canal, id, mensaje). Cuando un mensaje se
+    ha procesado se llama a `marcar(canal, id)` (desde cualquier hilo) y
+    `confirmar()` manda todos los XACK acumulados en un pipeline.
+    """
+
+    def __init__(self, r, grupo: str, consumidor: str, lote: int = 100,
+                 reclamar_tras_ms: int = 30000, desde: str = "0"):
+        self.r = r
+        self.grupo = grupo
+        self.desde = desde           # ID desde el que se crea el grupo ("$" = solo lo nuevo)
+        self.consumidor = consumidor
+        self.lote = lote
+        self.reclamar_tras_ms = reclamar_tras_ms
+        self._canales = []
+        self._propios = {}           # Primero, lo que quedó sin confirmar de antes
+        self._cursores = {}          # Cursor de XAUTOCLAIM por stream
+        self._ultimo_reclamo = 0.0
+        self._hechos = {}
+        self._lock = threading.Lock()
+        self.reclamados = 0
+
+    def suscribir(self, *canales):
+        """Crea el grupo en cada stream (desde `desde`) si no existe."""
+        for canal in canales:
+            try:
+                self.r.xgroup_create(clave_stream(canal), self.grupo, id=self.desde, mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+            if canal not in self._canales:
+                self._canales.append(canal)
+            self._propios[canal] = "0"
+
+    def eliminar_grupo(self):
+        """Borra el grupo de todos los streams (grupos de un solo uso)."""
+        pipe = self.r.pipeline(transaction=False)
+        for canal in self._canales:
+            pipe.xgroup_destroy(clave_stream(canal), self.grupo)
+        pipe.execute()
+
+    def leer(self, bloqueo_ms: int = 500) -> list:
+        """Un lote de entradas: reclamadas, propias pendientes o nuevas."""
+        if not self._canales:
+            time.sleep(bloqueo_ms / 1000)
+            return []
+
+        entradas = []
+        if time.monotonic() - self._ultimo_reclamo >= self.reclamar_tras_ms / 2000:
+            entradas += self.reclamar()
+
+        if self._propios:
+            # Historial propio (ID concreto): se avanza a mano por cada stream
+            respuesta = self.r.xreadgroup(
+                self.grupo, self.consumidor,
+                {clave_stream(c): desde for c, desde in self._propios.items()}, count=self.lote
+            )
+            leidos = {clave.split(":", 1)[1]: mensajes for clave, mensajes in respuesta or []}
+            for canal in list(self._propios):
+                if leidos.get(canal):
+                    self._propios[canal] = leidos[canal][-1][0]
+                else:
+                    del self._propios[canal]
+            return entradas + self._aplanar(respuesta)
+
+        respuesta = self.r.xreadgroup(
+            self.grupo, self.consumidor,
+            {clave_stream(c): ">" for c in self._canales},
+            count=self.lote, block=None if entradas else bloqueo_ms
+        )
+        return entradas + self._aplanar(respuesta)
+
+    def reclamar(self) -> list:
+        """XAUTOCLAIM de las entradas inactivas más de `reclamar_tras_ms`."""
+        self._ultimo_reclamo = time.monotonic()
+        pipe = self.r.pipeline(transaction=False)
+        for canal in self._canales:
+            pipe.xautoclaim(
+                clave_stream(canal), self.grupo, self.consumidor, self.reclamar_tras_ms,
+                start_id=self._cursores.get(canal, "0-0"), count=self.lote
+            )
+
+        entradas = []
+        for canal, (cursor, reclamadas, *_) in zip(self._canales, pipe.execute()):
+            self._cursores[canal] = cursor
+            for id_entrada, campos in reclamadas:
+                if campos:
+                    entradas.append((canal, id_entrada, _decodificar(campos)))
+        self.reclamados += len(entradas)
+        return entradas
+
+    def _aplanar(self, respuesta) -> list:
+        entradas = []
+        for clave, mensajes in respuesta or []:
+            canal = clave.split(":", 1)[1]
+            for id_entrada, campos in mensajes:
+                if campos:
+                    entradas.append((canal, id_entrada, _decodificar(campos)))
+                else:
+                    self.marcar(canal, id_entrada)  # Recortada por MAXLEN: nada que procesar
+        return entradas
+
+    def marcar(self, canal: str, id_entrada: str):
+        with self._lock:
+            self._hechos.setdefault(canal, []).append(id_entrada)
+
+    def confirmar(self) -> int:
+        """Un XACK por stream con todos los IDs procesados desde la última vez."""
+        with self._lock:
+            hechos, self._hechos = self._hechos, {}
+        if not hechos:
+            return 0
+
+        pipe = self.r.pipeline(transaction=False)
+        for canal, ids in hechos.items():
+            pipe.xack(clave_stream(canal), self.grupo, *ids)
+        return sum(pipe.execute())
+
+    def pendientes(self) -> int:
+        """Entradas entregadas y sin confirmar en el grupo (todos los consumidores)."""
+        pipe = self.r.pipeline(transaction=False)
+        for canal in self._canales:
+            pipe.xpending(clave_stream(canal), self.grupo)
+        return sum(p["pending"] for p in pipe.execute())
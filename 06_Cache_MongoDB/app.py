@@ -7,20 +7,47 @@ Ejecutar:
     python app.py
 
 Endpoints:
-    GET  /api/productos          - Listar productos
+    GET  /api/productos          - Listar productos (?cursor=...&limit=100, ?stream=1)
     GET  /api/productos/<id>     - Obtener producto
+    GET  /api/productos/batch    - Obtener varios productos (?ids=a,b,c)
+    GET  /api/productos/buscar   - Buscar por nombre (?q=texto&k=20)
+    GET  /api/productos/autocompletar - Sugerencias (?q=prefijo&k=10)
     POST /api/productos          - Crear producto
     PUT  /api/productos/<id>     - Actualizar producto
     DELETE /api/productos/<id>   - Eliminar producto
     GET  /api/stats              - Estadísticas de caché
+    GET  /metrics                - Métricas en formato Prometheus
+    POST /api/cache/warmup       - Precargar lo más popular (?productos=1000)
+
+Cada respuesta lleva `Server-Timing` con el tiempo en redis, mongo y
+codec (serialización), además del total.
 """
 
-from flask import Flask, jsonify, request
-from models import producto_repo, cache_stats, redis_client
+from flask import Flask, Response, jsonify, request, stream_with_context
+from models import (
+    producto_repo, cache_stats, cache_l1, conexiones, generaciones, redis_client, mongo_db,
+    iniciar_peticion, metricas, politica_ttl, server_timing, asegurar_indice_busqueda, K_BUSQUEDA
+)
+from precalentar import precalentar
+import json
+import os
+import threading
 import time
 
 app = Flask(__name__)
 
+MAX_BATCH = 500  # IDs máximos en /api/productos/batch
+MAX_RESULTADOS = 100  # k máximo en búsquedas y autocompletado
+MAX_PAGINA = 500  # limit máximo en /api/productos
+
+# Tras un deploy: precargar en segundo plano (un solo worker, por el lock)
+if os.environ.get("CACHE_WARMUP_ON_START") == "1":
+    threading.Thread(target=precalentar, daemon=True).start()
+
+# Catálogo cargado directamente en MongoDB (insert_many): construir el índice de búsqueda
+if producto_repo.indice:
+    asegurar_indice_busqueda()
+
 
 # =============================================================================
 # MIDDLEWARE
@@ -28,16 +55,20 @@ app = Flask(__name__)
 
 @app.before_request
 def before_request():
-    """Registrar tiempo de inicio."""
-    request.start_time = time.time()
+    """Registrar tiempo de inicio y empezar a medir etapas."""
+    request.start_time = time.perf_counter()
+    request.tiempos = iniciar_peticion()
 
 
 @app.after_request
 def after_request(response):
-    """Añadir tiempo de respuesta a headers."""
+    """Añadir tiempos a headers y a los histogramas."""
     if hasattr(request, 'start_time'):
-        elapsed = (time.time() - request.start_time) * 1000
-        response.headers['X-Response-Time'] = f"{elapsed:.2f}ms"
+        elapsed = time.perf_counter() - request.start_time
+        response.headers['X-Response-Time'] = f"{elapsed * 1000:.2f}ms"
+        response.headers['Server-Timing'] = server_timing(request.tiempos, elapsed)
+        endpoint = request.url_rule.rule if request.url_rule else "sin_ruta"
+        metricas.observar_peticion(endpoint, request.method, response.status_code, elapsed)
     return response
 
 
@@ -45,16 +76,36 @@ def after_request(response):
 # ENDPOINTS DE PRODUCTOS
 # =============================================================================
 
+def json_en_streaming(productos):
+    """Escribe {"success": true, "data": [...]} documento a documento."""
+    yield '{"success": true, "data": ['
+    for i, producto in enumerate(productos):
+        yield ("," if i else "") + json.dumps(producto, default=str)
+    yield ']}'
+
+
 @app.route('/api/productos', methods=['GET'])
 def listar_productos():
-    """Listar todos los productos."""
+    """Listar productos por páginas (cursor sobre _id) o en streaming."""
     try:
-        productos = producto_repo.obtener_todos()
+        cursor = request.args.get('cursor') or None
+        
+        if request.args.get('stream') == '1':
+            # Directo del cursor de MongoDB, sin cargar todo en memoria
+            productos = producto_repo.iterar(cursor)
+            return Response(stream_with_context(json_en_streaming(productos)),
+                            mimetype='application/json')
+        
+        limit = max(1, min(request.args.get('limit', 100, type=int), MAX_PAGINA))
+        pagina = producto_repo.obtener_pagina(cursor, limit)
         return jsonify({
             "success": True,
-            "count": len(productos),
-            "data": productos
+            "count": len(pagina['data']),
+            "data": pagina['data'],
+            "next_cursor": pagina['next_cursor']
         })
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -79,6 +130,42 @@ def obtener_producto(producto_id):
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/productos/batch', methods=['GET'])
+def obtener_productos_batch():
+    """Obtener varios productos por ID en una sola petición."""
+    try:
+        ids = [
+            pid.strip()
+            for valor in request.args.getlist('ids')
+            for pid in valor.split(',')
+            if pid.strip()
+        ]
+        
+        if not ids:
+            return jsonify({
+                "success": False,
+                "error": "Se requiere parámetro 'ids'"
+            }), 400
+        
+        if len(ids) > MAX_BATCH:
+            return jsonify({
+                "success": False,
+                "error": f"Máximo {MAX_BATCH} IDs por petición"
+            }), 400
+        
+        productos = producto_repo.obtener_muchos(ids)
+        encontrados = {p['_id'] for p in productos}
+        
+        return jsonify({
+            "success": True,
+            "count": len(productos),
+            "data": productos,
+            "not_found": [pid for pid in dict.fromkeys(ids) if pid not in encontrados]
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/productos', methods=['POST'])
 def crear_producto():
     """Crear un nuevo producto."""
@@ -163,7 +250,8 @@ def buscar_productos():
                 "error": "Se requiere parámetro 'q'"
             }), 400
         
-        productos = producto_repo.buscar(query)
+        k = max(1, min(request.args.get('k', K_BUSQUEDA, type=int), MAX_RESULTADOS))
+        productos = producto_repo.buscar(query, k)
         
         return jsonify({
             "success": True,
@@ -175,6 +263,29 @@ def buscar_productos():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/productos/autocompletar', methods=['GET'])
+def autocompletar_productos():
+    """Sugerencias de términos y productos para un prefijo."""
+    try:
+        query = request.args.get('q', '')
+        
+        if not query:
+            return jsonify({
+                "success": False,
+                "error": "Se requiere parámetro 'q'"
+            }), 400
+        
+        k = max(1, min(request.args.get('k', 10, type=int), MAX_RESULTADOS))
+        
+        return jsonify({
+            "success": True,
+            "query": query,
+            "data": producto_repo.autocompletar(query, k)
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # =============================================================================
 # ENDPOINTS DE ESTADÍSTICAS
 # =============================================================================
@@ -184,6 +295,10 @@ def estadisticas():
     """Obtener estadísticas del caché."""
     try:
         stats = cache_stats.obtener_estadisticas()
+        stats['l1'] = cache_l1.estadisticas()  # Por worker
+        stats['pools'] = conexiones.estadisticas()  # Por worker
+        stats['ttl'] = politica_ttl.estadisticas()
+        stats['etapas'] = metricas.resumen_etapas()  # Incluye nº de consultas a MongoDB
         
         # Añadir info de Redis
         info = redis_client.info('memory')
@@ -203,6 +318,8 @@ def reset_estadisticas():
     """Resetear estadísticas del caché."""
     try:
         cache_stats.reset()
+        cache_l1.reset()
+        metricas.reset()
         return jsonify({
             "success": True,
             "message": "Estadísticas reseteadas"
@@ -215,19 +332,54 @@ def reset_estadisticas():
 def limpiar_cache():
     """Limpiar todo el caché."""
     try:
-        # Solo eliminar claves de productos
-        claves = redis_client.keys("producto:*") + redis_client.keys("productos:*")
-        if claves:
-            redis_client.delete(*claves)
+        # O(1): nueva generación de productos; las claves antiguas las
+        # borra un reaper en segundo plano (SCAN + UNLINK, nunca KEYS)
+        nuevas = generaciones.limpiar("producto", "productos")
+        cache_l1.invalidar_todo()
+        
+        return jsonify({
+            "success": True,
+            "message": "Caché limpiado",
+            "generaciones": nuevas
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/cache/warmup', methods=['POST'])
+def precalentar_cache():
+    """Precargar productos, búsquedas y listados más populares."""
+    try:
+        resultado = precalentar(
+            productos=request.args.get('productos', 1000, type=int),
+            busquedas=request.args.get('busquedas', 50, type=int),
+            listados=request.args.get('listados', 10, type=int)
+        )
+        
+        if resultado.get("en_curso"):
+            return jsonify({
+                "success": False,
+                "error": "Ya hay un precalentamiento en curso"
+            }), 409
         
         return jsonify({
             "success": True,
-            "message": f"Caché limpiado ({len(claves)} claves eliminadas)"
+            "data": resultado
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/metrics', methods=['GET'])
+def metricas_prometheus():
+    """Histogramas de latencia y hits/misses en formato Prometheus."""
+    try:
+        texto = metricas.exportar(cache_stats.obtener_estadisticas())
+        return Response(texto, mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # =============================================================================
 # HEALTH CHECK
 # =============================================================================
@@ -240,7 +392,6 @@ def health():
         redis_ok = redis_client.ping()
         
         # Verificar MongoDB
-        from models import mongo_db
         mongo_ok = mongo_db.command('ping').get('ok', 0) == 1
         
         return jsonify({
@@ -264,15 +415,20 @@ if __name__ == '__main__':
     print("🚀 API de Productos con Redis Cache")
     print("=" * 50)
     print("\nEndpoints disponibles:")
-    print("  GET    /api/productos")
+    print("  GET    /api/productos?cursor=<cursor>&limit=<n>")
+    print("  GET    /api/productos?stream=1")
     print("  GET    /api/productos/<id>")
+    print("  GET    /api/productos/batch?ids=<id1>,<id2>")
     print("  POST   /api/productos")
     print("  PUT    /api/productos/<id>")
     print("  DELETE /api/productos/<id>")
-    print("  GET    /api/productos/buscar?q=<query>")
+    print("  GET    /api/productos/buscar?q=<query>&k=<n>")
+    print("  GET    /api/productos/autocompletar?q=<prefijo>")
     print("  GET    /api/stats")
     print("  POST   /api/stats/reset")
     print("  POST   /api/cache/clear")
+    print("  POST   /api/cache/warmup")
+    print("  GET    /metrics")
     print("  GET    /health")
     print("\n" + "=" * 50)
     
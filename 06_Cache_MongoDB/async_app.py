@@ -0,0 +1,439 @@
+"""
+⚡ API REST asíncrona (ASGI) con Quart + Redis Cache + MongoDB
+
+Mismos endpoints que app.py, pero sobre un event loop: mientras una
+petición espera a Redis o a MongoDB, el worker atiende otras.
+
+Ejecutar:
+    uvicorn async_app:app --port 5001 --workers 4
+    python async_app.py            # servidor de desarrollo
+
+Endpoints:
+    GET  /api/productos          - Listar productos (?cursor=...&limit=100, ?stream=1)
+    GET  /api/productos/<id>     - Obtener producto
+    GET  /api/productos/batch    - Obtener varios productos (?ids=a,b,c)
+    GET  /api/productos/buscar   - Buscar por nombre (?q=texto&k=20)
+    GET  /api/productos/autocompletar - Sugerencias (?q=prefijo&k=10)
+    POST /api/productos          - Crear producto
+    PUT  /api/productos/<id>     - Actualizar producto
+    DELETE /api/productos/<id>   - Eliminar producto
+    GET  /api/stats              - Estadísticas de caché
+    GET  /metrics                - Métricas en formato Prometheus
+    POST /api/cache/warmup       - Precargar lo más popular (?productos=1000)
+"""
+
+from quart import Quart, jsonify, request
+from async_models import (
+    producto_repo_async as producto_repo, cache_stats, redis_async, mongo_db_async
+)
+from models import (
+    CacheL1, K_BUSQUEDA, asegurar_indice_busqueda, generaciones, iniciar_peticion, metricas, politica_ttl,
+    server_timing
+)
+from precalentar import precalentar
+import asyncio
+import json
+import os
+import threading
+import time
+
+app = Quart(__name__)
+
+MAX_BATCH = 500  # IDs máximos en /api/productos/batch
+MAX_RESULTADOS = 100  # k máximo en búsquedas y autocompletado
+MAX_PAGINA = 500  # limit máximo en /api/productos
+
+# Tras un deploy: precargar en segundo plano (un solo worker, por el lock)
+if os.environ.get("CACHE_WARMUP_ON_START") == "1":
+    threading.Thread(target=precalentar, daemon=True).start()
+
+# Catálogo cargado directamente en MongoDB (insert_many): construir el índice de búsqueda
+if producto_repo.indice:
+    asegurar_indice_busqueda()
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+@app.before_request
+async def before_request():
+    """Registrar tiempo de inicio y empezar a medir etapas."""
+    request.start_time = time.perf_counter()
+    request.tiempos = iniciar_peticion()
+
+
+@app.after_request
+async def after_request(response):
+    """Añadir tiempos a headers y a los histogramas."""
+    if hasattr(request, 'start_time'):
+        elapsed = time.perf_counter() - request.start_time
+        response.headers['X-Response-Time'] = f"{elapsed * 1000:.2f}ms"
+        response.headers['Server-Timing'] = server_timing(request.tiempos, elapsed)
+        endpoint = request.url_rule.rule if request.url_rule else "sin_ruta"
+        metricas.observar_peticion(endpoint, request.method, response.status_code, elapsed)
+    return response
+
+
+# =============================================================================
+# ENDPOINTS DE PRODUCTOS
+# =============================================================================
+
+async def json_en_streaming(productos):
+    """Escribe {"success": true, "data": [...]} documento a documento."""
+    yield b'{"success": true, "data": ['
+    primero = True
+    async for producto in productos:
+        yield (("" if primero else ",") + json.dumps(producto, default=str)).encode()
+        primero = False
+    yield b']}'
+
+
+@app.route('/api/productos', methods=['GET'])
+async def listar_productos():
+    """Listar productos por páginas (cursor sobre _id) o en streaming."""
+    try:
+        cursor = request.args.get('cursor') or None
+        
+        if request.args.get('stream') == '1':
+            # Directo del cursor de MongoDB, sin cargar todo en memoria
+            productos = producto_repo.iterar(cursor)
+            return app.response_class(json_en_streaming(productos), mimetype='application/json')
+        
+        limit = max(1, min(request.args.get('limit', 100, type=int), MAX_PAGINA))
+        pagina = await producto_repo.obtener_pagina(cursor, limit)
+        return jsonify({
+            "success": True,
+            "count": len(pagina['data']),
+            "data": pagina['data'],
+            "next_cursor": pagina['next_cursor']
+        })
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/productos/<producto_id>', methods=['GET'])
+async def obtener_producto(producto_id):
+    """Obtener un producto por ID."""
+    try:
+        producto = await producto_repo.obtener(producto_id)
+        
+        if not producto:
+            return jsonify({
+                "success": False,
+                "error": "Producto no encontrado"
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "data": producto
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/productos/batch', methods=['GET'])
+async def obtener_productos_batch():
+    """Obtener varios productos por ID en una sola petición."""
+    try:
+        ids = [
+            pid.strip()
+            for valor in request.args.getlist('ids')
+            for pid in valor.split(',')
+            if pid.strip()
+        ]
+        
+        if not ids:
+            return jsonify({
+                "success": False,
+                "error": "Se requiere parámetro 'ids'"
+            }), 400
+        
+        if len(ids) > MAX_BATCH:
+            return jsonify({
+                "success": False,
+                "error": f"Máximo {MAX_BATCH} IDs por petición"
+            }), 400
+        
+        productos = await producto_repo.obtener_muchos(ids)
+        encontrados = {p['_id'] for p in productos}
+        
+        return jsonify({
+            "success": True,
+            "count": len(productos),
+            "data": productos,
+            "not_found": [pid for pid in dict.fromkeys(ids) if pid not in encontrados]
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/productos', methods=['POST'])
+async def crear_producto():
+    """Crear un nuevo producto."""
+    try:
+        datos = await request.get_json()
+        
+        if not datos or 'nombre' not in datos:
+            return jsonify({
+                "success": False,
+                "error": "El campo 'nombre' es requerido"
+            }), 400
+        
+        producto = await producto_repo.crear(datos)
+        
+        return jsonify({
+            "success": True,
+            "message": "Producto creado",
+            "data": producto
+        }), 201
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/productos/<producto_id>', methods=['PUT'])
+async def actualizar_producto(producto_id):
+    """Actualizar un producto."""
+    try:
+        datos = await request.get_json()
+        
+        if not datos:
+            return jsonify({
+                "success": False,
+                "error": "Se requieren datos para actualizar"
+            }), 400
+        
+        producto = await producto_repo.actualizar(producto_id, datos)
+        
+        if not producto:
+            return jsonify({
+                "success": False,
+                "error": "Producto no encontrado"
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "message": "Producto actualizado",
+            "data": producto
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/productos/<producto_id>', methods=['DELETE'])
+async def eliminar_producto(producto_id):
+    """Eliminar un producto."""
+    try:
+        eliminado = await producto_repo.eliminar(producto_id)
+        
+        if not eliminado:
+            return jsonify({
+                "success": False,
+                "error": "Producto no encontrado"
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "message": "Producto eliminado"
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/productos/buscar', methods=['GET'])
+async def buscar_productos():
+    """Buscar productos por nombre."""
+    try:
+        query = request.args.get('q', '')
+        
+        if not query:
+            return jsonify({
+                "success": False,
+                "error": "Se requiere parámetro 'q'"
+            }), 400
+        
+        k = max(1, min(request.args.get('k', K_BUSQUEDA, type=int), MAX_RESULTADOS))
+        productos = await producto_repo.buscar(query, k)
+        
+        return jsonify({
+            "success": True,
+            "query": query,
+            "count": len(productos),
+            "data": productos
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/productos/autocompletar', methods=['GET'])
+async def autocompletar_productos():
+    """Sugerencias de términos y productos para un prefijo."""
+    try:
+        query = request.args.get('q', '')
+        
+        if not query:
+            return jsonify({
+                "success": False,
+                "error": "Se requiere parámetro 'q'"
+            }), 400
+        
+        k = max(1, min(request.args.get('k', 10, type=int), MAX_RESULTADOS))
+        
+        return jsonify({
+            "success": True,
+            "query": query,
+            "data": await producto_repo.autocompletar(query, k)
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# =============================================================================
+# ENDPOINTS DE ESTADÍSTICAS
+# =============================================================================
+
+@app.route('/api/stats', methods=['GET'])
+async def estadisticas():
+    """Obtener estadísticas del caché."""
+    try:
+        # El flush de contadores es síncrono: fuera del event loop
+        stats = await asyncio.to_thread(cache_stats.obtener_estadisticas)
+        stats['ttl'] = await asyncio.to_thread(politica_ttl.estadisticas)
+        stats['etapas'] = await asyncio.to_thread(metricas.resumen_etapas)  # Incluye consultas a MongoDB
+        
+        # Añadir info de Redis
+        info, claves = await asyncio.gather(redis_async.info('memory'), redis_async.dbsize())
+        stats['redis_memory_used'] = info.get('used_memory_human', 'N/A')
+        stats['redis_keys'] = claves
+        
+        return jsonify({
+            "success": True,
+            "data": stats
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/stats/reset', methods=['POST'])
+async def reset_estadisticas():
+    """Resetear estadísticas del caché."""
+    try:
+        await asyncio.to_thread(cache_stats.reset)
+        await asyncio.to_thread(metricas.reset)
+        return jsonify({
+            "success": True,
+            "message": "Estadísticas reseteadas"
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/cache/clear', methods=['POST'])
+async def limpiar_cache():
+    """Limpiar todo el caché."""
+    try:
+        # O(1): nueva generación de productos; las claves antiguas las
+        # borra un reaper en segundo plano (SCAN + UNLINK, nunca KEYS)
+        nuevas = await asyncio.to_thread(generaciones.limpiar, "producto", "productos")
+        await redis_async.publish(CacheL1.CANAL, "*")  # Vaciar la L1 de los workers síncronos
+        
+        return jsonify({
+            "success": True,
+            "message": "Caché limpiado",
+            "generaciones": nuevas
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/cache/warmup', methods=['POST'])
+async def precalentar_cache():
+    """Precargar productos, búsquedas y listados más populares."""
+    try:
+        resultado = await asyncio.to_thread(
+            precalentar,
+            productos=request.args.get('productos', 1000, type=int),
+            busquedas=request.args.get('busquedas', 50, type=int),
+            listados=request.args.get('listados', 10, type=int)
+        )
+        
+        if resultado.get("en_curso"):
+            return jsonify({
+                "success": False,
+                "error": "Ya hay un precalentamiento en curso"
+            }), 409
+        
+        return jsonify({
+            "success": True,
+            "data": resultado
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+async def metricas_prometheus():
+    """Histogramas de latencia y hits/misses en formato Prometheus."""
+    try:
+        stats = await asyncio.to_thread(cache_stats.obtener_estadisticas)
+        texto = await asyncio.to_thread(metricas.exportar, stats)
+        return app.response_class(texto, mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# =============================================================================
+# HEALTH CHECK
+# =============================================================================
+
+@app.route('/health', methods=['GET'])
+async def health():
+    """Health check del servicio."""
+    try:
+        # Verificar Redis y MongoDB en paralelo
+        redis_ok, mongo = await asyncio.gather(
+            redis_async.ping(), mongo_db_async.command('ping')
+        )
+        mongo_ok = mongo.get('ok', 0) == 1
+        
+        return jsonify({
+            "status": "healthy" if redis_ok and mongo_ok else "unhealthy",
+            "redis": "ok" if redis_ok else "error",
+            "mongodb": "ok" if mongo_ok else "error"
+        })
+    except Exception as e:
+        return jsonify({
+            "status": "unhealthy",
+            "error": str(e)
+        }), 500
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("⚡ API de Productos con Redis Cache (ASGI)")
+    print("=" * 50)
+    print("\nEndpoints disponibles:")
+    print("  GET    /api/productos?cursor=<cursor>&limit=<n>")
+    print("  GET    /api/productos?stream=1")
+    print("  GET    /api/productos/<id>")
+    print("  GET    /api/productos/batch?ids=<id1>,<id2>")
+    print("  POST   /api/productos")
+    print("  PUT    /api/productos/<id>")
+    print("  DELETE /api/productos/<id>")
+    print("  GET    /api/productos/buscar?q=<query>&k=<n>")
+    print("  GET    /api/productos/autocompletar?q=<prefijo>")
+    print("  GET    /api/stats")
+    print("  POST   /api/stats/reset")
+    print("  POST   /api/cache/clear")
+    print("  POST   /api/cache/warmup")
+    print("  GET    /metrics")
+    print("  GET    /health")
+    print("\n" + "=" * 50)
+    
+    app.run(debug=True, port=5001)
@@ -0,0 +1,653 @@
+"""
+⚡ Versión asíncrona del caché Redis + MongoDB
+
+Mismo patrón cache-aside que `models.py`, pero con `redis.asyncio` y el
+driver asíncrono de MongoDB, para servir la API desde un servidor ASGI
+(ver `async_app.py`). Comparte con la versión síncrona el formato de las
+claves, las generaciones, el codec y las estadísticas, así que ambas
+aplicaciones pueden trabajar sobre el mismo caché.
+
+Todo lo que hace una petición va por `redis.asyncio`: lecturas y
+escrituras del caché, la política de TTL (`_ttl`/`_ttls`) y el índice de
+búsqueda (`IndiceBusquedaAsync`). Las estadísticas (`cache_stats`,
+`metricas`, `accesos`) se siguen contando con las clases síncronas: en la
+petición solo suman en memoria y las vuelca a Redis su hilo, así que no
+bloquean el loop. Sus lecturas (/api/stats, /metrics) y el mantenimiento
+(limpiar, precalentar) reutilizan ese código síncrono en un hilo, porque
+antes de leer vuelcan lo pendiente de este proceso, que vive en esos
+objetos.
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from functools import wraps
+
+import redis.asyncio as aioredis
+from redis.exceptions import LockError
+
+from pymongo import ReturnDocument
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # PyMongo < 4.9: usar Motor
+    from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+
+from models import (
+    K_BUSQUEDA, LUA_WRITE_THROUGH, CacheL1, CacheStats, Generaciones, _ConexionPerezosa, accesos,
+    asegurar_indice_busqueda, codec, codificar_cursor, conexiones, etapa, filtro_cursor,
+    generaciones, indice_busqueda, politica_ttl, redis_client
+)
+from search_index import tokenizar
+
+
+# =============================================================================
+# CONEXIONES
+# =============================================================================
+
+class GestorConexionesAsync:
+    """
+    Como `GestorConexiones` (misma configuración), para los clientes asíncronos.
+    
+    Se crean en el primer uso y se vuelven a crear tras un fork o en otro
+    event loop: un cliente asíncrono no puede usarse fuera del loop en el
+    que abrió sus conexiones.
+    """
+    
+    def __init__(self, config=conexiones):
+        self.config = config
+        self._dueno = None  # (pid, loop) para el que se crearon los clientes
+        self._redis = {}  # decode_responses -> redis.asyncio.Redis
+        self._mongo = None
+    
+    def _comprobar_dueno(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        dueno = (os.getpid(), loop)
+        if self._dueno != dueno:
+            self._dueno = dueno
+            self._redis = {}
+            self._mongo = None
+    
+    def redis(self, decode_responses=False):
+        self._comprobar_dueno()
+        if decode_responses not in self._redis:
+            c = self.config
+            pool = aioredis.BlockingConnectionPool(
+                host=c.redis_host,
+                port=c.redis_port,
+                db=c.redis_db,
+                decode_responses=decode_responses,
+                max_connections=c.redis_max_conexiones,
+                timeout=c.redis_espera_pool,
+                socket_timeout=c.redis_socket_timeout,
+                socket_connect_timeout=c.redis_connect_timeout,
+                health_check_interval=c.redis_health_check
+            )
+            self._redis[decode_responses] = aioredis.Redis(connection_pool=pool)
+        return self._redis[decode_responses]
+    
+    def mongo(self):
+        self._comprobar_dueno()
+        if self._mongo is None:
+            c = self.config
+            self._mongo = AsyncMongoClient(
+                c.mongo_uri,
+                maxPoolSize=c.mongo_max_pool,
+                waitQueueTimeoutMS=c.mongo_espera_ms,
+                serverSelectionTimeoutMS=c.mongo_seleccion_ms
+            )
+        return self._mongo[self.config.mongo_db]
+
+
+conexiones_async = GestorConexionesAsync()
+
+
+def get_redis_async(decode_responses=False):
+    """Obtener conexión asíncrona a Redis (por defecto valores binarios, como redis_bin)."""
+    return conexiones_async.redis(decode_responses)
+
+
+def get_mongodb_async():
+    """Obtener conexión asíncrona a MongoDB."""
+    return conexiones_async.mongo()
+
+
+# Nada se conecta al importar (ver GestorConexionesAsync)
+redis_async = _ConexionPerezosa(get_redis_async)
+redis_async_texto = _ConexionPerezosa(lambda: get_redis_async(decode_responses=True))  # Como redis_client
+mongo_db_async = _ConexionPerezosa(get_mongodb_async)
+
+# Estadísticas compartidas con la app síncrona. Solo las vuelca el hilo
+# temporizador: nunca se hace un flush bloqueante dentro del event loop.
+cache_stats = CacheStats(redis_client, flush_cada=float("inf"))
+
+
+# =============================================================================
+# CACHE-ASIDE ASÍNCRONO
+# =============================================================================
+
+STAMPEDE_LOCK_TTL = 10
+STAMPEDE_ESPERA = 2.0
+
+_vuelos = {}  # clave -> asyncio.Future del cálculo en curso
+_generaciones = {}  # ns -> (generación, expira), como Generaciones.cache_local
+
+
+async def _generacion(ns, fresca=False):
+    """Como `generaciones.actual`: reutiliza la copia local los segundos de `cache_local`."""
+    local = _generaciones.get(ns)
+    if local and local[1] > time.monotonic() and not fresca:
+        return local[0]
+    
+    with etapa("redis"):
+        gen = int(await redis_async.get(f"cache:gen:{ns}") or 0)
+    if generaciones.cache_local.get(ns):
+        _generaciones[ns] = (gen, time.monotonic() + generaciones.cache_local[ns])
+    return gen
+
+
+async def _ttls(base, tipo, miembros, escrito_por=None):
+    """`politica_ttl.ttls` con las frecuencias leídas por redis.asyncio (mismo pipeline)."""
+    if not politica_ttl.habilitada or not miembros:
+        return [base] * len(miembros)
+    
+    pipe = redis_async.pipeline(transaction=False)
+    pipe.get(f"{accesos.PREFIJO}:t0")
+    for t, miembro in politica_ttl._pares(tipo, miembros, escrito_por):
+        pipe.zscore(accesos._clave(t), miembro)
+    t0, *scores = await pipe.execute()
+    return politica_ttl._aplicar(base, tipo, accesos._escalar(t0, scores))
+
+
+async def _ttl(base, tipo, miembro, escrito_por=None):
+    return (await _ttls(base, tipo, [miembro], escrito_por))[0]
+
+
+async def _calcular_con_lock(clave, ttl, calcular, encode_kwargs):
+    """Entre procesos, solo quien tiene el lock de Redis consulta MongoDB."""
+    lock = redis_async.lock(f"lock:{clave}", timeout=STAMPEDE_LOCK_TTL, blocking=False)
+    with etapa("redis"):
+        adquirido = await lock.acquire()
+    
+    if not adquirido:
+        limite = time.monotonic() + STAMPEDE_ESPERA
+        while time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+            cached = await redis_async.get(clave)
+            if cached:
+                return codec.decode(cached)
+            if not await redis_async.exists(lock.name):
+                break
+        return await _calcular_y_guardar(clave, ttl, calcular, encode_kwargs)
+    
+    try:
+        cached = await redis_async.get(clave)
+        if cached:
+            return codec.decode(cached)
+        return await _calcular_y_guardar(clave, ttl, calcular, encode_kwargs)
+    finally:
+        try:
+            await lock.release()
+        except LockError:
+            pass
+
+
+async def _calcular_y_guardar(clave, ttl, calcular, encode_kwargs):
+    valor = await calcular()
+    if valor is not None:
+        with etapa("codec"):
+            datos = codec.encode(valor, **encode_kwargs)
+        with etapa("redis"):
+            if callable(ttl):  # Política de TTL: devuelve la corrutina de _ttl
+                ttl = await ttl()
+            await redis_async.setex(clave, ttl, datos)
+    return valor
+
+
+async def obtener_o_calcular(clave, ttl, calcular, etiqueta=None, **encode_kwargs):
+    """
+    Cache-aside asíncrono con protección contra estampidas.
+    
+    `calcular` es una corrutina. Las peticiones concurrentes del mismo
+    proceso comparten un único cálculo (Future); entre procesos se usa
+    un lock corto en Redis.
+    """
+    with etapa("redis"):
+        cached = await redis_async.get(clave)
+    if cached:
+        cache_stats.registrar_hit(etiqueta=etiqueta)
+        with etapa("codec"):
+            return codec.decode(cached)
+    
+    cache_stats.registrar_miss(etiqueta=etiqueta)
+    
+    vuelo = _vuelos.get(clave)
+    if vuelo is not None:
+        return await asyncio.shield(vuelo)
+    
+    vuelo = _vuelos[clave] = asyncio.get_running_loop().create_future()
+    try:
+        valor = await _calcular_con_lock(clave, ttl, calcular, encode_kwargs)
+        vuelo.set_result(valor)
+        return valor
+    except Exception as e:
+        vuelo.set_exception(e)
+        vuelo.exception()  # Marcada como recuperada si nadie más esperaba
+        raise
+    finally:
+        del _vuelos[clave]
+
+
+async def invalidar_cache(*claves, namespaces=()):
+    """DEL + aviso a las L1 de los workers síncronos + INCR de namespaces, en un pipeline."""
+    pipe = redis_async.pipeline(transaction=False)
+    if claves:
+        pipe.delete(*claves)
+        pipe.publish(CacheL1.CANAL, json.dumps(list(claves)))
+    for ns in namespaces:
+        pipe.incr(f"cache:gen:{ns}")
+        _generaciones.pop(ns, None)
+    with etapa("redis"):
+        await pipe.execute()
+
+
+def cached_async(ttl=3600, prefix="cache", etapa_origen="mongo"):
+    """
+    Decorador para cachear corrutinas (versión asíncrona de `cached`).
+    
+    Uso:
+        @cached_async(ttl=300, prefix="productos")
+        async def obtener_producto(id):
+            return await db.productos.find_one({"_id": id})
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key_args = "_".join(str(a) for a in args)
+            key_kwargs = "_".join(f"{k}={v}" for k, v in sorted(kwargs.items()))
+            cache_key = f"{prefix}:{func.__name__}:{key_args}:{key_kwargs}".rstrip(":")
+            
+            async def calcular():
+                with etapa(etapa_origen):
+                    return await func(*args, **kwargs)
+            
+            accesos.registrar("cached", cache_key)
+            ttl_clave = lambda: _ttl(ttl, "cached", cache_key)
+            
+            return await obtener_o_calcular(
+                cache_key, ttl_clave, calcular,
+                etiqueta=f"{prefix}:{func.__name__}", default=str
+            )
+        
+        return wrapper
+    return decorator
+
+
+# =============================================================================
+# ÍNDICE DE BÚSQUEDA (ASÍNCRONO)
+# =============================================================================
+
+class IndiceBusquedaAsync:
+    """
+    Las operaciones de `IndiceBusqueda` que usa el repositorio, con
+    redis.asyncio. Las claves, la tokenización y los comandos de cada
+    escritura salen del índice síncrono (`indice`), así que las dos apps
+    leen y mantienen el mismo índice. La reconstrucción completa sigue
+    siendo la síncrona (`asegurar_indice_busqueda`, en su propio hilo).
+    """
+    
+    def __init__(self, indice, redis_client=None):
+        self.indice = indice
+        self.r = redis_client or redis_async_texto
+        self._poblado_hasta = 0
+    
+    def afectado_por(self, cambios: dict) -> bool:
+        return self.indice.afectado_por(cambios)
+    
+    async def indexar(self, producto: dict):
+        """Indexa (o reindexa) un producto: lee sus términos y aplica las diferencias (MULTI)."""
+        i = self.indice
+        viejos = await self.r.smembers(i._k_doc(producto['_id']))
+        pipe = self.r.pipeline(transaction=True)
+        i._encolar_indexar(pipe, producto, viejos)
+        await pipe.execute()
+    
+    async def eliminar(self, producto_id: str):
+        """Quita un producto del índice."""
+        i = self.indice
+        producto_id = str(producto_id)
+        viejos = await self.r.smembers(i._k_doc(producto_id))
+        pipe = self.r.pipeline(transaction=True)
+        i._encolar_eliminar(pipe, producto_id, viejos)
+        await pipe.execute()
+    
+    async def vacio(self) -> bool:
+        """Como `IndiceBusqueda.vacio`: una vez poblado, se vuelve a mirar cada 30 s."""
+        ahora = time.monotonic()
+        if self._poblado_hasta > ahora:
+            return False
+        if await self.r.exists(f"{self.indice.PREFIJO}:nombres"):
+            self._poblado_hasta = ahora + 30
+            return False
+        return True
+    
+    async def buscar(self, query: str, k: int = 20) -> list:
+        """IDs de los k mejores productos que encajan con la búsqueda."""
+        claves = self.indice._claves_busqueda(query, k)
+        if not claves:
+            return []
+        if isinstance(claves, str):
+            return await self.r.zrevrange(claves, 0, k - 1)
+        
+        destino = f"{self.indice.PREFIJO}:tmp:{uuid.uuid4().hex}"
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zinterstore(destino, claves, aggregate="MAX")
+        pipe.zrevrange(destino, 0, k - 1)
+        pipe.delete(destino)
+        _, ids, _ = await pipe.execute()
+        return ids
+    
+    async def autocompletar(self, prefijo: str, k: int = 10) -> dict:
+        """Términos que empiezan por el prefijo y los k productos mejor puntuados."""
+        terminos = tokenizar(prefijo)
+        if not terminos or k <= 0:
+            return {"terminos": [], "productos": []}
+        
+        base = " ".join(terminos[:-1])
+        ultimo = terminos[-1]
+        
+        sugerencias, ids = await asyncio.gather(
+            self.r.zrangebylex(
+                f"{self.indice.PREFIJO}:terminos", f"[{ultimo}", f"[{ultimo}\xff", start=0, num=k
+            ),
+            self.buscar(prefijo, k)
+        )
+        nombres = await self.r.hmget(f"{self.indice.PREFIJO}:nombres", ids) if ids else []
+        
+        return {
+            "terminos": [f"{base} {t}".strip() for t in sugerencias],
+            "productos": [{"_id": i, "nombre": n} for i, n in zip(ids, nombres)]
+        }
+
+
+# =============================================================================
+# REPOSITORIO DE PRODUCTOS (ASÍNCRONO)
+# =============================================================================
+
+class AsyncProductoRepository:
+    """
+    Repositorio de productos con caché, sobre redis.asyncio y MongoDB asíncrono.
+    
+    El índice de búsqueda es el mismo que el de la app síncrona, a través
+    de `IndiceBusquedaAsync` (un `IndiceBusqueda` se envuelve solo).
+    `write_through` funciona como en `ProductoRepository`.
+    """
+    
+    def __init__(self, lote_mongo=100, indice=None, write_through=None):
+        self.r = redis_async
+        self.db = mongo_db_async
+        self.cache_ttl = 3600  # 1 hora
+        self.lote_mongo = lote_mongo  # IDs por consulta $in en paralelo
+        if write_through is None:
+            write_through = os.environ.get("CACHE_WRITE_THROUGH", "1") == "1"
+        self.write_through = write_through
+        self._lua_write_through = None
+        if indice is None and os.environ.get("SEARCH_INDEX", "1") == "1":
+            indice = indice_busqueda
+        if indice is not None and not isinstance(indice, IndiceBusquedaAsync):
+            indice = IndiceBusquedaAsync(indice)
+        self.indice = indice
+    
+    @property
+    def collection(self):
+        # Se resuelve en cada uso: cliente del loop y del proceso actuales
+        return self.db['productos']
+    
+    def _cache_key(self, producto_id, gen):
+        return Generaciones.formato("producto", gen, producto_id)
+    
+    async def _lista_key(self, resto):
+        return Generaciones.formato("productos", await _generacion("productos"), resto)
+    
+    async def obtener(self, producto_id: str):
+        """Obtiene un producto (primero caché, luego DB)."""
+        cache_key = self._cache_key(producto_id, await _generacion("producto"))
+        accesos.registrar("producto", producto_id)
+        
+        async def buscar_en_db():
+            with etapa("mongo"):
+                producto = await self.collection.find_one({"_id": producto_id})
+            if producto and '_id' in producto:
+                producto['_id'] = str(producto['_id'])
+            return producto
+        
+        return await obtener_o_calcular(
+            cache_key, lambda: _ttl(self.cache_ttl, "producto", producto_id),
+            buscar_en_db, etiqueta="producto:obtener"
+        )
+    
+    async def obtener_muchos(self, ids: list):
+        """
+        Obtiene varios productos en bloque.
+        
+        Un MGET para todas las claves; los misses se reparten en lotes de
+        `lote_mongo` IDs que se consultan a MongoDB en paralelo
+        (asyncio.gather), y se guardan con un único pipeline de SETEX.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        
+        gen = await _generacion("producto")
+        accesos.registrar("producto", *ids)
+        with etapa("redis"):
+            cacheados = await self.r.mget([self._cache_key(pid, gen) for pid in ids])
+        
+        encontrados = {}
+        misses = []
+        with etapa("codec"):
+            for producto_id, cached in zip(ids, cacheados):
+                if cached:
+                    encontrados[producto_id] = codec.decode(cached)
+                else:
+                    misses.append(producto_id)
+        
+        if encontrados:
+            cache_stats.registrar_hit(len(encontrados), etiqueta="producto:obtener_muchos")
+        
+        if misses:
+            cache_stats.registrar_miss(len(misses), etiqueta="producto:obtener_muchos")
+            
+            lotes = [misses[i:i + self.lote_mongo] for i in range(0, len(misses), self.lote_mongo)]
+            with etapa("mongo", llamadas=len(lotes)):
+                resultados = await asyncio.gather(*[
+                    self.collection.find({"_id": {"$in": lote}}).to_list(length=None)
+                    for lote in lotes
+                ])
+            
+            productos = [producto for lote in resultados for producto in lote]
+            for producto in productos:
+                producto['_id'] = str(producto['_id'])
+            with etapa("redis"):
+                ttls = await _ttls(self.cache_ttl, "producto", [p['_id'] for p in productos])
+            
+            pipe = self.r.pipeline(transaction=False)
+            with etapa("codec"):
+                for producto, ttl in zip(productos, ttls):
+                    encontrados[producto['_id']] = producto
+                    pipe.setex(self._cache_key(producto['_id'], gen), ttl, codec.encode(producto))
+            with etapa("redis"):
+                await pipe.execute()
+        
+        return [encontrados[pid] for pid in ids if pid in encontrados]
+    
+    async def obtener_todos(self, limit=100):
+        """Obtiene todos los productos."""
+        cache_key = await self._lista_key(f"all:{limit}")
+        accesos.registrar("listado", f"all|{limit}")
+        
+        async def buscar_en_db():
+            with etapa("mongo"):
+                productos = await self.collection.find().limit(limit).to_list(length=None)
+            for p in productos:
+                p['_id'] = str(p['_id'])
+            return productos
+        
+        return await obtener_o_calcular(
+            cache_key, lambda: _ttl(300, "listado", f"all|{limit}", escrito_por="productos"),
+            buscar_en_db, etiqueta="productos:obtener_todos"
+        )
+    
+    async def obtener_pagina(self, cursor: str = None, limit: int = 100):
+        """Una página del listado a partir de `cursor` (ver ProductoRepository.obtener_pagina)."""
+        filtro = filtro_cursor(cursor)
+        cache_key = await self._lista_key(f"pagina:{cursor or ''}:{limit}")
+        accesos.registrar("listado", f"{cursor or ''}|{limit}")
+        
+        async def buscar_en_db():
+            with etapa("mongo"):
+                productos = await self.collection.find(filtro).sort("_id", 1).limit(limit + 1).to_list(length=None)
+            siguiente = codificar_cursor(productos[limit - 1]['_id']) if len(productos) > limit else None
+            productos = productos[:limit]
+            for p in productos:
+                p['_id'] = str(p['_id'])
+            return {"data": productos, "next_cursor": siguiente}
+        
+        return await obtener_o_calcular(
+            cache_key,
+            lambda: _ttl(300, "listado", f"{cursor or ''}|{limit}", escrito_por="productos"),
+            buscar_en_db, etiqueta="productos:obtener_pagina"
+        )
+    
+    def iterar(self, cursor: str = None, lote: int = 500):
+        """Recorre los productos desde `cursor` con un cursor de MongoDB (sin caché)."""
+        documentos = self.collection.find(filtro_cursor(cursor)).sort("_id", 1).batch_size(lote)
+        
+        async def recorrer():
+            async for producto in documentos:
+                producto['_id'] = str(producto['_id'])
+                yield producto
+        
+        return recorrer()
+    
+    async def buscar(self, query: str, k: int = K_BUSQUEDA):
+        """Busca productos por nombre (en el índice si está activo)."""
+        accesos.registrar("busqueda", query)
+        if self.indice:
+            with etapa("redis"):
+                vacio = await self.indice.vacio()
+                ids = None if vacio else await self.indice.buscar(query, k)
+            if not vacio:
+                return await self.obtener_muchos(ids)
+            asegurar_indice_busqueda()  # Mientras tanto, $regex
+        
+        cache_key = await self._lista_key(f"buscar:{query}:{k}")
+        
+        async def buscar_en_db():
+            with etapa("mongo"):
+                productos = await self.collection.find({
+                    "nombre": {"$regex": query, "$options": "i"}
+                }).limit(k).to_list(length=None)
+            for p in productos:
+                p['_id'] = str(p['_id'])
+            return productos
+        
+        return await obtener_o_calcular(
+            cache_key, lambda: _ttl(60, "busqueda", query, escrito_por="productos"),
+            buscar_en_db, etiqueta="productos:buscar"
+        )
+    
+    async def autocompletar(self, prefijo: str, k: int = 10):
+        """Sugerencias para lo que se está escribiendo (solo con índice)."""
+        if not self.indice:
+            return {"terminos": [], "productos": []}
+        with etapa("redis"):
+            return await self.indice.autocompletar(prefijo, k)
+    
+    async def _escribir_en_cache(self, producto: dict):
+        """Write-through: SET del producto + INCR de listados + aviso L1 (un EVALSHA)."""
+        if self._lua_write_through is None:
+            self._lua_write_through = self.r.register_script(LUA_WRITE_THROUGH)
+        
+        with etapa("codec"):
+            datos = codec.encode(producto)
+        claves_ttl, args_ttl = politica_ttl.para_lua("producto")
+        with etapa("redis"):
+            _, ttl = await self._lua_write_through(
+                keys=["cache:gen:producto", "cache:gen:productos"] + claves_ttl,
+                args=[producto['_id'], datos, self.cache_ttl, CacheL1.CANAL] + args_ttl,
+                client=conexiones_async.redis()
+            )
+        politica_ttl.observar("producto", ttl)
+        _generaciones.pop("productos", None)
+    
+    async def crear(self, producto: dict):
+        """Crea un nuevo producto."""
+        producto['created_at'] = datetime.now().isoformat()
+        with etapa("mongo"):
+            result = await self.collection.insert_one(producto)
+        producto['_id'] = str(result.inserted_id)
+        accesos.registrar("escritura", "productos")
+        
+        if self.write_through:
+            await self._escribir_en_cache(producto)
+        else:
+            await invalidar_cache(namespaces=["productos"])
+        if self.indice:
+            with etapa("redis"):
+                await self.indice.indexar(producto)
+        
+        return producto
+    
+    async def actualizar(self, producto_id: str, datos: dict):
+        """Actualiza un producto e invalida (o reescribe) su caché."""
+        datos['updated_at'] = datetime.now().isoformat()
+        accesos.registrar("escritura", producto_id, "productos")
+        
+        if self.write_through:
+            with etapa("mongo"):
+                producto = await self.collection.find_one_and_update(
+                    {"_id": producto_id},
+                    {"$set": datos},
+                    return_document=ReturnDocument.AFTER
+                )
+            if producto:
+                producto['_id'] = str(producto['_id'])
+                await self._escribir_en_cache(producto)
+        else:
+            with etapa("mongo"):
+                await self.collection.update_one({"_id": producto_id}, {"$set": datos})
+            gen = await _generacion("producto", fresca=True)
+            await invalidar_cache(self._cache_key(producto_id, gen), namespaces=["productos"])
+            producto = await self.obtener(producto_id)
+        
+        if producto and self.indice and self.indice.afectado_por(datos):
+            with etapa("redis"):
+                await self.indice.indexar(producto)
+        
+        return producto
+    
+    async def eliminar(self, producto_id: str):
+        """Elimina un producto e invalida caché."""
+        with etapa("mongo"):
+            result, gen = await asyncio.gather(
+                self.collection.delete_one({"_id": producto_id}),
+                _generacion("producto", fresca=True)
+            )
+        await invalidar_cache(self._cache_key(producto_id, gen), namespaces=["productos"])
+        accesos.registrar("escritura", producto_id, "productos")
+        if self.indice:
+            with etapa("redis"):
+                await self.indice.eliminar(producto_id)
+        
+        return result.deleted_count > 0
+
+
+# Instancia global
+producto_repo_async = AsyncProductoRepository()
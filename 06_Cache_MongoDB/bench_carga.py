@@ -0,0 +1,357 @@
+"""
+🏋️ Prueba de carga reproducible de la API con caché
+
+Levanta un Redis y un MongoDB locales de usar y tirar (o usa los que se
+indiquen), siembra un catálogo del tamaño pedido, arranca `app.py` y lanza
+una mezcla de lecturas, búsquedas, listados y escrituras con popularidad
+Zipf y concurrencia fija. El resultado (throughput, p50/p95/p99 por
+operación y el hit ratio de /api/stats) se escribe en JSON para poder
+comparar ejecuciones entre cambios de `models.py`.
+
+Uso:
+    python bench_carga.py
+    python bench_carga.py --productos 50000 --concurrencia 64 --duracion 30 \\
+        --mezcla lectura=80,busqueda=10,listado=5,escritura=5 --zipf 1.1 --salida base.json
+
+    # Con instancias ya levantadas (no se borra nada fuera de --mongo-db)
+    python bench_carga.py --redis localhost:6379 --mongo mongodb://localhost:27017/
+
+Las variables CACHE_* / REDIS_* / MONGO_* del entorno se pasan a la app,
+p. ej. `CACHE_L1_ENABLED=1 python bench_carga.py --salida l1.json`.
+"""
+
+import argparse
+import bisect
+import contextlib
+import http.client
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+import redis
+from pymongo import MongoClient
+
+from bench_codec import MARCAS, PALABRAS, generar_producto
+from search_index import IndiceBusqueda, tokenizar
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+MEZCLA_POR_DEFECTO = "lectura=80,busqueda=10,listado=5,escritura=5"
+
+
+# =============================================================================
+# PROCESOS LOCALES
+# =============================================================================
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar(comprobar, nombre: str, timeout: float = 30):
+    """Reintenta `comprobar()` hasta que no lance excepción."""
+    limite = time.monotonic() + timeout
+    while True:
+        try:
+            return comprobar()
+        except Exception:
+            if time.monotonic() > limite:
+                raise RuntimeError(f"{nombre} no arrancó en {timeout}s")
+            time.sleep(0.2)
+
+
+def lanzar(pila: contextlib.ExitStack, comando: list, **kwargs) -> subprocess.Popen:
+    """Arranca un proceso que se parará al salir de la pila."""
+    if shutil.which(comando[0]) is None and not os.path.isabs(comando[0]):
+        raise RuntimeError(f"No se encuentra '{comando[0]}': instálalo o usa --redis/--mongo")
+    proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+
+    def parar():
+        proceso.terminate()
+        try:
+            proceso.wait(10)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+    pila.callback(parar)
+    return proceso
+
+
+def lanzar_redis(pila, directorio) -> tuple:
+    puerto = puerto_libre()
+    lanzar(pila, ["redis-server", "--port", str(puerto), "--bind", "127.0.0.1",
+                  "--save", "", "--appendonly", "no", "--dir", directorio])
+    return "127.0.0.1", puerto
+
+
+def lanzar_mongo(pila, directorio) -> str:
+    puerto = puerto_libre()
+    os.makedirs(os.path.join(directorio, "mongo"), exist_ok=True)
+    lanzar(pila, ["mongod", "--port", str(puerto), "--bind_ip", "127.0.0.1", "--quiet",
+                  "--dbpath", os.path.join(directorio, "mongo")])
+    return f"mongodb://127.0.0.1:{puerto}/"
+
+
+def lanzar_app(pila, entorno: dict, servidor: str, workers: int, hilos: int) -> str:
+    puerto = puerto_libre()
+    if servidor == "gunicorn":
+        comando = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{puerto}",
+                   "-w", str(workers), "-k", "gthread", "--threads", str(hilos)]
+    else:
+        comando = [sys.executable, "-m", "flask", "--app", "app", "run",
+                   "--port", str(puerto), "--no-reload", "--with-threads"]
+    lanzar(pila, comando, cwd=DIRECTORIO, env=entorno)
+    return f"http://127.0.0.1:{puerto}"
+
+
+# =============================================================================
+# CATÁLOGO
+# =============================================================================
+
+def sembrar(mongo_uri: str, mongo_db: str, r: redis.Redis, productos: int, lote: int = 1000) -> list:
+    """Rellena la colección desde cero y reconstruye el índice de búsqueda."""
+    coleccion = MongoClient(mongo_uri)[mongo_db]["productos"]
+    coleccion.drop()
+    for inicio in range(0, productos, lote):
+        coleccion.insert_many(
+            [generar_producto(i) for i in range(inicio, min(inicio + lote, productos))],
+            ordered=False
+        )
+    IndiceBusqueda(r).reconstruir(coleccion)
+    return [f"P{i:06d}" for i in range(productos)]
+
+
+def terminos_de_busqueda() -> list:
+    """Palabras de los nombres del catálogo, completas y como prefijo."""
+    palabras = [t for texto in MARCAS + PALABRAS for t in tokenizar(texto)]
+    return palabras + [p[:3] for p in palabras if len(p) > 3]
+
+
+# =============================================================================
+# CARGA
+# =============================================================================
+
+class Zipf:
+    """Muestreo de índices 0..n-1 con probabilidad proporcional a 1/(rango+1)^s."""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        self.acumulado = []
+        total = 0.0
+        for rango in range(1, n + 1):
+            total += 1 / rango ** s
+            self.acumulado.append(total)
+
+    def muestra(self) -> int:
+        return bisect.bisect_left(self.acumulado, self.rng.random() * self.acumulado[-1])
+
+
+def parsear_mezcla(texto: str) -> dict:
+    mezcla = {}
+    for parte in texto.split(","):
+        op, _, peso = parte.partition("=")
+        if op.strip() not in ("lectura", "busqueda", "listado", "escritura"):
+            raise ValueError(f"Operación desconocida en --mezcla: {op}")
+        mezcla[op.strip()] = float(peso)
+    return mezcla
+
+
+def ejecutar(url_base: str, ids: list, terminos: list, mezcla: dict, zipf_s: float,
+             concurrencia: int, duracion: float, semilla: int) -> dict:
+    """Mantiene `concurrencia` clientes keep-alive durante `duracion` segundos."""
+    destino = urlparse(url_base)
+    operaciones, pesos = zip(*mezcla.items())
+    latencias = {op: [] for op in operaciones}
+    errores = {op: 0 for op in operaciones}
+    lock = threading.Lock()
+    fin = time.monotonic() + duracion
+
+    def cliente(numero):
+        rng = random.Random(semilla + numero)
+        zipf_ids = Zipf(len(ids), zipf_s, rng)
+        zipf_terminos = Zipf(len(terminos), zipf_s, rng)
+        conexion = http.client.HTTPConnection(destino.hostname, destino.port, timeout=10)
+        propias = {op: [] for op in operaciones}
+        fallos = {op: 0 for op in operaciones}
+
+        while time.monotonic() < fin:
+            op = rng.choices(operaciones, pesos)[0]
+            cuerpo = None
+            if op == "lectura":
+                metodo, ruta = "GET", f"/api/productos/{ids[zipf_ids.muestra()]}"
+            elif op == "busqueda":
+                metodo, ruta = "GET", f"/api/productos/buscar?q={terminos[zipf_terminos.muestra()]}"
+            elif op == "listado":
+                metodo, ruta = "GET", "/api/productos?limit=50"
+            else:
+                metodo, ruta = "PUT", f"/api/productos/{ids[zipf_ids.muestra()]}"
+                cuerpo = json.dumps({"precio": round(rng.uniform(5, 3000), 2)})
+
+            inicio = time.perf_counter()
+            try:
+                conexion.request(metodo, ruta, body=cuerpo,
+                                 headers={"Content-Type": "application/json"} if cuerpo else {})
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                if respuesta.status >= 500:
+                    fallos[op] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                fallos[op] += 1
+                conexion.close()
+                conexion = http.client.HTTPConnection(destino.hostname, destino.port, timeout=10)
+                continue
+            propias[op].append(time.perf_counter() - inicio)
+
+        conexion.close()
+        with lock:
+            for op in operaciones:
+                latencias[op].extend(propias[op])
+                errores[op] += fallos[op]
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    por_operacion = {op: resumir(latencias[op], errores[op], duracion) for op in operaciones}
+    todas = [t for op in operaciones for t in latencias[op]]
+    return {"total": resumir(todas, sum(errores.values()), duracion), "por_operacion": por_operacion}
+
+
+def resumir(latencias: list, errores: int, duracion: float) -> dict:
+    latencias = sorted(latencias)
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else 0
+    return {
+        "peticiones": len(latencias),
+        "errores": errores,
+        "rps": round(len(latencias) / duracion, 1),
+        "p50_ms": round(percentil(0.50), 2),
+        "p95_ms": round(percentil(0.95), 2),
+        "p99_ms": round(percentil(0.99), 2),
+    }
+
+
+def llamar_api(url_base: str, metodo: str, ruta: str) -> dict:
+    destino = urlparse(url_base)
+    conexion = http.client.HTTPConnection(destino.hostname, destino.port, timeout=30)
+    try:
+        conexion.request(metodo, ruta)
+        respuesta = conexion.getresponse()
+        datos = json.loads(respuesta.read() or b"{}")
+        if respuesta.status >= 400:
+            raise RuntimeError(f"{metodo} {ruta}: {respuesta.status} {datos}")
+        return datos
+    finally:
+        conexion.close()
+
+
+def commit_actual():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API con caché")
+    parser.add_argument("--productos", type=int, default=10000, help="Tamaño del catálogo")
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--duracion", type=float, default=20, help="Segundos medidos")
+    parser.add_argument("--calentamiento", type=float, default=5, help="Segundos previos sin medir")
+    parser.add_argument("--mezcla", default=MEZCLA_POR_DEFECTO, help="Pesos por operación")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Exponente de popularidad (0 = uniforme)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--redis", help="host:puerto de un Redis existente (si no, se lanza uno)")
+    parser.add_argument("--mongo", help="URI de un MongoDB existente (si no, se lanza uno)")
+    parser.add_argument("--mongo-db", default="bench_tienda")
+    parser.add_argument("--servidor", choices=["gunicorn", "flask"],
+                        default="gunicorn" if importlib.util.find_spec("gunicorn") else "flask")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--hilos", type=int, default=16, help="Hilos por worker de gunicorn")
+    parser.add_argument("--salida", help="Fichero JSON de resultados (por defecto, stdout)")
+    args = parser.parse_args()
+
+    mezcla = parsear_mezcla(args.mezcla)
+    random.seed(args.semilla)
+    log = lambda texto: print(texto, file=sys.stderr)
+
+    with contextlib.ExitStack() as pila:
+        temporal = pila.enter_context(tempfile.TemporaryDirectory(prefix="bench_carga_"))
+
+        if args.redis:
+            redis_host, redis_port = args.redis.split(":")
+        else:
+            redis_host, redis_port = lanzar_redis(pila, temporal)
+        mongo_uri = args.mongo or lanzar_mongo(pila, temporal)
+
+        r = redis.Redis(host=redis_host, port=int(redis_port), decode_responses=True)
+        esperar(r.ping, "Redis")
+        esperar(lambda: MongoClient(mongo_uri, serverSelectionTimeoutMS=500).admin.command("ping"), "MongoDB")
+
+        log(f"🌱 Sembrando {args.productos} productos...")
+        ids = sembrar(mongo_uri, args.mongo_db, r, args.productos)
+
+        entorno = dict(os.environ, REDIS_HOST=redis_host, REDIS_PORT=str(redis_port),
+                       MONGO_URI=mongo_uri, MONGO_DB=args.mongo_db)
+        url = lanzar_app(pila, entorno, args.servidor, args.workers, args.hilos)
+        esperar(lambda: llamar_api(url, "GET", "/health"), "app.py")
+        llamar_api(url, "POST", "/api/cache/clear")
+
+        terminos = terminos_de_busqueda()
+        if args.calentamiento:
+            log(f"🔥 Calentamiento {args.calentamiento}s...")
+            ejecutar(url, ids, terminos, mezcla, args.zipf, args.concurrencia,
+                     args.calentamiento, args.semilla + 10000)
+        llamar_api(url, "POST", "/api/stats/reset")
+
+        log(f"📊 {args.concurrencia} clientes durante {args.duracion}s ({args.mezcla})")
+        resultados = ejecutar(url, ids, terminos, mezcla, args.zipf, args.concurrencia,
+                              args.duracion, args.semilla)
+        stats = llamar_api(url, "GET", "/api/stats").get("data", {})
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_actual(),
+        "config": {**vars(args), "mezcla": mezcla},
+        "entorno_cache": {k: v for k, v in os.environ.items() if k.startswith("CACHE_")},
+        **resultados,
+        "cache": {
+            "hit_ratio": stats.get("hit_ratio"),
+            "hits": stats.get("hits"),
+            "misses": stats.get("misses"),
+            "por_funcion": stats.get("por_funcion"),
+            "ttl": stats.get("ttl"),
+            "consultas_mongo": stats.get("etapas", {}).get("mongo", {}).get("llamadas"),
+        },
+    }
+
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            f.write(texto + "\n")
+        log(f"✅ Resultados en {args.salida}")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+⏱️ Micro-benchmark de serialización del caché
+
+Compara bytes almacenados y tiempo de encode/decode de cada formato del
+Codec (JSON, msgpack, con y sin compresión) sobre documentos de
+producto realistas. No necesita Redis ni MongoDB.
+
+Uso:
+    python bench_codec.py
+    python bench_codec.py --productos 200 --repeticiones 500 --json
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from models import Codec, msgpack
+
+
+CATEGORIAS = ["portatiles", "monitores", "perifericos", "audio", "telefonia", "hogar"]
+MARCAS = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark"]
+PALABRAS = ["pro", "ultra", "gaming", "inalámbrico", "4K", "compacto", "RGB", "silencioso", "premium"]
+
+
+def generar_producto(i: int) -> dict:
+    """Documento parecido a los de la colección `productos`."""
+    creado = datetime(2024, 1, 1) + timedelta(minutes=random.randint(0, 500000))
+    return {
+        "_id": f"P{i:06d}",
+        "nombre": f"{random.choice(MARCAS)} {' '.join(random.sample(PALABRAS, 3))} {i}",
+        "descripcion": " ".join(random.choices(PALABRAS, k=40)),
+        "precio": round(random.uniform(5, 3000), 2),
+        "stock": random.randint(0, 1000),
+        "categoria": random.choice(CATEGORIAS),
+        "etiquetas": random.sample(PALABRAS, 4),
+        "specs": {"peso_kg": round(random.uniform(0.1, 5), 2), "color": random.choice(["negro", "plata", "blanco"])},
+        "valoraciones": [random.randint(1, 5) for _ in range(20)],
+        "created_at": creado.isoformat(),
+    }
+
+
+class CodecLegacy:
+    """Lo que se guardaba antes: json.dumps sin cabecera."""
+
+    def encode(self, valor):
+        return json.dumps(valor).encode()
+
+    def decode(self, datos):
+        return json.loads(datos)
+
+
+def medir(codec, valor, repeticiones: int) -> dict:
+    datos = codec.encode(valor)
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        codec.encode(valor)
+    t_encode = (time.perf_counter() - inicio) / repeticiones
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        codec.decode(datos)
+    t_decode = (time.perf_counter() - inicio) / repeticiones
+
+    assert codec.decode(datos) == valor
+    return {"bytes": len(datos), "encode_us": round(t_encode * 1e6, 2), "decode_us": round(t_decode * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del codec del caché")
+    parser.add_argument("--productos", type=int, default=100, help="Tamaño del listado")
+    parser.add_argument("--repeticiones", type=int, default=300)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    random.seed(42)
+    cargas = {
+        "producto": generar_producto(1),
+        f"listado_{args.productos}": [generar_producto(i) for i in range(args.productos)],
+    }
+
+    codecs = {"json (legacy)": CodecLegacy()}
+    for formato in ["json", "msgpack"]:
+        if formato == "msgpack" and msgpack is None:
+            continue
+        codecs[formato] = Codec(formato, umbral_compresion=0)
+        codecs[f"{formato}+zlib"] = Codec(formato, umbral_compresion=1024)
+
+    resultados = {}
+    for carga, valor in cargas.items():
+        resultados[carga] = {}
+        for nombre, codec in codecs.items():
+            resultados[carga][nombre] = medir(codec, valor, args.repeticiones)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    if msgpack is None:
+        print("⚠️ msgpack no instalado: solo se comparan formatos JSON\n")
+    for carga, filas in resultados.items():
+        base = filas["json (legacy)"]["bytes"]
+        print(f"📦 {carga}")
+        print(f"   {'formato':<16}{'bytes':>10}{'ratio':>8}{'encode µs':>12}{'decode µs':>12}")
+        for nombre, r in filas.items():
+            print(f"   {nombre:<16}{r['bytes']:>10}{r['bytes'] / base:>8.2f}"
+                  f"{r['encode_us']:>12}{r['decode_us']:>12}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+📈 Comparación de peticiones/segundo: app síncrona vs. ASGI
+
+Lanza la misma carga (GET de productos aleatorios con concurrencia fija)
+contra una o varias URLs base y muestra peticiones/segundo y latencias.
+
+Uso:
+    # Terminal 1: gunicorn -w 4 app:app -b :5000
+    # Terminal 2: uvicorn async_app:app --workers 4 --port 5001
+    python bench_http.py http://localhost:5000 http://localhost:5001 \\
+        --concurrencia 64 --duracion 20 --ids P001,P002,P003
+"""
+
+import argparse
+import http.client
+import random
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def cargar(url_base: str, rutas: list, concurrencia: int, duracion: float) -> dict:
+    """Mantiene `concurrencia` clientes keep-alive pidiendo rutas durante `duracion` s."""
+    destino = urlparse(url_base)
+    latencias = []
+    errores = [0]
+    lock = threading.Lock()
+    fin = time.monotonic() + duracion
+    
+    def cliente():
+        conexion = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=10)
+        propias = []
+        fallos = 0
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            try:
+                conexion.request("GET", random.choice(rutas))
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                if respuesta.status >= 500:
+                    fallos += 1
+            except (OSError, http.client.HTTPException):
+                fallos += 1
+                conexion.close()
+                conexion = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=10)
+                continue
+            propias.append(time.perf_counter() - inicio)
+        conexion.close()
+        with lock:
+            latencias.extend(propias)
+            errores[0] += fallos
+    
+    hilos = [threading.Thread(target=cliente) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else 0
+    return {
+        "url": url_base,
+        "peticiones": len(latencias),
+        "errores": errores[0],
+        "rps": round(len(latencias) / duracion, 1),
+        "media_ms": round(statistics.mean(latencias) * 1000, 2) if latencias else 0,
+        "p50_ms": round(percentil(0.50), 2),
+        "p99_ms": round(percentil(0.99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peticiones/segundo contra una o varias instancias de la API")
+    parser.add_argument("urls", nargs="+", help="URLs base, p. ej. http://localhost:5000")
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--duracion", type=float, default=10)
+    parser.add_argument("--ids", default="P001,P002,P003,P004,P005", help="IDs de producto separados por comas")
+    args = parser.parse_args()
+    
+    rutas = [f"/api/productos/{pid}" for pid in args.ids.split(",")]
+    
+    print(f"📊 {args.concurrencia} clientes durante {args.duracion}s\n")
+    for url in args.urls:
+        r = cargar(url, rutas, args.concurrencia, args.duracion)
+        print(f"🌐 {r['url']}")
+        print(f"   {r['rps']} req/s  ({r['peticiones']} peticiones, {r['errores']} errores)")
+        print(f"   media {r['media_ms']}ms  p50 {r['p50_ms']}ms  p99 {r['p99_ms']}ms\n")
+
+
+if __name__ == "__main__":
+    main()
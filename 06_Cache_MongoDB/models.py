@@ -6,35 +6,335 @@ así como funciones auxiliares para el caché.
 """
 
 import redis
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, monitoring
+from bson import ObjectId
+from bson.errors import InvalidId
+import atexit
+import bisect
+import contextvars
 import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from datetime import datetime
 from functools import wraps
 
+from search_index import IndiceBusqueda
+
+try:
+    import msgpack
+except ImportError:  # Opcional: sin msgpack el caché usa JSON
+    msgpack = None
+
 
 # =============================================================================
 # CONEXIONES
 # =============================================================================
 
-def get_redis():
-    """Obtener conexión a Redis."""
-    return redis.Redis(
-        host='localhost',
-        port=6379,
-        db=0,
-        decode_responses=True
-    )
+class PoolRedisMedido(redis.BlockingConnectionPool):
+    """
+    Pool de Redis con tamaño máximo que mide su uso.
+    
+    Si no quedan conexiones libres, la petición espera (hasta `timeout`)
+    en lugar de abrir conexiones sin límite. Se registra cuántas hay en
+    uso y cuánto se ha esperado para conseguir una.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metricas_lock = threading.Lock()
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+    
+    def get_connection(self, *args, **kwargs):
+        inicio = time.monotonic()
+        conexion = super().get_connection(*args, **kwargs)
+        espera = time.monotonic() - inicio
+        with self._metricas_lock:
+            self.en_uso += 1
+            self.max_en_uso = max(self.max_en_uso, self.en_uso)
+            self.esperas += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+        return conexion
+    
+    def release(self, connection):
+        with self._metricas_lock:
+            self.en_uso = max(0, self.en_uso - 1)
+        super().release(connection)
+    
+    def estadisticas(self):
+        return {
+            "max_connections": self.max_connections,
+            "in_use": self.en_uso,
+            "peak_in_use": self.max_en_uso,
+            "utilization": round(self.en_uso / self.max_connections * 100, 2),
+            "checkouts": self.esperas,
+            "wait_avg_ms": round(self.espera_total / self.esperas * 1000, 3) if self.esperas else 0,
+            "wait_max_ms": round(self.espera_max * 1000, 3)
+        }
+
+
+class MonitorPoolMongo(monitoring.ConnectionPoolListener):
+    """Listener de PyMongo que cuenta conexiones en uso y espera de checkout."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self.checkouts = 0
+        self.fallos = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+    
+    def connection_checked_out(self, event):
+        espera = getattr(event, "duration", None) or 0.0  # PyMongo >= 4.7
+        with self._lock:
+            self.en_uso += 1
+            self.max_en_uso = max(self.max_en_uso, self.en_uso)
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.en_uso = max(0, self.en_uso - 1)
+    
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.fallos += 1
+    
+    # Eventos que no necesitamos
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        pass
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    
+    def estadisticas(self, max_pool_size):
+        return {
+            "max_pool_size": max_pool_size,
+            "in_use": self.en_uso,
+            "peak_in_use": self.max_en_uso,
+            "utilization": round(self.en_uso / max_pool_size * 100, 2) if max_pool_size else 0,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.fallos,
+            "wait_avg_ms": round(self.espera_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+            "wait_max_ms": round(self.espera_max * 1000, 3)
+        }
+
+
+class GestorConexiones:
+    """
+    Conexiones perezosas, con pool y seguras ante fork.
+    
+    - Nada se conecta al importar: los clientes se crean en el primer uso.
+    - Tamaños de pool y timeouts configurables por variables de entorno.
+    - Tras un fork (gunicorn pre-fork) el hijo crea sus propios clientes
+      en lugar de compartir los sockets heredados del padre.
+    """
+    
+    def __init__(self, entorno=os.environ):
+        self.redis_host = entorno.get("REDIS_HOST", "localhost")
+        self.redis_port = int(entorno.get("REDIS_PORT", 6379))
+        self.redis_db = int(entorno.get("REDIS_DB", 0))
+        self.redis_max_conexiones = int(entorno.get("REDIS_MAX_CONNECTIONS", 50))
+        self.redis_espera_pool = float(entorno.get("REDIS_POOL_TIMEOUT", 5))
+        self.redis_socket_timeout = float(entorno.get("REDIS_SOCKET_TIMEOUT", 2))
+        self.redis_connect_timeout = float(entorno.get("REDIS_CONNECT_TIMEOUT", 1))
+        self.redis_health_check = int(entorno.get("REDIS_HEALTH_CHECK_INTERVAL", 30))
+        
+        self.mongo_uri = entorno.get("MONGO_URI", "mongodb://localhost:27017/")
+        self.mongo_db = entorno.get("MONGO_DB", "tienda_db")
+        self.mongo_max_pool = int(entorno.get("MONGO_MAX_POOL_SIZE", 50))
+        self.mongo_min_pool = int(entorno.get("MONGO_MIN_POOL_SIZE", 0))
+        self.mongo_espera_ms = int(entorno.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+        self.mongo_seleccion_ms = int(entorno.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 2000))
+        
+        self._lock = threading.Lock()
+        self._reiniciar()
+    
+    def _reiniciar(self):
+        """Olvida los clientes creados (los del padre, tras un fork)."""
+        self._pid = os.getpid()
+        self._redis = {}  # decode_responses -> redis.Redis
+        self._mongo = None
+        self._monitor_mongo = MonitorPoolMongo()
+    
+    def _comprobar_pid(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reiniciar()
+    
+    def redis(self, decode_responses=True):
+        self._comprobar_pid()
+        cliente = self._redis.get(decode_responses)
+        if cliente is None:
+            with self._lock:
+                cliente = self._redis.get(decode_responses)
+                if cliente is None:
+                    pool = PoolRedisMedido(
+                        host=self.redis_host,
+                        port=self.redis_port,
+                        db=self.redis_db,
+                        decode_responses=decode_responses,
+                        max_connections=self.redis_max_conexiones,
+                        timeout=self.redis_espera_pool,
+                        socket_timeout=self.redis_socket_timeout,
+                        socket_connect_timeout=self.redis_connect_timeout,
+                        health_check_interval=self.redis_health_check
+                    )
+                    cliente = self._redis[decode_responses] = redis.Redis(connection_pool=pool)
+        return cliente
+    
+    def mongo(self):
+        self._comprobar_pid()
+        if self._mongo is None:
+            with self._lock:
+                if self._mongo is None:
+                    self._mongo = MongoClient(
+                        self.mongo_uri,
+                        maxPoolSize=self.mongo_max_pool,
+                        minPoolSize=self.mongo_min_pool,
+                        waitQueueTimeoutMS=self.mongo_espera_ms,
+                        serverSelectionTimeoutMS=self.mongo_seleccion_ms,
+                        event_listeners=[self._monitor_mongo],
+                        connect=False
+                    )
+        return self._mongo[self.mongo_db]
+    
+    def estadisticas(self):
+        """Uso de los pools creados en este proceso."""
+        self._comprobar_pid()
+        stats = {"pid": self._pid}
+        for decode, cliente in self._redis.items():
+            nombre = "redis" if decode else "redis_bin"
+            stats[nombre] = cliente.connection_pool.estadisticas()
+        if self._mongo is not None:
+            stats["mongodb"] = self._monitor_mongo.estadisticas(self.mongo_max_pool)
+        return stats
+
+
+class _ConexionPerezosa:
+    """Proxy que resuelve el cliente real en cada uso (lo crea la primera vez y tras un fork)."""
+    
+    def __init__(self, fabrica):
+        self._fabrica = fabrica
+    
+    def __getattr__(self, nombre):
+        return getattr(self._fabrica(), nombre)
+    
+    def __getitem__(self, nombre):
+        return self._fabrica()[nombre]
+
+
+conexiones = GestorConexiones()
+
+
+def get_redis(decode_responses=True):
+    """Obtener conexión a Redis (cliente del pool del proceso actual)."""
+    return conexiones.redis(decode_responses)
 
 
 def get_mongodb():
-    """Obtener conexión a MongoDB."""
-    client = MongoClient('mongodb://localhost:27017/')
-    return client['tienda_db']
+    """Obtener conexión a MongoDB (cliente del pool del proceso actual)."""
+    return conexiones.mongo()
 
 
-# Conexiones globales
-redis_client = get_redis()
-mongo_db = get_mongodb()
+# Conexiones globales (perezosas: no conectan al importar el módulo)
+redis_client = _ConexionPerezosa(get_redis)
+redis_bin = _ConexionPerezosa(lambda: get_redis(decode_responses=False))  # Valores cacheados (binarios)
+mongo_db = _ConexionPerezosa(get_mongodb)
+
+
+# =============================================================================
+# SERIALIZACIÓN (CODEC)
+# =============================================================================
+
+class Codec:
+    """
+    Serialización de los valores cacheados.
+    
+    Cada valor lleva una cabecera de 3 bytes: marca (0x00), versión y
+    formato ('J' JSON, 'M' msgpack; en minúscula si va comprimido con zlib).
+    Un JSON nunca empieza por 0x00, así que los valores sin cabecera
+    (JSON plano de versiones anteriores) se siguen leyendo.
+    """
+    
+    MARCA = b"\x00"
+    VERSION = 1
+    
+    def __init__(self, formato="msgpack", umbral_compresion=1024, nivel_compresion=1):
+        if formato == "msgpack" and msgpack is None:
+            formato = "json"
+        self.formato = formato
+        self.umbral_compresion = umbral_compresion  # Bytes; 0 = nunca comprimir
+        self.nivel_compresion = nivel_compresion
+    
+    def encode(self, valor, default=str) -> bytes:
+        if self.formato == "msgpack":
+            codigo, datos = b"M", msgpack.packb(valor, default=default, use_bin_type=True)
+        else:
+            codigo, datos = b"J", json.dumps(valor, default=default, separators=(",", ":")).encode()
+        
+        if self.umbral_compresion and len(datos) >= self.umbral_compresion:
+            comprimido = zlib.compress(datos, self.nivel_compresion)
+            if len(comprimido) < len(datos):
+                codigo, datos = codigo.lower(), comprimido
+        
+        return self.MARCA + bytes([self.VERSION]) + codigo + datos
+    
+    def decode(self, datos):
+        if isinstance(datos, str):
+            datos = datos.encode()
+        if not datos.startswith(self.MARCA):
+            return json.loads(datos)  # Valor antiguo sin cabecera
+        
+        version, codigo, cuerpo = datos[1], datos[2:3], datos[3:]
+        if version != self.VERSION:
+            raise ValueError(f"Versión de codec no soportada: {version}")
+        
+        if codigo.islower():
+            cuerpo = zlib.decompress(cuerpo)
+            codigo = codigo.upper()
+        if codigo == b"M":
+            if msgpack is None:
+                raise ValueError("Valor en msgpack pero msgpack no está instalado")
+            return msgpack.unpackb(cuerpo, raw=False, strict_map_key=False)
+        return json.loads(cuerpo)
+
+
+codec = Codec(
+    formato=os.environ.get("CACHE_CODEC", "msgpack"),
+    umbral_compresion=int(os.environ.get("CACHE_COMPRESS_MIN", 1024))
+)
 
 
 # =============================================================================
@@ -42,22 +342,89 @@ mongo_db = get_mongodb()
 # =============================================================================
 
 class CacheStats:
-    """Estadísticas del caché."""
+    """
+    Estadísticas del caché.
+    
+    Los contadores se acumulan en memoria del proceso y se vuelcan a Redis
+    en lote (un pipeline de INCRBY/HINCRBY) cada `flush_cada` eventos o cada
+    `intervalo` segundos, en lugar de un INCR por petición.
+    """
     
-    def __init__(self, redis_client):
+    HASH_DETALLE = "stats:cache:detalle"  # Campos "<etiqueta>|hits" / "<etiqueta>|misses"
+    
+    def __init__(self, redis_client, flush_cada=500, intervalo=1.0):
         self.r = redis_client
+        self.flush_cada = flush_cada
+        self.intervalo = intervalo
+        self._pendientes = {}  # (tipo, etiqueta) -> n
+        self._eventos = 0
+        self._lock = threading.Lock()
+        self._hilo = None
     
-    def registrar_hit(self):
-        self.r.incr("stats:cache:hits")
+    def registrar_hit(self, n=1, etiqueta=None):
+        self._registrar("hits", n, etiqueta)
     
-    def registrar_miss(self):
-        self.r.incr("stats:cache:misses")
+    def registrar_miss(self, n=1, etiqueta=None):
+        self._registrar("misses", n, etiqueta)
     
-    def obtener_estadisticas(self):
-        hits = int(self.r.get("stats:cache:hits") or 0)
-        misses = int(self.r.get("stats:cache:misses") or 0)
-        total = hits + misses
+    def _registrar(self, tipo, n, etiqueta):
+        with self._lock:
+            clave = (tipo, etiqueta)
+            self._pendientes[clave] = self._pendientes.get(clave, 0) + n
+            self._eventos += n
+            lleno = self._eventos >= self.flush_cada
         
+        if lleno:
+            self.flush()
+        elif self._hilo is None:
+            self._arrancar_hilo()
+    
+    def flush(self):
+        """Vuelca los contadores locales a Redis en un solo pipeline."""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+            self._eventos = 0
+        
+        if not pendientes:
+            return
+        
+        pipe = self.r.pipeline(transaction=False)
+        totales = {"hits": 0, "misses": 0}
+        for (tipo, etiqueta), n in pendientes.items():
+            totales[tipo] += n
+            if etiqueta:
+                pipe.hincrby(self.HASH_DETALLE, f"{etiqueta}|{tipo}", n)
+        for tipo, n in totales.items():
+            if n:
+                pipe.incrby(f"stats:cache:{tipo}", n)
+        
+        try:
+            pipe.execute()
+        except redis.RedisError:
+            # Devolver los contadores para el siguiente intento
+            with self._lock:
+                for clave, n in pendientes.items():
+                    self._pendientes[clave] = self._pendientes.get(clave, 0) + n
+            raise
+    
+    def _arrancar_hilo(self):
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._bucle_flush, daemon=True)
+            self._hilo.start()
+    
+    def _bucle_flush(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.flush()
+            except redis.RedisError:
+                pass  # Se reintenta en el siguiente ciclo
+    
+    @staticmethod
+    def _resumen(hits, misses):
+        total = hits + misses
         return {
             "hits": hits,
             "misses": misses,
@@ -65,21 +432,989 @@ class CacheStats:
             "hit_ratio": round(hits / total * 100, 2) if total > 0 else 0
         }
     
+    def obtener_estadisticas(self):
+        # Incluir lo pendiente de este proceso; el resto llega en <= intervalo
+        self.flush()
+        
+        pipe = self.r.pipeline(transaction=False)
+        pipe.get("stats:cache:hits")
+        pipe.get("stats:cache:misses")
+        pipe.hgetall(self.HASH_DETALLE)
+        hits, misses, detalle = pipe.execute()
+        
+        # Desglose por función (etiqueta) y por prefijo (antes del primer ':')
+        por_funcion = {}
+        for campo, n in detalle.items():
+            etiqueta, tipo = campo.rsplit("|", 1)
+            por_funcion.setdefault(etiqueta, {"hits": 0, "misses": 0})[tipo] = int(n)
+        
+        por_prefijo = {}
+        for etiqueta, c in por_funcion.items():
+            acumulado = por_prefijo.setdefault(etiqueta.split(":", 1)[0], {"hits": 0, "misses": 0})
+            acumulado["hits"] += c["hits"]
+            acumulado["misses"] += c["misses"]
+        
+        stats = self._resumen(int(hits or 0), int(misses or 0))
+        stats["por_prefijo"] = {k: self._resumen(**c) for k, c in sorted(por_prefijo.items())}
+        stats["por_funcion"] = {k: self._resumen(**c) for k, c in sorted(por_funcion.items())}
+        return stats
+    
     def reset(self):
-        self.r.delete("stats:cache:hits", "stats:cache:misses")
+        with self._lock:
+            self._pendientes = {}
+            self._eventos = 0
+        self.r.delete("stats:cache:hits", "stats:cache:misses", self.HASH_DETALLE)
+    
+    def _despues_de_fork(self):
+        # Los contadores pendientes son del padre (él los volcará) y el hilo no existe
+        self._lock = threading.Lock()
+        self._pendientes = {}
+        self._eventos = 0
+        self._hilo = None
 
 
 cache_stats = CacheStats(redis_client)
 
 
+# =============================================================================
+# MÉTRICAS DE LATENCIA (SERVER-TIMING Y PROMETHEUS)
+# =============================================================================
+
+# Tiempo por etapa de la petición en curso: {etapa: [segundos, llamadas]}.
+# Un ContextVar sirve igual para hilos (Flask) que para tareas (asyncio).
+_tiempos_peticion = contextvars.ContextVar("tiempos_peticion", default=None)
+
+
+class Metricas:
+    """
+    Histogramas de latencia por endpoint y por etapa (redis, mongo, codec).
+    
+    Como CacheStats, se acumulan en memoria y un hilo los vuelca a Redis en
+    lote (HINCRBY/HINCRBYFLOAT en un hash), así que /metrics devuelve el
+    agregado de todos los workers con un solo HGETALL.
+    """
+    
+    HASH = "stats:metricas"  # Campos "<serie>|<etiquetas>|<bucket>" / "...|sum"
+    LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+    LIMITES_SERIE = {"cache_ttl_segundos": (60, 300, 900, 3600, 4 * 3600, 12 * 3600, 86400)}
+    
+    def __init__(self, redis_client, intervalo=1.0):
+        self.r = redis_client
+        self.intervalo = intervalo
+        self._pendientes = {}  # (serie, etiquetas) -> [n por bucket..., n +Inf, suma]
+        self._lock = threading.Lock()
+        self._hilo = None
+    
+    def observar(self, serie, etiquetas, segundos):
+        """Añade una observación al histograma `serie` con esas etiquetas."""
+        limites = self.LIMITES_SERIE.get(serie, self.LIMITES)
+        bucket = bisect.bisect_left(limites, segundos)
+        with self._lock:
+            fila = self._pendientes.get((serie, etiquetas))
+            if fila is None:
+                fila = self._pendientes[(serie, etiquetas)] = [0] * (len(limites) + 1) + [0.0]
+            fila[bucket] += 1
+            fila[-1] += segundos
+        
+        if self._hilo is None:
+            self._arrancar_hilo()
+    
+    def observar_etapa(self, etapa, segundos, llamadas=1):
+        tiempos = _tiempos_peticion.get()
+        if tiempos is not None:
+            acumulado = tiempos.setdefault(etapa, [0.0, 0])
+            acumulado[0] += segundos
+            acumulado[1] += llamadas
+        self.observar("cache_etapa_segundos", f'etapa="{etapa}"', segundos)
+    
+    def observar_peticion(self, endpoint, metodo, estado, segundos):
+        self.observar(
+            "api_peticion_segundos",
+            f'endpoint="{endpoint}",metodo="{metodo}",estado="{estado}"',
+            segundos
+        )
+    
+    def flush(self):
+        """Vuelca los histogramas locales a Redis en un solo pipeline."""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        
+        if not pendientes:
+            return
+        
+        pipe = self.r.pipeline(transaction=False)
+        for (serie, etiquetas), fila in pendientes.items():
+            for bucket, n in enumerate(fila[:-1]):
+                if n:
+                    pipe.hincrby(self.HASH, f"{serie}|{etiquetas}|{bucket}", n)
+            pipe.hincrbyfloat(self.HASH, f"{serie}|{etiquetas}|sum", fila[-1])
+        
+        try:
+            pipe.execute()
+        except redis.RedisError:
+            with self._lock:
+                for clave, fila in pendientes.items():
+                    actual = self._pendientes.setdefault(clave, [0] * len(fila[:-1]) + [0.0])
+                    for i, n in enumerate(fila):
+                        actual[i] += n
+            raise
+    
+    def _arrancar_hilo(self):
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._bucle_flush, daemon=True)
+            self._hilo.start()
+    
+    def _bucle_flush(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.flush()
+            except redis.RedisError:
+                pass  # Se reintenta en el siguiente ciclo
+    
+    def _leer(self):
+        """serie -> etiquetas -> {bucket: n, "sum": x}, agregado de todos los procesos."""
+        self.flush()
+        
+        series = {}
+        for campo, valor in self.r.hgetall(self.HASH).items():
+            serie, etiquetas, bucket = campo.split("|")
+            series.setdefault(serie, {}).setdefault(etiquetas, {})[bucket] = valor
+        return series
+    
+    def resumen(self, serie):
+        """{etiquetas: {"n": observaciones, "media": valor medio}} de una serie."""
+        resultado = {}
+        for etiquetas, buckets in self._leer().get(serie, {}).items():
+            n = sum(int(v) for k, v in buckets.items() if k != "sum")
+            suma = float(buckets.get("sum", 0))
+            resultado[etiquetas] = {"n": n, "media": round(suma / n, 4) if n else 0}
+        return resultado
+    
+    def resumen_etapas(self):
+        """{etapa: {"llamadas": n, "ms_medio": x}}; las de "mongo" son el volumen de consultas."""
+        return {
+            etiquetas.split('"')[1]: {"llamadas": r["n"], "ms_medio": round(r["media"] * 1000, 3)}
+            for etiquetas, r in self.resumen("cache_etapa_segundos").items()
+        }
+    
+    def exportar(self, stats=None):
+        """Texto en formato de exposición de Prometheus (histogramas + hits/misses)."""
+        series = self._leer()
+        
+        ayuda = {
+            "api_peticion_segundos": "Latencia de las peticiones HTTP por endpoint",
+            "cache_etapa_segundos": "Latencia por etapa (redis, mongo, codec)",
+            "cache_ttl_segundos": "TTL asignado por la política adaptativa",
+        }
+        lineas = []
+        for serie, por_etiquetas in sorted(series.items()):
+            lineas.append(f"# HELP {serie} {ayuda.get(serie, serie)}")
+            lineas.append(f"# TYPE {serie} histogram")
+            for etiquetas, buckets in sorted(por_etiquetas.items()):
+                acumulado = 0
+                limites = self.LIMITES_SERIE.get(serie, self.LIMITES)
+                for i, limite in enumerate(limites + ("+Inf",)):
+                    acumulado += int(buckets.get(str(i), 0))
+                    lineas.append(f'{serie}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+                lineas.append(f"{serie}_sum{{{etiquetas}}} {float(buckets.get('sum', 0))}")
+                lineas.append(f"{serie}_count{{{etiquetas}}} {acumulado}")
+        
+        if stats is not None:
+            for tipo in ("hits", "misses"):
+                lineas.append(f"# HELP cache_{tipo}_total Cache {tipo} por función")
+                lineas.append(f"# TYPE cache_{tipo}_total counter")
+                for funcion, c in stats.get("por_funcion", {}).items():
+                    lineas.append(f'cache_{tipo}_total{{funcion="{funcion}"}} {c[tipo]}')
+        
+        return "\n".join(lineas) + "\n"
+    
+    def reset(self):
+        with self._lock:
+            self._pendientes = {}
+        self.r.delete(self.HASH)
+    
+    def _despues_de_fork(self):
+        self._lock = threading.Lock()
+        self._pendientes = {}
+        self._hilo = None
+
+
+metricas = Metricas(redis_client)
+
+
+class _Etapa:
+    __slots__ = ("nombre", "llamadas", "inicio")
+    
+    def __init__(self, nombre, llamadas=1):
+        self.nombre = nombre
+        self.llamadas = llamadas
+    
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        metricas.observar_etapa(self.nombre, time.perf_counter() - self.inicio, self.llamadas)
+
+
+def etapa(nombre, llamadas=1):
+    """
+    Mide un bloque con reloj monotónico y lo asigna a una etapa:
+    
+        with etapa("mongo"):
+            producto = collection.find_one(...)
+    """
+    return _Etapa(nombre, llamadas)
+
+
+def iniciar_peticion():
+    """Empieza a acumular tiempos por etapa para la petición en curso."""
+    tiempos = {}
+    _tiempos_peticion.set(tiempos)
+    return tiempos
+
+
+def server_timing(tiempos, total=None):
+    """Valor de la cabecera Server-Timing: `redis;dur=1.20;desc="3", mongo;dur=...`."""
+    partes = [
+        f'{nombre};dur={segundos * 1000:.2f};desc="{llamadas}"'
+        for nombre, (segundos, llamadas) in tiempos.items()
+    ]
+    if total is not None:
+        partes.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(partes)
+
+
+# =============================================================================
+# FRECUENCIA DE ACCESO (POPULARIDAD)
+# =============================================================================
+
+class FrecuenciaAccesos:
+    """
+    Popularidad reciente de productos, búsquedas y listados, para saber qué
+    precargar tras un deploy o un reinicio de Redis.
+    
+    Un sorted set por tipo (`stats:accesos:<tipo>`) con decaimiento
+    exponencial: en lugar de multiplicar todos los scores cada cierto tiempo,
+    cada acceso suma 2^((t - t0) / vida_media), así los recientes pesan más
+    y el orden es el mismo. Cuando los scores crecen demasiado se reescalan
+    todos de una vez y t0 avanza. Los accesos se cuentan en memoria y se
+    vuelcan en lote, como las estadísticas.
+    """
+    
+    PREFIJO = "stats:accesos"
+    TIPOS = ("producto", "busqueda", "listado", "cached", "escritura")
+    MAX_EXPONENTE = 40  # 2^40 ≈ 1e12: muy lejos del límite de precisión del score
+    
+    def __init__(self, redis_client, vida_media=3600, max_miembros=100000, intervalo=1.0):
+        self.r = redis_client
+        self.vida_media = vida_media
+        self.max_miembros = max_miembros
+        self.intervalo = intervalo
+        self._pendientes = {}  # (tipo, miembro) -> n
+        self._lock = threading.Lock()
+        self._hilo = None
+    
+    def _clave(self, tipo):
+        return f"{self.PREFIJO}:{tipo}"
+    
+    def registrar(self, tipo, *miembros):
+        with self._lock:
+            for miembro in miembros:
+                clave = (tipo, miembro)
+                self._pendientes[clave] = self._pendientes.get(clave, 0) + 1
+        
+        if self._hilo is None:
+            self._arrancar_hilo()
+    
+    def flush(self):
+        """Vuelca los accesos con un ZINCRBY por miembro, en una transacción."""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        
+        if not pendientes:
+            return
+        
+        clave_t0 = f"{self.PREFIJO}:t0"
+        ahora = time.time()
+        
+        def volcar(pipe):
+            t0 = float(pipe.get(clave_t0) or 0)
+            if not t0:
+                t0 = ahora
+            exponente = (ahora - t0) / self.vida_media
+            
+            pipe.multi()
+            if exponente > self.MAX_EXPONENTE:
+                # Reescalar: mismos scores relativos, t0 pasa a ahora
+                for tipo in self.TIPOS:
+                    pipe.zunionstore(self._clave(tipo), {self._clave(tipo): 2.0 ** -exponente})
+                t0, exponente = ahora, 0.0
+            pipe.set(clave_t0, t0)
+            
+            peso = 2.0 ** exponente
+            for (tipo, miembro), n in pendientes.items():
+                pipe.zincrby(self._clave(tipo), n * peso, miembro)
+            for tipo in {tipo for tipo, _ in pendientes}:
+                pipe.zremrangebyrank(self._clave(tipo), 0, -self.max_miembros - 1)
+        
+        # WATCH sobre t0: si otro proceso reescala a la vez, se repite con el nuevo
+        self.r.transaction(volcar, clave_t0)
+    
+    def _arrancar_hilo(self):
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._bucle_flush, daemon=True)
+            self._hilo.start()
+    
+    def _bucle_flush(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.flush()
+            except redis.RedisError:
+                pass  # Estos accesos se pierden: solo orientan la precarga
+    
+    def top(self, tipo, n):
+        """Los n miembros más populares del tipo, de más a menos."""
+        return self.r.zrevrange(self._clave(tipo), 0, n - 1) if n > 0 else []
+    
+    def frecuencias(self, pares):
+        """
+        Accesos recientes (con decaimiento) de cada (tipo, miembro), en un
+        pipeline. Unidades: accesos en torno a la última vida media.
+        """
+        pipe = self.r.pipeline(transaction=False)
+        pipe.get(f"{self.PREFIJO}:t0")
+        for tipo, miembro in pares:
+            pipe.zscore(self._clave(tipo), miembro)
+        t0, *scores = pipe.execute()
+        return self._escalar(t0, scores)
+    
+    def _escalar(self, t0, scores):
+        # Un acceso de ahora suma 2^((ahora - t0) / vida_media)
+        unidad = 2.0 ** ((time.time() - float(t0)) / self.vida_media) if t0 else 1.0
+        return [(score or 0) / unidad for score in scores]
+    
+    def _despues_de_fork(self):
+        self._lock = threading.Lock()
+        self._pendientes = {}
+        self._hilo = None
+
+
+accesos = FrecuenciaAccesos(
+    redis_client,
+    vida_media=float(os.environ.get("CACHE_ACCESOS_VIDA_MEDIA", 3600))
+)
+
+
+# =============================================================================
+# TTL ADAPTATIVO
+# =============================================================================
+
+class PoliticaTTL:
+    """
+    TTL por clave a partir de cuánto se lee y cuánto se escribe.
+    
+        ttl = base * (lecturas + 1) / (escrituras + 1)
+    
+    acotado a [minimo, maximo] y con jitter hacia abajo para que las claves
+    guardadas a la vez no expiren a la vez. Las frecuencias salen de
+    `accesos` (con decaimiento), así que una clave muy leída que apenas
+    cambia llega al máximo y una que se actualiza a menudo baja al mínimo.
+    Sin la política se usa el TTL base tal cual.
+    
+    Es experimental y viene desactivada (CACHE_TTL_ADAPTATIVO=1 la
+    activa): leer las frecuencias cuesta un round trip más en cada miss.
+    En el write-through no, porque el TTL se calcula en el propio script.
+    """
+    
+    def __init__(self, accesos, minimo=60, maximo=86400, jitter=0.1, habilitada=True):
+        self.accesos = accesos
+        self.minimo = minimo
+        self.maximo = maximo
+        self.jitter = jitter
+        self.habilitada = habilitada
+    
+    def ttl(self, base, tipo, miembro, escrito_por=None):
+        """TTL de una clave; `escrito_por` es dónde se cuentan sus escrituras (por defecto, ella misma)."""
+        return self.ttls(base, tipo, [miembro], escrito_por)[0]
+    
+    def ttls(self, base, tipo, miembros, escrito_por=None):
+        """TTLs de varias claves del mismo tipo con un solo pipeline."""
+        if not self.habilitada or not miembros:
+            return [base] * len(miembros)
+        
+        frecuencias = self.accesos.frecuencias(self._pares(tipo, miembros, escrito_por))
+        return self._aplicar(base, tipo, frecuencias)
+    
+    def _pares(self, tipo, miembros, escrito_por):
+        """(tipo, miembro) de las lecturas de cada clave y después los de sus escrituras."""
+        return ([(tipo, m) for m in miembros] +
+                [("escritura", escrito_por or m) for m in miembros])
+    
+    def _aplicar(self, base, tipo, frecuencias):
+        """La fórmula, sobre las frecuencias de `_pares` (mitad lecturas, mitad escrituras)."""
+        mitad = len(frecuencias) // 2
+        lecturas, escrituras = frecuencias[:mitad], frecuencias[mitad:]
+        
+        resultado = []
+        for leidas, escritas in zip(lecturas, escrituras):
+            ttl = min(max(base * (leidas + 1) / (escritas + 1), self.minimo), self.maximo)
+            ttl = max(1, int(ttl * random.uniform(1 - self.jitter, 1)))
+            self.observar(tipo, ttl)
+            resultado.append(ttl)
+        return resultado
+    
+    def para_lua(self, tipo):
+        """
+        (claves, args) que se añaden a LUA_WRITE_THROUGH para que calcule
+        el TTL con la misma fórmula, dentro del script. Vacíos sin la política.
+        """
+        if not self.habilitada:
+            return [], []
+        claves = [f"{self.accesos.PREFIJO}:t0", self.accesos._clave(tipo), self.accesos._clave("escritura")]
+        args = [self.minimo, self.maximo, random.uniform(1 - self.jitter, 1),
+                self.accesos.vida_media, time.time()]
+        return claves, args
+    
+    def observar(self, tipo, ttl):
+        if self.habilitada:
+            metricas.observar("cache_ttl_segundos", f'tipo="{tipo}"', ttl)
+    
+    def estadisticas(self):
+        return {
+            "habilitada": self.habilitada,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "jitter": self.jitter,
+            "asignados": {
+                etiquetas.split('"')[1]: {"n": r["n"], "ttl_medio": r["media"]}
+                for etiquetas, r in metricas.resumen("cache_ttl_segundos").items()
+            }
+        }
+
+
+politica_ttl = PoliticaTTL(
+    accesos,
+    minimo=int(os.environ.get("CACHE_TTL_MIN", 60)),
+    maximo=int(os.environ.get("CACHE_TTL_MAX", 86400)),
+    jitter=float(os.environ.get("CACHE_TTL_JITTER", 0.1)),
+    habilitada=os.environ.get("CACHE_TTL_ADAPTATIVO", "0") == "1"
+)
+
+
+@atexit.register
+def _flush_estadisticas():
+    for contador in (cache_stats, metricas, accesos):
+        try:
+            contador.flush()
+        except redis.RedisError:
+            pass
+
+
+# =============================================================================
+# CACHÉ L1 (EN MEMORIA DEL PROCESO)
+# =============================================================================
+
+class CacheL1:
+    """
+    Caché en memoria de cada worker, delante de Redis.
+    
+    Guarda los valores ya decodificados (sin decodificar en cada hit),
+    con expulsión LRU, TTL y un límite aproximado de memoria (tamaño del
+    valor serializado). Las invalidaciones se publican en un canal Pub/Sub
+    para que el resto de nodos borren su copia.
+    
+    Los valores devueltos se comparten entre peticiones: no modificarlos.
+    """
+    
+    CANAL = "cache:invalidaciones"
+    
+    def __init__(self, redis_client, max_items=10000, max_bytes=64 * 1024 * 1024,
+                 ttl=30, enabled=True):
+        self.r = redis_client
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self._datos = OrderedDict()  # clave -> (expira, tamaño, valor)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hilo = None
+        self.hits = 0
+        self.misses = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+    
+    def get(self, clave):
+        """Devuelve el valor en L1 o None."""
+        if not self.enabled:
+            return None
+        
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    self._quitar(clave)
+                self.misses += 1
+                return None
+            
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return entrada[2]
+    
+    def set(self, clave, valor, tamano, ttl=None):
+        """Guarda un valor ya decodificado; `tamano` es la longitud serializada."""
+        if not self.enabled or tamano > self.max_bytes:
+            return
+        
+        # Sin escucha activa no podemos garantizar coherencia: no cachear
+        if not self._escuchar():
+            return
+        
+        ttl = min(ttl, self.ttl) if ttl else self.ttl
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (time.monotonic() + ttl, tamano, valor)
+            self._bytes += tamano
+            
+            while len(self._datos) > self.max_items or self._bytes > self.max_bytes:
+                _, (_, t, _) = self._datos.popitem(last=False)
+                self._bytes -= t
+                self.expulsiones += 1
+    
+    def invalidar(self, *claves, pipe=None):
+        """Borra las claves en este nodo y avisa al resto."""
+        if not self.enabled or not claves:
+            return
+        self._invalidar_local(claves)
+        (pipe or self.r).publish(self.CANAL, json.dumps(list(claves)))
+    
+    def invalidar_todo(self, pipe=None):
+        """Vacía la L1 de todos los nodos."""
+        if not self.enabled:
+            return
+        self.limpiar()
+        (pipe or self.r).publish(self.CANAL, "*")
+    
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+    
+    def reset(self):
+        self.hits = self.misses = self.expulsiones = self.invalidaciones = 0
+    
+    def _despues_de_fork(self):
+        # El hilo de escucha no sobrevive al fork: sin él no hay coherencia
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._datos = OrderedDict()
+        self._bytes = 0
+    
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total * 100, 2) if total > 0 else 0,
+            "items": len(self._datos),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.expulsiones,
+            "invalidations": self.invalidaciones
+        }
+    
+    def _quitar(self, clave):
+        _, tamano, _ = self._datos.pop(clave)
+        self._bytes -= tamano
+    
+    def _invalidar_local(self, claves):
+        with self._lock:
+            for clave in claves:
+                if clave in self._datos:
+                    self._quitar(clave)
+                    self.invalidaciones += 1
+    
+    def _on_invalidacion(self, mensaje):
+        if mensaje['data'] == "*":
+            self.limpiar()
+        else:
+            self._invalidar_local(json.loads(mensaje['data']))
+    
+    def _on_error(self, error, pubsub, hilo):
+        # Se han podido perder invalidaciones: vaciar y volver a suscribir
+        pubsub.close()
+        hilo.stop()
+        self._hilo = None
+        self.limpiar()
+    
+    def _escuchar(self):
+        """Arranca (una vez) el hilo suscrito al canal de invalidaciones."""
+        if self._hilo is not None:
+            return True
+        
+        with self._lock:
+            if self._hilo is None:
+                try:
+                    pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(**{self.CANAL: self._on_invalidacion})
+                    self._hilo = pubsub.run_in_thread(
+                        sleep_time=1, daemon=True, exception_handler=self._on_error
+                    )
+                except redis.RedisError:
+                    return False
+        return True
+
+
+cache_l1 = CacheL1(
+    redis_client,
+    max_items=int(os.environ.get("CACHE_L1_MAX_ITEMS", 10000)),
+    max_bytes=int(os.environ.get("CACHE_L1_MAX_BYTES", 64 * 1024 * 1024)),
+    ttl=int(os.environ.get("CACHE_L1_TTL", 30)),
+    enabled=os.environ.get("CACHE_L1_ENABLED", "0") == "1"
+)
+
+
+def leer_cache(clave):
+    """Lee una clave del caché (L1 y después Redis). Devuelve None si no está."""
+    valor = cache_l1.get(clave)
+    if valor is not None:
+        return valor
+    
+    with etapa("redis"):
+        cached = redis_bin.get(clave)
+    if not cached:
+        return None
+    
+    with etapa("codec"):
+        valor = codec.decode(cached)
+    cache_l1.set(clave, valor, len(cached))
+    return valor
+
+
+def guardar_cache(clave, ttl, valor, delta=None, **encode_kwargs):
+    """
+    Guarda un valor en Redis (SETEX) y en L1.
+    
+    `ttl` puede ser una función (p. ej. de `politica_ttl`): así solo se
+    calcula cuando de verdad hay que guardar.
+    `delta` es lo que tardó en calcularse; se guarda junto al valor para
+    el refresco anticipado (XFetch).
+    """
+    if callable(ttl):
+        with etapa("redis"):
+            ttl = ttl()
+    with etapa("codec"):
+        datos = codec.encode(valor, **encode_kwargs)
+    with etapa("redis"):
+        if delta is not None and XFETCH_BETA > 0:
+            pipe = redis_bin.pipeline(transaction=False)
+            pipe.setex(clave, ttl, datos)
+            pipe.setex(f"{clave}:delta", ttl, round(delta, 4))
+            pipe.execute()
+        else:
+            redis_bin.setex(clave, ttl, datos)
+    cache_l1.set(clave, valor, len(datos), ttl)
+
+
+# =============================================================================
+# PROTECCIÓN CONTRA ESTAMPIDAS (CACHE STAMPEDE)
+# =============================================================================
+
+STAMPEDE_LOCK_TTL = 10   # Segundos máximos que puede durar un recálculo
+STAMPEDE_ESPERA = 2.0    # Segundos que se espera a que otro proceso recalcule
+XFETCH_BETA = float(os.environ.get("CACHE_XFETCH_BETA", 0))  # 0 = sin refresco anticipado
+
+
+class _Vuelo:
+    """Cálculo en curso para una clave, compartido por los hilos que la piden."""
+    
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+_vuelos = {}
+_vuelos_lock = threading.Lock()
+
+
+def _single_flight(clave, funcion):
+    """Dentro del proceso, solo el primer hilo ejecuta `funcion`; el resto espera su resultado."""
+    with _vuelos_lock:
+        vuelo = _vuelos.get(clave)
+        lider = vuelo is None
+        if lider:
+            vuelo = _vuelos[clave] = _Vuelo()
+    
+    if not lider:
+        vuelo.evento.wait()
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+    
+    try:
+        vuelo.resultado = funcion()
+        return vuelo.resultado
+    except Exception as e:
+        vuelo.error = e
+        raise
+    finally:
+        with _vuelos_lock:
+            del _vuelos[clave]
+        vuelo.evento.set()
+
+
+def _leer_xfetch(clave):
+    """
+    Lee una clave y decide si toca refrescarla antes de que expire.
+    
+    XFetch: refrescar si  -delta * beta * ln(rand) >= ttl restante.
+    Las claves más caras de calcular se refrescan antes.
+    """
+    if XFETCH_BETA <= 0:
+        return leer_cache(clave), False
+    
+    valor = cache_l1.get(clave)
+    if valor is not None:
+        return valor, False
+    
+    with etapa("redis"):
+        pipe = redis_bin.pipeline(transaction=False)
+        pipe.get(clave)
+        pipe.get(f"{clave}:delta")
+        pipe.pttl(clave)
+        cached, delta, pttl = pipe.execute()
+    
+    if not cached:
+        return None, False
+    
+    with etapa("codec"):
+        valor = codec.decode(cached)
+    cache_l1.set(clave, valor, len(cached))
+    
+    if not delta or pttl <= 0:
+        return valor, False
+    
+    umbral = -float(delta) * XFETCH_BETA * math.log(1.0 - random.random())
+    return valor, umbral * 1000 >= pttl
+
+
+def _calcular_y_guardar(clave, ttl, calcular, encode_kwargs):
+    inicio = time.monotonic()
+    valor = calcular()
+    if valor is not None:
+        guardar_cache(clave, ttl, valor, delta=time.monotonic() - inicio, **encode_kwargs)
+    return valor
+
+
+def _calcular_con_lock(clave, ttl, calcular, encode_kwargs):
+    """Entre procesos, solo quien tiene el lock de Redis recalcula; el resto espera al valor."""
+    lock = redis_client.lock(f"lock:{clave}", timeout=STAMPEDE_LOCK_TTL, blocking=False)
+    with etapa("redis"):
+        adquirido = lock.acquire()
+    
+    if not adquirido:
+        limite = time.monotonic() + STAMPEDE_ESPERA
+        while time.monotonic() < limite:
+            time.sleep(0.05)
+            valor = leer_cache(clave)
+            if valor is not None:
+                return valor
+            if not redis_client.exists(lock.name):
+                break
+        # El otro proceso no dejó valor (o tarda demasiado): calcular sin lock
+        return _calcular_y_guardar(clave, ttl, calcular, encode_kwargs)
+    
+    try:
+        # Otro proceso pudo guardarlo mientras esperábamos el lock
+        valor = leer_cache(clave)
+        if valor is not None:
+            return valor
+        return _calcular_y_guardar(clave, ttl, calcular, encode_kwargs)
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass  # Expiró mientras calculábamos
+
+
+def _refrescar_anticipado(clave, ttl, calcular, encode_kwargs):
+    """Recalcula una clave que aún no ha expirado; si otro ya lo hace, no espera."""
+    lock = redis_client.lock(f"lock:{clave}", timeout=STAMPEDE_LOCK_TTL, blocking=False)
+    if not lock.acquire():
+        return None
+    try:
+        return _calcular_y_guardar(clave, ttl, calcular, encode_kwargs)
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass
+
+
+def obtener_o_calcular(clave, ttl, calcular, etiqueta=None, **encode_kwargs):
+    """
+    Cache-aside con protección contra estampidas.
+    
+    - Hit: devuelve el valor (y con XFetch, un solo llamante lo refresca
+      antes de que expire mientras el resto sigue usando el actual).
+    - Miss: un único cálculo por clave (single-flight en el proceso y
+      lock corto en Redis entre procesos); los demás esperan ese valor.
+    
+    `ttl` son segundos o una función que los calcula (solo en un miss).
+    `etiqueta` agrupa los hits/misses en las estadísticas (p. ej. "productos:buscar").
+    """
+    valor, refrescar = _leer_xfetch(clave)
+    
+    if valor is not None:
+        cache_stats.registrar_hit(etiqueta=etiqueta)
+        if refrescar:
+            nuevo = _refrescar_anticipado(clave, ttl, calcular, encode_kwargs)
+            if nuevo is not None:
+                return nuevo
+        return valor
+    
+    cache_stats.registrar_miss(etiqueta=etiqueta)
+    return _single_flight(clave, lambda: _calcular_con_lock(clave, ttl, calcular, encode_kwargs))
+
+
+def precalentar_clave(clave, ttl, calcular, **encode_kwargs):
+    """
+    Como `obtener_o_calcular`, pero para el precalentamiento: no cuenta
+    hits/misses y no hace nada si la clave ya está en Redis.
+    Devuelve True si la ha calculado.
+    """
+    with etapa("redis"):
+        if redis_bin.exists(clave):
+            return False
+    _single_flight(clave, lambda: _calcular_con_lock(clave, ttl, calcular, encode_kwargs))
+    return True
+
+
+# =============================================================================
+# NAMESPACES VERSIONADOS (GENERACIONES)
+# =============================================================================
+
+class Generaciones:
+    """
+    Invalidación O(1) de grupos de claves.
+    
+    Cada namespace tiene un contador `cache:gen:<ns>` y sus claves llevan
+    la generación dentro (`productos:v7:all:100`). Invalidar el namespace
+    es un único INCR: las claves de generaciones anteriores ya no se leen
+    y caducan por TTL, o las borra un reaper con SCAN + UNLINK en segundo
+    plano (nunca KEYS ni un DEL gigante).
+    
+    `cache_local` indica, por namespace, cuántos segundos puede reutilizarse
+    la generación leída sin volver a Redis (útil cuando solo cambia al
+    limpiar todo el caché).
+    """
+    
+    def __init__(self, redis_client, cache_local=None, lote_reaper=500, pausa_reaper=0.01):
+        self.r = redis_client
+        self.cache_local = cache_local or {}
+        self.lote_reaper = lote_reaper
+        self.pausa_reaper = pausa_reaper
+        self._locales = {}  # ns -> (generación, expira)
+    
+    def _clave_gen(self, ns):
+        return f"cache:gen:{ns}"
+    
+    def actual(self, ns, fresca=False):
+        """Generación vigente del namespace (`fresca` ignora la copia local)."""
+        local = self._locales.get(ns)
+        if local and local[1] > time.monotonic() and not fresca:
+            return local[0]
+        
+        with etapa("redis"):
+            gen = int(self.r.get(self._clave_gen(ns)) or 0)
+        if self.cache_local.get(ns):
+            self._locales[ns] = (gen, time.monotonic() + self.cache_local[ns])
+        return gen
+    
+    @staticmethod
+    def formato(ns, gen, resto):
+        """Clave versionada: <ns>:v<gen>:<resto>."""
+        return f"{ns}:v{gen}:{resto}"
+    
+    def clave(self, ns, resto, gen=None):
+        """Clave versionada con la generación vigente (o la indicada)."""
+        return self.formato(ns, self.actual(ns) if gen is None else gen, resto)
+    
+    def invalidar(self, *namespaces, pipe=None):
+        """Pasa a la siguiente generación (un INCR por namespace)."""
+        ejecutar = pipe is None
+        pipe = self.r.pipeline(transaction=False) if ejecutar else pipe
+        for ns in namespaces:
+            pipe.incr(self._clave_gen(ns))
+            self._locales.pop(ns, None)
+        return pipe.execute() if ejecutar else None
+    
+    def limpiar(self, *namespaces):
+        """Invalida los namespaces y lanza el reaper para sus claves huérfanas."""
+        nuevas = self.invalidar(*namespaces)
+        for ns, gen in zip(namespaces, nuevas):
+            threading.Thread(target=self.reaper, args=(ns, gen), daemon=True).start()
+        return dict(zip(namespaces, nuevas))
+    
+    def reaper(self, ns, hasta):
+        """Borra (SCAN + UNLINK por lotes) las claves de `ns` con generación < `hasta`."""
+        borradas = 0
+        lote = []
+        for clave in self.r.scan_iter(match=f"{ns}:v*", count=self.lote_reaper):
+            try:
+                gen = int(clave.split(":", 2)[1][1:])
+            except (IndexError, ValueError):
+                continue  # No es una clave versionada
+            if gen < hasta:
+                lote.append(clave)
+            if len(lote) >= self.lote_reaper:
+                borradas += self.r.unlink(*lote)
+                lote = []
+                time.sleep(self.pausa_reaper)  # Ceder el servidor a otros clientes
+        if lote:
+            borradas += self.r.unlink(*lote)
+        return borradas
+
+
+# La generación de productos individuales solo cambia al limpiar el caché
+generaciones = Generaciones(redis_client, cache_local={"producto": 1.0})
+
+
+def invalidar_cache(*claves, namespaces=()):
+    """
+    Borra claves de Redis y de la L1 de todos los nodos, e invalida
+    namespaces completos, en un solo pipeline.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    if claves:
+        pipe.delete(*claves)
+        cache_l1.invalidar(*claves, pipe=pipe)
+    generaciones.invalidar(*namespaces, pipe=pipe)
+    with etapa("redis"):
+        pipe.execute()
+
+
 # =============================================================================
 # DECORADOR DE CACHÉ
 # =============================================================================
 
-def cached(ttl=3600, prefix="cache"):
+def cached(ttl=3600, prefix="cache", etapa_origen="mongo"):
     """
     Decorador para cachear resultados de funciones.
     
+    El tiempo de la función en un miss se mide como `etapa_origen`.
+    `ttl` es la base de la política de TTL adaptativo (ver PoliticaTTL).
+    
     Uso:
         @cached(ttl=300, prefix="productos")
         def obtener_producto(id):
@@ -93,22 +1428,19 @@ def cached(ttl=3600, prefix="cache"):
             key_kwargs = "_".join(f"{k}={v}" for k, v in sorted(kwargs.items()))
             cache_key = f"{prefix}:{func.__name__}:{key_args}:{key_kwargs}".rstrip(":")
             
-            # Intentar obtener de caché
-            cached_result = redis_client.get(cache_key)
-            
-            if cached_result:
-                cache_stats.registrar_hit()
-                return json.loads(cached_result)
+            def calcular():
+                with etapa(etapa_origen):
+                    return func(*args, **kwargs)
             
-            # Cache miss: ejecutar función
-            cache_stats.registrar_miss()
-            result = func(*args, **kwargs)
+            # TTL según lecturas/escrituras de la clave (escrituras: accesos.registrar("escritura", clave))
+            accesos.registrar("cached", cache_key)
+            ttl_clave = lambda: politica_ttl.ttl(ttl, "cached", cache_key)
             
-            # Guardar en caché
-            if result is not None:
-                redis_client.setex(cache_key, ttl, json.dumps(result, default=str))
-            
-            return result
+            # Caché (L1 y Redis); en un miss solo un llamante ejecuta la función
+            return obtener_o_calcular(
+                cache_key, ttl_clave, calcular,
+                etiqueta=f"{prefix}:{func.__name__}", default=str
+            )
         
         return wrapper
     return decorator
@@ -118,118 +1450,490 @@ def cached(ttl=3600, prefix="cache"):
 # REPOSITORIO DE PRODUCTOS
 # =============================================================================
 
+# Write-through en un solo round trip: lee la generación vigente, guarda el
+# documento en su clave (mismo formato que Generaciones.formato), invalida
+# los listados (INCR) y avisa a las L1 del resto de nodos. Con TTL
+# adaptativo el TTL se calcula aquí mismo (ver PoliticaTTL.para_lua).
+#   KEYS: cache:gen:producto, cache:gen:productos
+#         [+ t0, accesos de lectura, accesos de escritura]
+#   ARGV: id, documento codificado, ttl (base), canal L1 ('' = no publicar)
+#         [+ mínimo, máximo, factor de jitter, vida media, ahora]
+# Devuelve {clave, ttl}.
+LUA_WRITE_THROUGH = """
+local ttl = tonumber(ARGV[3])
+if ARGV[5] then
+    local t0 = tonumber(redis.call('GET', KEYS[3]) or '0')
+    local unidad = 1
+    if t0 > 0 then
+        unidad = 2 ^ ((tonumber(ARGV[9]) - t0) / tonumber(ARGV[8]))
+    end
+    local leidas = tonumber(redis.call('ZSCORE', KEYS[4], ARGV[1]) or '0') / unidad
+    local escritas = tonumber(redis.call('ZSCORE', KEYS[5], ARGV[1]) or '0') / unidad
+    ttl = math.min(math.max(ttl * (leidas + 1) / (escritas + 1), tonumber(ARGV[5])), tonumber(ARGV[6]))
+    ttl = math.max(1, math.floor(ttl * tonumber(ARGV[7])))
+end
+local gen = redis.call('GET', KEYS[1]) or '0'
+local clave = 'producto:v' .. gen .. ':' .. ARGV[1]
+redis.call('SET', clave, ARGV[2], 'EX', ttl)
+redis.call('INCR', KEYS[2])
+if ARGV[4] ~= '' then
+    redis.call('PUBLISH', ARGV[4], cjson.encode({clave}))
+end
+return {clave, ttl}
+"""
+
+
+# Paginación por cursor (keyset sobre _id). Los _id pueden ser strings
+# ("P001") u ObjectId (los creados por la API); MongoDB ordena primero
+# los strings y después los ObjectId, y un $gt solo compara con valores
+# del mismo tipo, así que el cursor guarda el tipo: "s:P001" / "o:65a1...".
+
+def codificar_cursor(producto_id) -> str:
+    if isinstance(producto_id, ObjectId):
+        return f"o:{producto_id}"
+    return f"s:{producto_id}"
+
+
+def filtro_cursor(cursor: str = None) -> dict:
+    """Filtro de MongoDB para los documentos posteriores al cursor."""
+    if not cursor:
+        return {}
+    tipo, _, valor = cursor.partition(":")
+    if tipo == "o":
+        try:
+            return {"_id": {"$gt": ObjectId(valor)}}
+        except InvalidId:
+            raise ValueError(f"Cursor no válido: {cursor}")
+    if tipo == "s":
+        return {"$or": [{"_id": {"$gt": valor}}, {"_id": {"$type": "objectId"}}]}
+    raise ValueError(f"Cursor no válido: {cursor}")
+
+
+# Índice de búsqueda por nombre (ver search_index.py), más stock primero
+indice_busqueda = IndiceBusqueda(
+    redis_client, campo_puntuacion=os.environ.get("SEARCH_SCORE_FIELD", "stock") or None
+)
+_hilo_indice = None
+
+
+def asegurar_indice_busqueda():
+    """
+    Si el índice de búsqueda está vacío (productos insertados directamente
+    en MongoDB), lo construye en un hilo aparte. No espera a que termine.
+    """
+    global _hilo_indice
+    if _hilo_indice is not None and _hilo_indice.is_alive():
+        return
+    
+    def construir():
+        try:
+            indice_busqueda.reconstruir_si_vacio(mongo_db['productos'])
+        except Exception:
+            pass  # MongoDB o Redis no disponibles: se reintenta en la siguiente búsqueda
+    
+    _hilo_indice = threading.Thread(target=construir, daemon=True, name="indice-busqueda")
+    _hilo_indice.start()
+
+
+K_BUSQUEDA = 50  # Resultados por búsqueda por defecto (API y precalentamiento)
+
+
 class ProductoRepository:
-    """Repositorio de productos con caché."""
+    """
+    Repositorio de productos con caché.
     
-    def __init__(self):
+    Con `write_through` (por defecto) las escrituras dejan el documento
+    nuevo en caché en lugar de borrarlo, así la lectura siguiente no es
+    un miss. Como en cualquier cache-aside, dos escrituras concurrentes
+    del mismo producto pueden dejar en caché la que termine última.
+    
+    Con `indice` (por defecto) las búsquedas se resuelven en el índice de
+    Redis y las escrituras lo mantienen al día; sin él se usa `$regex`.
+    """
+    
+    def __init__(self, write_through=None, indice=None):
         self.r = redis_client
+        self.r_bin = redis_bin
         self.db = mongo_db
-        self.collection = self.db['productos']
         self.cache_ttl = 3600  # 1 hora
+        if write_through is None:
+            write_through = os.environ.get("CACHE_WRITE_THROUGH", "1") == "1"
+        self.write_through = write_through
+        self._lua_write_through = None
+        if indice is None and os.environ.get("SEARCH_INDEX", "1") == "1":
+            indice = indice_busqueda
+        self.indice = indice
     
-    def _cache_key(self, producto_id):
-        return f"producto:{producto_id}"
+    @property
+    def collection(self):
+        # Se resuelve en cada uso: cliente creado tras el fork, no al importar
+        return self.db['productos']
+    
+    def _cache_key(self, producto_id, gen=None):
+        return generaciones.clave("producto", producto_id, gen)
+    
+    def _lista_key(self, resto):
+        # Listados y búsquedas: se invalidan todos juntos con un INCR
+        return generaciones.clave("productos", resto)
     
     def obtener(self, producto_id: str):
         """Obtiene un producto (primero caché, luego DB)."""
         cache_key = self._cache_key(producto_id)
+        accesos.registrar("producto", producto_id)
+        
+        def buscar_en_db():
+            # Cache miss: buscar en MongoDB
+            with etapa("mongo"):
+                producto = self.collection.find_one({"_id": producto_id})
+            
+            # Convertir ObjectId a string si existe
+            if producto and '_id' in producto:
+                producto['_id'] = str(producto['_id'])
+            
+            return producto
+        
+        # Caché primero; en un miss se consulta MongoDB y se guarda el resultado
+        return obtener_o_calcular(
+            cache_key, lambda: politica_ttl.ttl(self.cache_ttl, "producto", producto_id),
+            buscar_en_db, etiqueta="producto:obtener"
+        )
+    
+    def obtener_muchos(self, ids: list):
+        """
+        Obtiene varios productos en bloque.
         
-        # 1. Buscar en caché
-        cached = self.r.get(cache_key)
-        if cached:
-            cache_stats.registrar_hit()
-            return json.loads(cached)
+        Un MGET para todas las claves, un único find con $in para los
+        misses y un pipeline de SETEX para rellenar el caché.
+        """
+        ids = list(dict.fromkeys(ids))  # Sin duplicados, mismo orden
+        if not ids:
+            return []
         
-        # 2. Cache miss: buscar en MongoDB
-        cache_stats.registrar_miss()
-        producto = self.collection.find_one({"_id": producto_id})
+        gen = generaciones.actual("producto")
+        accesos.registrar("producto", *ids)
         
-        if producto:
-            # Convertir ObjectId a string si existe
-            if '_id' in producto:
+        # 1. L1 del proceso y después un solo MGET para el resto
+        encontrados = {}
+        pendientes = []
+        for producto_id in ids:
+            valor = cache_l1.get(self._cache_key(producto_id, gen))
+            if valor is not None:
+                encontrados[producto_id] = valor
+            else:
+                pendientes.append(producto_id)
+        
+        misses = []
+        if pendientes:
+            with etapa("redis"):
+                cacheados = self.r_bin.mget([self._cache_key(pid, gen) for pid in pendientes])
+            with etapa("codec"):
+                for producto_id, cached in zip(pendientes, cacheados):
+                    if cached:
+                        encontrados[producto_id] = codec.decode(cached)
+                        cache_l1.set(self._cache_key(producto_id, gen), encontrados[producto_id], len(cached))
+                    else:
+                        misses.append(producto_id)
+        
+        if encontrados:
+            cache_stats.registrar_hit(len(encontrados), etiqueta="producto:obtener_muchos")
+        
+        # 2. Cache misses: una sola consulta a MongoDB
+        if misses:
+            cache_stats.registrar_miss(len(misses), etiqueta="producto:obtener_muchos")
+            with etapa("mongo"):
+                productos = list(self.collection.find({"_id": {"$in": misses}}))
+            
+            # 3. Guardar en caché (se envía todo junto al final)
+            for producto in productos:
                 producto['_id'] = str(producto['_id'])
+            with etapa("redis"):
+                ttls = politica_ttl.ttls(self.cache_ttl, "producto", [p['_id'] for p in productos])
+            
+            pipe = self.r_bin.pipeline(transaction=False)
+            with etapa("codec"):
+                for producto, ttl in zip(productos, ttls):
+                    encontrados[producto['_id']] = producto
+                    datos = codec.encode(producto)
+                    clave = self._cache_key(producto['_id'], gen)
+                    pipe.setex(clave, ttl, datos)
+                    cache_l1.set(clave, producto, len(datos), ttl)
             
-            # 3. Guardar en caché
-            self.r.setex(cache_key, self.cache_ttl, json.dumps(producto))
+            with etapa("redis"):
+                pipe.execute()
         
-        return producto
+        return [encontrados[pid] for pid in ids if pid in encontrados]
     
-    def obtener_todos(self, limit=100):
-        """Obtiene todos los productos."""
-        cache_key = f"productos:all:{limit}"
+    def precargar(self, ids: list):
+        """
+        Deja en caché los productos que aún no estén (precalentamiento).
         
-        cached = self.r.get(cache_key)
-        if cached:
-            cache_stats.registrar_hit()
-            return json.loads(cached)
+        Un pipeline de EXISTS, un $in solo con los que faltan y un pipeline
+        de SETEX. No cuenta como hits/misses ni como accesos.
+        Devuelve cuántos se han cargado desde MongoDB.
+        """
+        gen = generaciones.actual("producto")
         
-        cache_stats.registrar_miss()
-        productos = list(self.collection.find().limit(limit))
+        with etapa("redis"):
+            pipe = self.r_bin.pipeline(transaction=False)
+            for producto_id in ids:
+                pipe.exists(self._cache_key(producto_id, gen))
+            faltan = [pid for pid, existe in zip(ids, pipe.execute()) if not existe]
         
+        if not faltan:
+            return 0
+        
+        with etapa("mongo"):
+            productos = list(self.collection.find({"_id": {"$in": faltan}}))
+        
+        for producto in productos:
+            producto['_id'] = str(producto['_id'])
+        with etapa("redis"):
+            ttls = politica_ttl.ttls(self.cache_ttl, "producto", [p['_id'] for p in productos])
+        
+        pipe = self.r_bin.pipeline(transaction=False)
+        with etapa("codec"):
+            for producto, ttl in zip(productos, ttls):
+                pipe.setex(self._cache_key(producto['_id'], gen), ttl, codec.encode(producto))
+        with etapa("redis"):
+            pipe.execute()
+        
+        return len(productos)
+    
+    # Los accesos a listados se guardan como "<cursor>|<limit>"; el listado
+    # completo usa "all" como cursor (los cursores reales empiezan por o: o s:)
+    
+    def _todos_en_db(self, limit):
+        with etapa("mongo"):
+            productos = list(self.collection.find().limit(limit))
+        for p in productos:
+            p['_id'] = str(p['_id'])
+        return productos
+    
+    def _ttl_listado(self, miembro):
+        # TTL corto; cualquier escritura de productos cuenta para los listados
+        return lambda: politica_ttl.ttl(300, "listado", miembro, escrito_por="productos")
+    
+    def obtener_todos(self, limit=100):
+        """Obtiene todos los productos."""
+        cache_key = self._lista_key(f"all:{limit}")
+        accesos.registrar("listado", f"all|{limit}")
+        return obtener_o_calcular(
+            cache_key, self._ttl_listado(f"all|{limit}"),
+            lambda: self._todos_en_db(limit), etiqueta="productos:obtener_todos"
+        )
+    
+    def obtener_pagina(self, cursor: str = None, limit: int = 100):
+        """
+        Una página del listado, ordenado por _id, a partir de `cursor`.
+        
+        Cada página se cachea en su propia clave del namespace de listados,
+        así que cualquier escritura (INCR de "productos") las invalida todas.
+        Devuelve {"data": [...], "next_cursor": str | None}.
+        """
+        filtro = filtro_cursor(cursor)  # Cursor inválido: ValueError antes de tocar caché
+        cache_key = self._lista_key(f"pagina:{cursor or ''}:{limit}")
+        accesos.registrar("listado", f"{cursor or ''}|{limit}")
+        return obtener_o_calcular(
+            cache_key, self._ttl_listado(f"{cursor or ''}|{limit}"),
+            lambda: self._pagina_en_db(filtro, limit), etiqueta="productos:obtener_pagina"
+        )
+    
+    def _pagina_en_db(self, filtro, limit):
+        # Uno de más para saber si hay página siguiente
+        with etapa("mongo"):
+            productos = list(self.collection.find(filtro).sort("_id", 1).limit(limit + 1))
+        siguiente = codificar_cursor(productos[limit - 1]['_id']) if len(productos) > limit else None
+        productos = productos[:limit]
         for p in productos:
             p['_id'] = str(p['_id'])
+        return {"data": productos, "next_cursor": siguiente}
+    
+    def precargar_listado(self, cursor: str, limit: int):
+        """
+        Deja en caché una página del listado ("all" = `obtener_todos`).
+        Como `precargar`, no cuenta como hits/misses ni como accesos.
+        """
+        if cursor == "all":
+            return precalentar_clave(
+                self._lista_key(f"all:{limit}"), self._ttl_listado(f"all|{limit}"),
+                lambda: self._todos_en_db(limit)
+            )
+        filtro = filtro_cursor(cursor)
+        return precalentar_clave(
+            self._lista_key(f"pagina:{cursor or ''}:{limit}"), self._ttl_listado(f"{cursor or ''}|{limit}"),
+            lambda: self._pagina_en_db(filtro, limit)
+        )
+    
+    def iterar(self, cursor: str = None, lote: int = 500):
+        """
+        Recorre los productos desde `cursor` directamente con un cursor de
+        MongoDB (sin caché), para respuestas en streaming.
+        """
+        documentos = self.collection.find(filtro_cursor(cursor)).sort("_id", 1).batch_size(lote)
         
-        self.r.setex(cache_key, 300, json.dumps(productos))  # TTL corto
+        def recorrer():
+            for producto in documentos:
+                producto['_id'] = str(producto['_id'])
+                yield producto
         
-        return productos
+        return recorrer()
+    
+    def _escribir_en_cache(self, producto: dict, avisar_l1=True):
+        """Write-through: SET del producto + INCR de listados + aviso L1 (un EVALSHA)."""
+        if self._lua_write_through is None:
+            self._lua_write_through = self.r_bin.register_script(LUA_WRITE_THROUGH)
+        
+        canal = CacheL1.CANAL if avisar_l1 and cache_l1.enabled else ""
+        with etapa("codec"):
+            datos = codec.encode(producto)
+        claves_ttl, args_ttl = politica_ttl.para_lua("producto")
+        with etapa("redis"):
+            clave, ttl = self._lua_write_through(
+                keys=["cache:gen:producto", "cache:gen:productos"] + claves_ttl,
+                args=[producto['_id'], datos, self.cache_ttl, canal] + args_ttl,
+                client=self.r_bin
+            )
+        politica_ttl.observar("producto", ttl)
+        cache_l1._invalidar_local([clave.decode()])
     
     def crear(self, producto: dict):
         """Crea un nuevo producto."""
         producto['created_at'] = datetime.now().isoformat()
-        result = self.collection.insert_one(producto)
+        with etapa("mongo"):
+            result = self.collection.insert_one(producto)
         producto['_id'] = str(result.inserted_id)
+        accesos.registrar("escritura", "productos")
         
-        # Invalidar caché de lista
-        self.r.delete("productos:all:100")
+        if self.write_through:
+            # Dejarlo ya en caché e invalidar listados, en un round trip
+            self._escribir_en_cache(producto, avisar_l1=False)
+        else:
+            # Invalidar listados y búsquedas (todos los limit y queries)
+            invalidar_cache(namespaces=["productos"])
+        
+        if self.indice:
+            with etapa("redis"):
+                self.indice.indexar(producto)
         
         return producto
     
     def actualizar(self, producto_id: str, datos: dict):
-        """Actualiza un producto e invalida caché."""
+        """Actualiza un producto e invalida (o reescribe) su caché."""
         datos['updated_at'] = datetime.now().isoformat()
+        accesos.registrar("escritura", producto_id, "productos")
         
-        self.collection.update_one(
-            {"_id": producto_id},
-            {"$set": datos}
-        )
+        if self.write_through:
+            # MongoDB devuelve el documento ya actualizado: no hace falta releerlo
+            with etapa("mongo"):
+                producto = self.collection.find_one_and_update(
+                    {"_id": producto_id},
+                    {"$set": datos},
+                    return_document=ReturnDocument.AFTER
+                )
+            if producto:
+                producto['_id'] = str(producto['_id'])
+                self._escribir_en_cache(producto)
+        else:
+            with etapa("mongo"):
+                self.collection.update_one(
+                    {"_id": producto_id},
+                    {"$set": datos}
+                )
+            
+            # Invalidar el producto (Redis y L1 de todos los nodos) y los listados
+            gen = generaciones.actual("producto", fresca=True)
+            invalidar_cache(self._cache_key(producto_id, gen), namespaces=["productos"])
+            producto = self.obtener(producto_id)
         
-        # Invalidar caché
-        self.r.delete(self._cache_key(producto_id))
-        self.r.delete("productos:all:100")
+        # Solo se reindexa si cambian los campos indexados
+        if producto and self.indice and self.indice.afectado_por(datos):
+            with etapa("redis"):
+                self.indice.indexar(producto)
         
-        return self.obtener(producto_id)
+        return producto
     
     def eliminar(self, producto_id: str):
         """Elimina un producto e invalida caché."""
-        result = self.collection.delete_one({"_id": producto_id})
+        with etapa("mongo"):
+            result = self.collection.delete_one({"_id": producto_id})
+        accesos.registrar("escritura", producto_id, "productos")
+        
+        # Invalidar el producto (Redis y L1 de todos los nodos) y los listados
+        gen = generaciones.actual("producto", fresca=True)
+        invalidar_cache(self._cache_key(producto_id, gen), namespaces=["productos"])
         
-        # Invalidar caché
-        self.r.delete(self._cache_key(producto_id))
-        self.r.delete("productos:all:100")
+        if self.indice:
+            with etapa("redis"):
+                self.indice.eliminar(producto_id)
         
         return result.deleted_count > 0
     
-    def buscar(self, query: str):
-        """Busca productos por nombre."""
-        cache_key = f"productos:buscar:{query}"
+    def buscar(self, query: str, k: int = K_BUSQUEDA):
+        """
+        Busca productos por nombre.
         
-        cached = self.r.get(cache_key)
-        if cached:
-            cache_stats.registrar_hit()
-            return json.loads(cached)
-        
-        cache_stats.registrar_miss()
-        productos = list(self.collection.find({
-            "nombre": {"$regex": query, "$options": "i"}
-        }).limit(50))
+        Con índice: los k mejores IDs salen de Redis y los documentos de
+        `obtener_muchos` (MGET + un $in para los que no estén en caché).
+        Mientras el índice está vacío se construye aparte y se usa `$regex`.
+        """
+        accesos.registrar("busqueda", query)
+        if self.indice:
+            with etapa("redis"):
+                vacio = self.indice.vacio()
+                ids = None if vacio else self.indice.buscar(query, k)
+            if not vacio:
+                return self.obtener_muchos(ids)
+            asegurar_indice_busqueda()
         
+        # TTL muy corto para búsquedas
+        return obtener_o_calcular(
+            self._lista_key(f"buscar:{query}:{k}"),
+            lambda: politica_ttl.ttl(60, "busqueda", query, escrito_por="productos"),
+            lambda: self._buscar_en_db(query, k), etiqueta="productos:buscar"
+        )
+    
+    def _buscar_en_db(self, query, k):
+        with etapa("mongo"):
+            productos = list(self.collection.find({
+                "nombre": {"$regex": query, "$options": "i"}
+            }).limit(k))
         for p in productos:
             p['_id'] = str(p['_id'])
-        
-        self.r.setex(cache_key, 60, json.dumps(productos))  # TTL muy corto para búsquedas
-        
         return productos
+    
+    def precargar_busqueda(self, query: str, k: int = K_BUSQUEDA):
+        """Deja en caché el resultado de una búsqueda, sin contarla como acceso ni hit/miss."""
+        if self.indice and not self.indice.vacio():
+            with etapa("redis"):
+                ids = self.indice.buscar(query, k)
+            return self.precargar(ids) > 0
+        return precalentar_clave(
+            self._lista_key(f"buscar:{query}:{k}"),
+            lambda: politica_ttl.ttl(60, "busqueda", query, escrito_por="productos"),
+            lambda: self._buscar_en_db(query, k)
+        )
+    
+    def autocompletar(self, prefijo: str, k: int = 10):
+        """Sugerencias para lo que se está escribiendo (solo con índice)."""
+        if not self.indice:
+            return {"terminos": [], "productos": []}
+        with etapa("redis"):
+            return self.indice.autocompletar(prefijo, k)
 
 
 # Instancia global
 producto_repo = ProductoRepository()
+
+
+def _despues_de_fork():
+    """En el proceso hijo: olvidar hilos, locks y estado heredados del padre."""
+    global _vuelos, _vuelos_lock
+    _vuelos = {}
+    _vuelos_lock = threading.Lock()
+    cache_stats._despues_de_fork()
+    metricas._despues_de_fork()
+    accesos._despues_de_fork()
+    cache_l1._despues_de_fork()
+
+
+os.register_at_fork(after_in_child=_despues_de_fork)
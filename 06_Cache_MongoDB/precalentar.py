@@ -0,0 +1,151 @@
+"""
+🔥 Precalentamiento del caché tras un deploy o un reinicio de Redis
+
+Carga en caché los productos más populares (según `accesos`, ver
+models.py) y repite las búsquedas y páginas del listado más pedidas,
+para que los primeros minutos de tráfico no caigan sobre MongoDB.
+
+Los productos se cargan en lotes ($in + pipeline de SETEX) con un número
+acotado de lotes en paralelo y un límite de documentos por segundo.
+
+Uso:
+    python precalentar.py
+    python precalentar.py --productos 5000 --paralelo 4 --docs-por-segundo 2000
+
+También desde la API (POST /api/cache/warmup) o al arrancar la app con
+CACHE_WARMUP_ON_START=1.
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import redis
+
+from models import accesos, producto_repo, redis_client
+
+
+class Limitador:
+    """Reparte `por_segundo` unidades de trabajo entre varios hilos."""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0
+        self.siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self, unidades=1):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(self.siguiente, ahora)
+            self.siguiente = turno + unidades * self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+def leer_listado(miembro):
+    """
+    "<cursor>|<limit>" -> (cursor, limit); el cursor "all" es `obtener_todos`.
+    Acepta el formato antiguo "all:<limit>" y devuelve None si no se entiende.
+    """
+    if "|" in miembro:
+        cursor, _, limit = miembro.rpartition("|")
+    elif miembro.startswith("all:"):
+        cursor, limit = "all", miembro[len("all:"):]
+    else:
+        return None
+    try:
+        return cursor or None, int(limit)
+    except ValueError:
+        return None
+
+
+def precalentar(productos=1000, busquedas=50, listados=10, lote=200, paralelo=4,
+                docs_por_segundo=2000, progreso=None, repo=producto_repo):
+    """
+    Precarga el caché. Solo lo ejecuta un proceso a la vez (lock en Redis).
+
+    `progreso(fase, hechos, total)` se llama tras cada lote o consulta.
+    """
+    lock = redis_client.lock("lock:precalentar", timeout=600, blocking=False)
+    if not lock.acquire():
+        return {"en_curso": True}
+
+    try:
+        inicio = time.monotonic()
+        limitador = Limitador(docs_por_segundo)
+        aviso = progreso or (lambda fase, hechos, total: None)
+
+        # 1. Productos populares: lotes $in en paralelo acotado
+        ids = accesos.top("producto", productos)
+        lotes = [ids[i:i + lote] for i in range(0, len(ids), lote)]
+
+        def cargar(ids_lote):
+            limitador.esperar(len(ids_lote))
+            return repo.precargar(ids_lote)
+
+        cargados = 0
+        with ThreadPoolExecutor(max_workers=paralelo) as pool:
+            futuros = [pool.submit(cargar, ids_lote) for ids_lote in lotes]
+            for hechos, futuro in enumerate(as_completed(futuros), 1):
+                cargados += futuro.result()
+                aviso("productos", hechos, len(lotes))
+
+        # 2. Búsquedas y páginas del listado más pedidas (de una en una)
+        #    (precargar_*: sin sumar accesos ni hits/misses a las estadísticas)
+        consultas = accesos.top("busqueda", busquedas)
+        for hechos, query in enumerate(consultas, 1):
+            limitador.esperar()
+            repo.precargar_busqueda(query)
+            aviso("busquedas", hechos, len(consultas))
+
+        paginas = [p for p in map(leer_listado, accesos.top("listado", listados)) if p]
+        for hechos, (cursor, limit) in enumerate(paginas, 1):
+            limitador.esperar(limit)
+            try:
+                repo.precargar_listado(cursor, limit)
+            except ValueError:
+                pass  # Cursor que ya no es válido
+            aviso("listados", hechos, len(paginas))
+
+        return {
+            "productos": len(ids),
+            "productos_cargados": cargados,
+            "busquedas": len(consultas),
+            "listados": len(paginas),
+            "segundos": round(time.monotonic() - inicio, 2)
+        }
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass  # Expiró: otro proceso ya puede precalentar
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precalentar el caché de productos")
+    parser.add_argument("--productos", type=int, default=1000, help="Top-N productos a cargar")
+    parser.add_argument("--busquedas", type=int, default=50)
+    parser.add_argument("--listados", type=int, default=10)
+    parser.add_argument("--lote", type=int, default=200, help="IDs por consulta $in")
+    parser.add_argument("--paralelo", type=int, default=4, help="Consultas $in simultáneas")
+    parser.add_argument("--docs-por-segundo", type=int, default=2000, help="0 = sin límite")
+    args = parser.parse_args()
+
+    print("🔥 Precalentando caché...")
+    resultado = precalentar(
+        args.productos, args.busquedas, args.listados, args.lote, args.paralelo,
+        args.docs_por_segundo,
+        progreso=lambda fase, hechos, total: print(f"   {fase}: {hechos}/{total}")
+    )
+
+    if resultado.get("en_curso"):
+        print("⚠️ Otro proceso ya está precalentando")
+        return
+    print(f"✅ {resultado['productos_cargados']}/{resultado['productos']} productos cargados, "
+          f"{resultado['busquedas']} búsquedas y {resultado['listados']} listados "
+          f"en {resultado['segundos']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+🔎 Índice de búsqueda de productos en Redis
+
+Índice invertido sobre el nombre de los productos, para no mandar cada
+búsqueda a MongoDB como un `$regex` (que recorre toda la colección):
+
+    busqueda:termino:<t>    SET   ids que contienen el término exacto
+    busqueda:prefijo:<p>    ZSET  ids con algún término que empieza por <p>
+    busqueda:terminos       ZSET  todos los términos (score 0, para ZRANGEBYLEX)
+    busqueda:doc:<id>       SET   términos indexados de cada producto
+    busqueda:nombres        HASH  id -> nombre (para autocompletar sin MongoDB)
+
+Una búsqueda es AND de sus palabras: todas salvo la última deben
+aparecer completas y la última se trata como prefijo ("mon 4" → "Monitor 4K").
+
+Los productos se ordenan por `campo_puntuacion` (en models.py, `stock`
+o la variable SEARCH_SCORE_FIELD), de mayor a menor.
+
+El índice se mantiene solo con las escrituras de ProductoRepository. Los
+productos cargados directamente en MongoDB (el `insert_many` del
+notebook) no están indexados: si el índice está vacío, la app lo
+construye en segundo plano y mientras tanto busca con `$regex`. Tras
+cargas masivas con el índice ya creado, hay que reconstruirlo a mano:
+    python search_index.py reconstruir
+"""
+
+import re
+import sys
+import time
+import unicodedata
+import uuid
+
+
+def tokenizar(texto: str) -> list:
+    """Minúsculas, sin acentos, solo letras y números; sin repetidos."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return list(dict.fromkeys(re.findall(r"[a-z0-9]+", texto)))
+
+
+class IndiceBusqueda:
+    """Índice invertido y de prefijos sobre sets y sorted sets de Redis."""
+
+    PREFIJO = "busqueda"
+
+    def __init__(self, redis_client, min_prefijo=2, max_prefijo=20, campo_puntuacion=None):
+        self.r = redis_client
+        self.min_prefijo = min_prefijo
+        self.max_prefijo = max_prefijo
+        self.campo_puntuacion = campo_puntuacion  # Campo numérico para ordenar (None = 0)
+        self._poblado_hasta = 0  # Hasta cuándo no hace falta volver a mirar si está vacío
+
+    # Claves
+    def _k_termino(self, termino):
+        return f"{self.PREFIJO}:termino:{termino}"
+
+    def _k_prefijo(self, prefijo):
+        return f"{self.PREFIJO}:prefijo:{prefijo[:self.max_prefijo]}"
+
+    def _k_doc(self, producto_id):
+        return f"{self.PREFIJO}:doc:{producto_id}"
+
+    def _prefijos(self, terminos):
+        return {
+            t[:n]
+            for t in terminos
+            for n in range(self.min_prefijo, min(len(t), self.max_prefijo) + 1)
+        }
+
+    def _puntuacion(self, producto):
+        if not self.campo_puntuacion:
+            return 0
+        try:
+            return float(producto.get(self.campo_puntuacion) or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    # =========================================================================
+    # MANTENIMIENTO
+    # =========================================================================
+
+    def afectado_por(self, cambios: dict) -> bool:
+        """¿Cambia alguno de los campos que usa el índice?"""
+        return any(campo in cambios for campo in self._proyeccion())
+
+    def indexar(self, producto: dict):
+        """Indexa (o reindexa) un producto."""
+        self.indexar_lote([producto])
+
+    def indexar_lote(self, productos: list):
+        """
+        Indexa varios productos: un pipeline para leer los términos que
+        tenían y otro (MULTI) para aplicar solo las diferencias.
+        """
+        if not productos:
+            return
+
+        pipe = self.r.pipeline(transaction=False)
+        for producto in productos:
+            pipe.smembers(self._k_doc(producto['_id']))
+        anteriores = pipe.execute()
+
+        pipe = self.r.pipeline(transaction=True)
+        for producto, viejos in zip(productos, anteriores):
+            self._encolar_indexar(pipe, producto, viejos)
+        pipe.execute()
+
+    def _encolar_indexar(self, pipe, producto, viejos):
+        """Encola en `pipe` las diferencias entre los términos `viejos` y los del producto."""
+        producto_id = str(producto['_id'])
+        nuevos = set(tokenizar(producto.get('nombre', '')))
+        puntuacion = self._puntuacion(producto)
+
+        for termino in viejos - nuevos:
+            pipe.srem(self._k_termino(termino), producto_id)
+        for prefijo in self._prefijos(viejos) - self._prefijos(nuevos):
+            pipe.zrem(self._k_prefijo(prefijo), producto_id)
+
+        for termino in nuevos:
+            pipe.sadd(self._k_termino(termino), producto_id)
+        for prefijo in self._prefijos(nuevos):
+            pipe.zadd(self._k_prefijo(prefijo), {producto_id: puntuacion})
+
+        pipe.delete(self._k_doc(producto_id))
+        if nuevos:
+            pipe.sadd(self._k_doc(producto_id), *nuevos)
+            pipe.zadd(f"{self.PREFIJO}:terminos", {t: 0 for t in nuevos})
+        pipe.hset(f"{self.PREFIJO}:nombres", producto_id, producto.get('nombre', ''))
+
+    def eliminar(self, producto_id: str):
+        """Quita un producto del índice."""
+        producto_id = str(producto_id)
+        viejos = self.r.smembers(self._k_doc(producto_id))
+
+        pipe = self.r.pipeline(transaction=True)
+        self._encolar_eliminar(pipe, producto_id, viejos)
+        pipe.execute()
+
+    def _encolar_eliminar(self, pipe, producto_id, viejos):
+        for termino in viejos:
+            pipe.srem(self._k_termino(termino), producto_id)
+        for prefijo in self._prefijos(viejos):
+            pipe.zrem(self._k_prefijo(prefijo), producto_id)
+        pipe.delete(self._k_doc(producto_id))
+        pipe.hdel(f"{self.PREFIJO}:nombres", producto_id)
+
+    def reconstruir(self, collection, lote=500, progreso=None):
+        """
+        Reindexa toda la colección en lotes y quita del índice los productos
+        que ya no existen. Se hace sobre el índice vivo (sin dejarlo vacío).
+        """
+        inicio = time.monotonic()
+        vistos = set()
+        pendientes = []
+        total = 0
+
+        for producto in collection.find({}, self._proyeccion()):
+            producto['_id'] = str(producto['_id'])
+            vistos.add(producto['_id'])
+            pendientes.append(producto)
+            if len(pendientes) >= lote:
+                self.indexar_lote(pendientes)
+                total += len(pendientes)
+                pendientes = []
+                if progreso:
+                    progreso(total)
+        self.indexar_lote(pendientes)
+        total += len(pendientes)
+
+        # Productos indexados que ya no están en MongoDB
+        huerfanos = [
+            clave.rsplit(":", 1)[1]
+            for clave in self.r.scan_iter(match=f"{self.PREFIJO}:doc:*", count=1000)
+            if clave.rsplit(":", 1)[1] not in vistos
+        ]
+        for producto_id in huerfanos:
+            self.eliminar(producto_id)
+
+        return {
+            "indexados": total,
+            "eliminados": len(huerfanos),
+            "segundos": round(time.monotonic() - inicio, 2)
+        }
+
+    def vacio(self) -> bool:
+        """¿Está el índice sin construir? Una vez poblado, se vuelve a mirar cada 30 s."""
+        ahora = time.monotonic()
+        if self._poblado_hasta > ahora:
+            return False
+        if self.r.exists(f"{self.PREFIJO}:nombres"):
+            self._poblado_hasta = ahora + 30
+            return False
+        return True
+
+    def reconstruir_si_vacio(self, collection, progreso=None):
+        """Reconstruye solo si está vacío y nadie más lo está haciendo (lock en Redis)."""
+        lock = self.r.lock(f"{self.PREFIJO}:lock", timeout=600, blocking=False)
+        if not lock.acquire():
+            return None
+        try:
+            if not self.vacio():
+                return None
+            return self.reconstruir(collection, progreso=progreso)
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass  # Expiró mientras se reconstruía
+
+    def _proyeccion(self):
+        campos = {"nombre": 1}
+        if self.campo_puntuacion:
+            campos[self.campo_puntuacion] = 1
+        return campos
+
+    # =========================================================================
+    # CONSULTAS
+    # =========================================================================
+
+    def buscar(self, query: str, k: int = 20) -> list:
+        """IDs de los k mejores productos que encajan con la búsqueda."""
+        claves = self._claves_busqueda(query, k)
+        if not claves:
+            return []
+        if isinstance(claves, str):
+            return self.r.zrevrange(claves, 0, k - 1)
+
+        destino = f"{self.PREFIJO}:tmp:{uuid.uuid4().hex}"
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zinterstore(destino, claves, aggregate="MAX")
+        pipe.zrevrange(destino, 0, k - 1)
+        pipe.delete(destino)
+        _, ids, _ = pipe.execute()
+        return ids
+
+    def _claves_busqueda(self, query, k):
+        """
+        Lo que hay que leer para una búsqueda: None (nada), la clave de un
+        único prefijo (un ZREVRANGE basta) o la lista de claves a intersecar
+        en una clave temporal (los sets cuentan con score 1).
+        """
+        terminos = tokenizar(query)
+        if not terminos or k <= 0:  # zrevrange(0, k - 1) con k <= 0 lo devolvería todo
+            return None
+
+        # Una última palabra demasiado corta para prefijo todavía no filtra
+        if len(terminos) > 1 and len(terminos[-1]) < self.min_prefijo:
+            terminos.pop()
+
+        *completos, ultimo = terminos
+        claves = [self._k_termino(t) for t in completos]
+        if len(ultimo) >= self.min_prefijo:
+            claves.append(self._k_prefijo(ultimo))
+        else:
+            claves.append(self._k_termino(ultimo))
+
+        if len(claves) == 1 and len(ultimo) >= self.min_prefijo:
+            return claves[0]
+        return claves
+
+    def autocompletar(self, prefijo: str, k: int = 10) -> dict:
+        """Términos que empiezan por el prefijo y los k productos mejor puntuados."""
+        terminos = tokenizar(prefijo)
+        if not terminos or k <= 0:
+            return {"terminos": [], "productos": []}
+
+        # Se completa la última palabra; las anteriores filtran como en buscar()
+        base = " ".join(terminos[:-1])
+        ultimo = terminos[-1]
+
+        sugerencias = self.r.zrangebylex(
+            f"{self.PREFIJO}:terminos", f"[{ultimo}", f"[{ultimo}\xff", start=0, num=k
+        )
+        ids = self.buscar(prefijo, k)
+        nombres = self.r.hmget(f"{self.PREFIJO}:nombres", ids) if ids else []
+
+        return {
+            "terminos": [f"{base} {t}".strip() for t in sugerencias],
+            "productos": [{"_id": i, "nombre": n} for i, n in zip(ids, nombres)]
+        }
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "reconstruir":
+        print("Uso: python search_index.py reconstruir")
+        return
+
+    from models import indice_busqueda, producto_repo
+
+    print("🔎 Reconstruyendo índice de búsqueda...")
+    resultado = indice_busqueda.reconstruir(
+        producto_repo.collection,
+        progreso=lambda n: print(f"   {n} productos indexados")
+    )
+    print(f"✅ {resultado['indexados']} indexados, {resultado['eliminados']} eliminados "
+          f"en {resultado['segundos']}s")
+
+
+if __name__ == "__main__":
+    main()
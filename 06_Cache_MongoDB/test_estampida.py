@@ -0,0 +1,140 @@
+"""
+🧪 Protección contra estampidas: N lecturas simultáneas de una clave fría
+deben hacer una sola consulta a MongoDB (repositorio) o un solo cálculo
+(decorador `cached`).
+
+Sin servidores: Redis con fakeredis y MongoDB con mongomock.
+
+Uso (desde 06_Cache_MongoDB):
+    python -m pytest -q test_estampida.py
+"""
+
+import threading
+import time
+
+import fakeredis
+import mongomock
+import pytest
+
+import models
+from models import ProductoRepository, cached
+
+HILOS = 20
+
+
+class ColeccionContada:
+    """Colección de mongomock que cuenta (y hace lentas) las lecturas."""
+
+    def __init__(self, coleccion, retardo=0.2):
+        self._coleccion = coleccion
+        self._retardo = retardo
+        self._lock = threading.Lock()
+        self.consultas = 0
+
+    def _contar(self):
+        with self._lock:
+            self.consultas += 1
+        time.sleep(self._retardo)  # Deja tiempo a que lleguen el resto de hilos
+
+    def find_one(self, *args, **kwargs):
+        self._contar()
+        return self._coleccion.find_one(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        self._contar()
+        return self._coleccion.find(*args, **kwargs)
+
+
+@pytest.fixture
+def conexiones(monkeypatch):
+    servidor = fakeredis.FakeServer()
+    monkeypatch.setattr(models.conexiones, "_redis", {
+        True: fakeredis.FakeRedis(server=servidor, decode_responses=True),
+        False: fakeredis.FakeRedis(server=servidor),
+    })
+    monkeypatch.setattr(models.conexiones, "_mongo", mongomock.MongoClient())
+    monkeypatch.setattr(models.conexiones, "_pid", models.os.getpid())
+    monkeypatch.setattr(models.cache_l1, "enabled", False)
+
+
+@pytest.fixture
+def repo(conexiones):
+    coleccion = mongomock.MongoClient().db.productos
+    coleccion.insert_one({"_id": "P001", "nombre": "Monitor 4K", "precio": 499.99, "stock": 100})
+
+    repositorio = ProductoRepository(write_through=False, indice=False)
+    repositorio.db = {"productos": ColeccionContada(coleccion)}
+    return repositorio
+
+
+@pytest.fixture
+def calculo_contado(conexiones):
+    """Función lenta con @cached; `calcular.llamadas` cuenta sus ejecuciones."""
+    @cached(ttl=60, prefix="test")
+    def calcular(x):
+        with lock:
+            calcular.llamadas += 1
+        time.sleep(0.2)
+        return {"x": x}
+
+    lock = threading.Lock()
+    calcular.llamadas = 0
+    return calcular
+
+
+def lecturas_simultaneas(funcion, n=HILOS):
+    """Lanza `n` llamadas a la vez y devuelve sus resultados."""
+    barrera = threading.Barrier(n)
+    resultados = [None] * n
+
+    def leer(i):
+        barrera.wait()
+        resultados[i] = funcion()
+
+    hilos = [threading.Thread(target=leer, args=(i,)) for i in range(n)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(timeout=10)
+    return resultados
+
+
+def test_un_proceso_una_consulta(repo):
+    """Hilos del mismo proceso: single-flight."""
+    resultados = lecturas_simultaneas(lambda: repo.obtener("P001"))
+
+    assert repo.collection.consultas == 1
+    assert all(r and r["nombre"] == "Monitor 4K" for r in resultados)
+
+
+def test_varios_procesos_una_consulta(repo, monkeypatch):
+    """Sin single-flight (como hilos de procesos distintos): el lock de Redis."""
+    monkeypatch.setattr(models, "_single_flight", lambda clave, funcion: funcion())
+
+    resultados = lecturas_simultaneas(lambda: repo.obtener("P001"))
+
+    assert repo.collection.consultas == 1
+    assert all(r and r["nombre"] == "Monitor 4K" for r in resultados)
+
+
+def test_clave_caliente_sin_consultas(repo):
+    repo.obtener("P001")
+    lecturas_simultaneas(lambda: repo.obtener("P001"))
+
+    assert repo.collection.consultas == 1
+
+
+def test_cached_un_proceso_un_calculo(calculo_contado):
+    resultados = lecturas_simultaneas(lambda: calculo_contado(7))
+
+    assert calculo_contado.llamadas == 1
+    assert all(r == {"x": 7} for r in resultados)
+
+
+def test_cached_varios_procesos_un_calculo(calculo_contado, monkeypatch):
+    monkeypatch.setattr(models, "_single_flight", lambda clave, funcion: funcion())
+
+    resultados = lecturas_simultaneas(lambda: calculo_contado(7))
+
+    assert calculo_contado.llamadas == 1
+    assert all(r == {"x": 7} for r in resultados)